@@ -0,0 +1,109 @@
+"""
+Time alert-rule evaluation over a full refresh cycle: seed N rules across M
+products, then feed every product a price change in tracker-sized batches and
+measure `AlertRuleStore.evaluate`. Needs a MongoDB (MONGODB_URI); uses its own
+database, dropped afterwards unless --keep.
+
+Run from the backend directory:
+    python -m benchmarks.alert_rules_bench --rules 100000 --products 10000
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime
+
+os.environ.setdefault("SERPAPI_KEY", "benchmark")
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+from pymongo import IndexModel  # noqa: E402
+
+from config import get_settings  # noqa: E402
+from database import INDEXES  # noqa: E402
+from services.alerts import alert_rule_store  # noqa: E402
+from benchmarks.serpapi_client_bench import percentile  # noqa: E402
+
+settings = get_settings()
+
+KINDS = ("target", "percent_drop", "all_time_low")
+
+
+async def seed(db, rules, products, seed_value):
+    rng = random.Random(seed_value)
+    for collection, keys, options in INDEXES:
+        if collection in (alert_rule_store.RULES, alert_rule_store.OUTBOX):
+            await db[collection].create_indexes([IndexModel(keys, **options)])
+
+    prices = {f"bench-{i}": rng.randint(500, 100000) * 100 for i in range(products)}
+    product_ids = list(prices)
+    batch = []
+    for i in range(rules):
+        product_id = rng.choice(product_ids)
+        kind = rng.choice(KINDS)
+        # Thresholds spread 0-40% under the current price, as users would set them
+        trigger = int(prices[product_id] * (1 - rng.uniform(0, 0.4))) if kind != "all_time_low" else prices[product_id] - 1
+        batch.append({
+            "clerk_id": f"user-{i % (rules // 10 + 1)}",
+            "product_id": product_id,
+            "kind": kind,
+            "trigger_below_minor": trigger,
+            "active": True,
+            "created_at": datetime.utcnow(),
+        })
+        if len(batch) >= 10000:
+            await alert_rule_store.rules(db).insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await alert_rule_store.rules(db).insert_many(batch, ordered=False)
+    return prices
+
+
+async def run(db, rules, products, drop_percent, batch_size, seed_value=7):
+    prices = await seed(db, rules, products, seed_value)
+    rng = random.Random(seed_value + 1)
+
+    product_ids = list(prices)
+    latencies, triggered = [], 0
+    started = time.perf_counter()
+    for start in range(0, len(product_ids), batch_size):
+        changes = []
+        for product_id in product_ids[start:start + batch_size]:
+            previous = prices[product_id]
+            new = int(previous * (1 - rng.uniform(0, drop_percent / 100)))
+            changes.append({"product_id": product_id, "title": product_id, "price": f"₹{new / 100:,.2f}",
+                            "price_minor": new, "previous_price_minor": previous})
+        batch_started = time.perf_counter()
+        triggered += await alert_rule_store.evaluate(db, changes)
+        latencies.append((time.perf_counter() - batch_started) * 1000)
+    elapsed = time.perf_counter() - started
+
+    print(f"{rules} rules, {products} products, batches of {batch_size}, drops up to {drop_percent}%")
+    print(f"  full cycle: {elapsed:.2f}s ({products / elapsed:,.0f} price changes/s), {triggered} alerts")
+    print(f"  per batch: p50 {percentile(latencies, 50):.1f}ms  p95 {percentile(latencies, 95):.1f}ms  "
+          f"max {max(latencies):.1f}ms")
+    return elapsed, triggered
+
+
+async def main(args):
+    client = AsyncIOMotorClient(settings.MONGODB_URI)
+    db = client[args.database]
+    try:
+        await db[alert_rule_store.RULES].drop()
+        await db[alert_rule_store.OUTBOX].drop()
+        await run(db, args.rules, args.products, args.drop_percent, args.batch_size)
+    finally:
+        if not args.keep:
+            await client.drop_database(args.database)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, default=100000)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--drop-percent", type=float, default=10, help="Largest simulated price drop")
+    parser.add_argument("--batch-size", type=int, default=settings.TRACKER_MAX_BATCH_SIZE)
+    parser.add_argument("--database", default="pricewise_alerts_bench")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark database")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,163 @@
+"""
+Cold-start profile of the API process: how long `import main` (what
+`uvicorn main:app` does before serving) takes, which packages the time goes
+to according to `python -X importtime`, and how long the AI provider clients
+take to build on first use (AIService.prewarm).
+
+Every run is a fresh interpreter; the first run is discarded so compiled
+bytecode is cached. Dummy GEMINI/GROQ keys are set so both providers count
+as configured.
+
+Run from the backend directory:
+    python -m benchmarks.import_time --runs 5 --output after.json
+    python -m benchmarks.import_time --runs 5 --compare before.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PREWARM_MARKER = "--- prewarm"
+
+PROBE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+print("{marker}", file=sys.stderr, flush=True)
+from services.ai_service import ai_service
+if hasattr(ai_service, "prewarm"):
+    asyncio.run(ai_service.prewarm())
+print(json.dumps({{"import_ms": (imported - started) * 1000, "prewarm_ms": (time.perf_counter() - imported) * 1000}}))
+"""
+
+WATCHED = ("google.generativeai", "groq", "fastapi", "motor", "pymongo", "httpx", "jwt", "apscheduler", "routes.chat")
+
+
+def parse_importtime(stderr: str):
+    """
+    -X importtime rows as (self_us, cumulative_us, depth, module); depth 0 is
+    imported directly by the probe.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+
+def by_package(rows):
+    packages = {}
+    for self_us, _, _, name in rows:
+        top = name.split(".")[0]
+        packages[top] = packages.get(top, 0) + self_us
+    return packages
+
+
+def profile_once(module: str, env: dict):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module, marker=PREWARM_MARKER)],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    at_startup, _, on_first_use = proc.stderr.partition(PREWARM_MARKER)
+    rows = parse_importtime(at_startup)
+    watched = {name: cumulative for _, cumulative, _, name in rows if name in WATCHED}
+    return timings, by_package(rows), by_package(parse_importtime(on_first_use)), watched
+
+
+def run(args):
+    env = {
+        **os.environ,
+        "SERPAPI_KEY": os.environ.get("SERPAPI_KEY", "benchmark"),
+        "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "benchmark"),
+        "GROQ_API_KEY": os.environ.get("GROQ_API_KEY", "benchmark"),
+        "LOG_LEVEL": "WARNING",
+        "PYTHONWARNINGS": "ignore",
+    }
+    samples = []
+    for i in range(args.runs + 1):
+        sample = profile_once(args.module, env)
+        if i:
+            samples.append(sample)
+
+    def median(values):
+        return round(statistics.median(values), 1)
+
+    def top_packages(index):
+        packages = {}
+        for sample in samples:
+            for name, self_us in sample[index].items():
+                packages.setdefault(name, []).append(self_us / 1000)
+        ranked = sorted(((name, median(values)) for name, values in packages.items()), key=lambda item: -item[1])
+        return dict(ranked[:args.top])
+
+    watched = {}
+    for sample in samples:
+        for name, cumulative_us in sample[3].items():
+            watched.setdefault(name, []).append(cumulative_us / 1000)
+
+    return {
+        "module": args.module,
+        "runs": args.runs,
+        "python": sys.version.split()[0],
+        "import_ms": median([sample[0]["import_ms"] for sample in samples]),
+        "prewarm_ms": median([sample[0]["prewarm_ms"] for sample in samples]),
+        # Self time summed per top-level package, i.e. who the import time goes to
+        "packages_ms": top_packages(1),
+        "prewarm_packages_ms": top_packages(2),
+        # Cumulative time during `import main`; absent if the module wasn't imported then
+        "watched_ms": {name: median(watched[name]) for name in WATCHED if name in watched},
+    }
+
+
+def report(results, previous=None):
+    def delta(key):
+        if not previous or key not in previous:
+            return ""
+        return f"  (was {previous[key]:.1f}ms, {results[key] - previous[key]:+.1f}ms)"
+
+    print(f"import {results['module']}: {results['import_ms']:.1f}ms median of {results['runs']} runs"
+          + delta("import_ms"))
+    print(f"AI client prewarm (first use): {results['prewarm_ms']:.1f}ms" + delta("prewarm_ms"))
+    for title, key in (("at startup", "packages_ms"), ("on first use", "prewarm_packages_ms")):
+        if results.get(key):
+            print(f"\nImport self time by package, {title}:")
+            for name, ms in results[key].items():
+                print(f"  {name:<24} {ms:8.1f}ms")
+    print("\nCumulative import time of watched modules at startup:")
+    for name in WATCHED:
+        now = results["watched_ms"].get(name)
+        before = (previous or {}).get("watched_ms", {}).get(name) if previous else None
+        if now is None and before is None:
+            continue
+        shown = "not imported" if now is None else f"{now:8.1f}ms"
+        was = "" if previous is None else (" (was not imported)" if before is None else f" (was {before:.1f}ms)")
+        print(f"  {name:<24} {shown}{was}")
+
+
+def main(args):
+    results = run(args)
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    report(results, previous)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="Module to import, as uvicorn would")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Packages listed by self time")
+    parser.add_argument("--output", help="Also write the results as JSON here")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    main(parser.parse_args())
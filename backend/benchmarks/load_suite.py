@@ -0,0 +1,512 @@
+"""
+End-to-end load test of the API with every external service replaced by a local stub.
+
+Starts the FastAPI app from main.py in this process under uvicorn, with SerpApi
+served by StubSerpApiServer, Gemini/Groq replaced by benchmarks.stub_llm and Clerk
+session tokens signed by a throwaway RSA key. Then:
+
+1. drives /products/search, /chat/, /chat/stream, /tracker/* and /user/* over real
+   HTTP at the given concurrency, one scenario after another, and
+2. runs update_all_prices over synthetic catalogs (e.g. 1k-100k products) whose
+   prices come from the stub, a share of them changed so history and alert
+   writes are included.
+
+Reports p50/p95/p99 latency, throughput and peak RSS per scenario. RSS is this
+process's, which hosts the app, the stubs and the load generator alike. Needs a
+MongoDB (MONGODB_URI, or --mongo-uri); uses its own database, dropped afterwards.
+
+Run from the backend directory:
+    python -m benchmarks.load_suite --requests 500 --concurrency 20
+    python -m benchmarks.load_suite --catalog-sizes 1000,10000,100000 --scenarios search
+    python -m benchmarks.load_suite --save-baseline   # record benchmarks/baseline.json
+    python -m benchmarks.load_suite --check           # exit 1 on a regression vs the baseline
+--check reruns with the options recorded in the baseline unless they are given
+explicitly. A baseline is only comparable with runs on the same machine and MongoDB,
+so it is not committed: record it once on the CI or benchmark host.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Only modules that don't read settings are imported up here; everything else
+# is imported after configure_environment (see run)
+from benchmarks.stub_serpapi import StubSerpApiServer
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+ISSUER = "https://clerk.benchmark.local"
+
+QUERIES = (
+    "wireless earbuds", "gaming laptop", "air fryer", "running shoes", "smart watch",
+    "mechanical keyboard", "4k monitor", "robot vacuum", "espresso machine", "bluetooth speaker",
+)
+
+SCENARIOS = (
+    "search", "chat", "chat_stream",
+    "tracker_track", "tracker_tracked", "tracker_history",
+    "user_bookmark", "user_bookmarks", "user_history",
+)
+
+# Options that change what is measured; a baseline recorded with different ones isn't comparable
+PROFILE_OPTIONS = (
+    "requests", "concurrency", "users", "distinct_queries", "scenarios", "catalog_sizes",
+    "change_ratio", "serpapi_latency_ms", "provider", "llm_latency_ms", "llm_chunk_ms",
+    "tracker_concurrency",
+)
+
+# Latency differences smaller than this are noise, whatever the percentage
+MIN_LATENCY_DELTA_MS = 2.0
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(latencies, errors, elapsed):
+    from benchmarks.serpapi_client_bench import percentile
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "throughput_per_s": round(len(latencies) / elapsed, 1),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def make_signing_key(directory):
+    """RSA key pair for fake Clerk sessions; the public half is what the app verifies against."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    path = os.path.join(directory, "clerk_benchmark.pem")
+    with open(path, "wb") as f:
+        f.write(key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        ))
+    return key, path
+
+
+def session_token(key, clerk_id):
+    import jwt
+
+    now = int(time.time())
+    return jwt.encode({"sub": clerk_id, "iss": ISSUER, "iat": now, "exp": now + 3600}, key, algorithm="RS256")
+
+
+def configure_environment(args, stub, key_file):
+    """Must run before anything imports config: settings are read once, at import."""
+    os.environ.update({
+        "SERPAPI_KEY": "benchmark",
+        "SERPAPI_BASE_URL": stub.url,
+        "DATABASE_NAME": args.database,
+        # In-process caches only, so runs don't depend on (or pollute) a shared Redis
+        "REDIS_URL": "",
+        "CLERK_SECRET_KEY": "",
+        "CLERK_JWKS_URL": "",
+        "CLERK_JWKS_FILE": key_file,
+        "CLERK_ISSUER": ISSUER,
+        "CLERK_AUTHORIZED_PARTIES": "",
+        # The sweep measures the tracker itself, not the politeness limit towards SerpApi
+        "TRACKER_RATE_PER_SECOND": "0",
+        # Every simulated user shares 127.0.0.1; admission control is not what's measured
+        "SERPAPI_RATE_PER_SECOND": "0",
+        "SERPAPI_USER_PER_MINUTE": "0",
+        # Keep the background scheduler out of the measurements
+        "TRACKER_TICK_SECONDS": "86400",
+        "TRACKER_PARTITIONS": "1",
+        "TRACKER_USE_CELERY": "false",
+        "ALERT_SINK": "log",
+    })
+    if not args.verbose:
+        # Log handlers hold on to the real stdout, so quiet() can't silence them
+        os.environ["LOG_LEVEL"] = "WARNING"
+    if args.mongo_uri:
+        os.environ["MONGODB_URI"] = args.mongo_uri
+    if args.tracker_concurrency:
+        os.environ["TRACKER_CONCURRENCY"] = str(args.tracker_concurrency)
+
+
+class AppServer:
+    """Runs main.app under uvicorn on a free local port, startup and shutdown hooks included."""
+
+    def __init__(self, app):
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+        self.task = None
+
+    @property
+    def url(self):
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    async def start(self):
+        self.task = asyncio.create_task(self.server.serve())
+        while not self.server.started:
+            if self.task.done():
+                self.task.result()
+                raise RuntimeError("uvicorn exited during startup")
+            await asyncio.sleep(0.05)
+        return self
+
+    async def stop(self):
+        self.server.should_exit = True
+        await self.task
+
+
+class Workload:
+    """Deterministic request builders: request `i` of a scenario always targets the same user and product."""
+
+    def __init__(self, api, products, tokens, distinct_queries):
+        self.api = api
+        self.products = products
+        self.users = list(tokens)
+        self.tokens = tokens
+        self.distinct_queries = distinct_queries
+
+    def query(self, i):
+        return f"{QUERIES[i % len(QUERIES)]} {i % self.distinct_queries}"
+
+    def user(self, i):
+        return self.users[i % len(self.users)]
+
+    def product(self, i):
+        return self.products[i % len(self.products)]
+
+    def auth(self, i):
+        return {"Authorization": f"Bearer {self.tokens[self.user(i)]}"}
+
+    def request(self, scenario, i):
+        """(method, url, httpx keyword arguments) for request `i` of `scenario`."""
+        api, user = self.api, self.user(i)
+        if scenario == "search":
+            return "GET", f"{api}/products/search", {"params": {"q": self.query(i)}}
+        if scenario in ("chat", "chat_stream"):
+            path = "/chat/" if scenario == "chat" else "/chat/stream"
+            return "POST", f"{api}{path}", {"json": {"message": f"best {self.query(i)} to buy", "user_id": user}}
+        if scenario == "tracker_track":
+            return "POST", f"{api}/tracker/track", {"json": {**self.product(i), "clerk_id": user}}
+        if scenario == "tracker_tracked":
+            return "GET", f"{api}/tracker/tracked/{user}", {}
+        if scenario == "tracker_history":
+            return "GET", f"{api}/tracker/history/{self.product(i)['product_id']}", {}
+        if scenario == "user_bookmark":
+            body = {"user_id": user, "product": self.product(i)}
+            return "POST", f"{api}/user/bookmarks", {"json": body, "headers": self.auth(i)}
+        if scenario == "user_bookmarks":
+            return "GET", f"{api}/user/{user}/bookmarks", {"headers": self.auth(i)}
+        if scenario == "user_history":
+            return "GET", f"{api}/user/{user}/history", {}
+        raise ValueError(f"Unknown scenario {scenario!r}")
+
+
+async def drive(client, workload, scenario, requests, concurrency):
+    latencies, errors = [], 0
+    next_index = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in next_index:
+            method, url, options = workload.request(scenario, i)
+            started = time.perf_counter()
+            response = await client.request(method, url, **options)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def seed_catalog(db, stub, size, change_ratio):
+    """
+    `size` catalog products whose stub search returns them, last checked a day ago.
+    Every 1/change_ratio-th one is stored at a higher price, so its refresh records a drop.
+    """
+    from services.catalog import catalog_store
+    from services.serpapi_service import serpapi_service
+
+    await catalog_store.catalog(db).delete_many({})
+    await db["price_history"].delete_many({})
+
+    checked = datetime.utcnow() - timedelta(days=1)
+    step = round(1 / change_ratio) if change_ratio else 0
+    operations = []
+    for k in range(size):
+        # Titles are unique per catalog size so earlier sweeps don't warm the search cache
+        title = f"sweep {size} product {k}"
+        product = serpapi_service._normalize_results(stub.build_payload(title)["shopping_results"][:1])[0]
+        product["title"] = title
+        if step and k % step == 0:
+            product["price_minor"] += 10000
+            product["price"] = f"₹{product['price_minor'] // 100:,}"
+        operations.append(catalog_store.catalog_upsert(product, checked))
+        if len(operations) >= 5000:
+            await catalog_store.catalog(db).bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        await catalog_store.catalog(db).bulk_write(operations, ordered=False)
+
+
+async def sweep(db, stub, size, change_ratio):
+    """Time update_all_prices over a fresh synthetic catalog of `size` products."""
+    from jobs import price_tracker
+    from benchmarks.serpapi_client_bench import percentile
+
+    await seed_catalog(db, stub, size, change_ratio)
+    stub.reset_counters()
+
+    batches = []
+    refresh_products = price_tracker.refresh_products
+
+    async def timed_refresh(db, product_ids, raise_errors=False):
+        started = time.perf_counter()
+        try:
+            return await refresh_products(db, product_ids, raise_errors)
+        finally:
+            batches.append((time.perf_counter() - started) * 1000)
+
+    price_tracker.refresh_products = timed_refresh
+    try:
+        started = time.perf_counter()
+        await price_tracker.update_all_prices(enqueue=False)
+        elapsed = time.perf_counter() - started
+    finally:
+        price_tracker.refresh_products = refresh_products
+
+    return {
+        "products": size,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_per_s": round(size / elapsed, 1),
+        "batches": len(batches),
+        "batch_p50_ms": round(percentile(batches, 50), 2),
+        "batch_p95_ms": round(percentile(batches, 95), 2),
+        "batch_p99_ms": round(percentile(batches, 99), 2),
+        "upstream_requests": stub.requests,
+        "price_changes": await db["price_history"].count_documents({}),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_http(name, result):
+    print(f"{name:<16} requests={result['requests']:<6} errors={result['errors']:<4} "
+          f"p50={result['p50_ms']:8.2f}ms p95={result['p95_ms']:8.2f}ms p99={result['p99_ms']:8.2f}ms "
+          f"throughput={result['throughput_per_s']:8.1f}/s rss={result['peak_rss_mb']:.0f}MB")
+
+
+def print_sweep(result):
+    print(f"update_all_prices products={result['products']:<7} {result['elapsed_s']:8.2f}s "
+          f"throughput={result['throughput_per_s']:8.1f}/s batch p50={result['batch_p50_ms']:.0f}ms "
+          f"p95={result['batch_p95_ms']:.0f}ms p99={result['batch_p99_ms']:.0f}ms "
+          f"upstream={result['upstream_requests']} changes={result['price_changes']} "
+          f"rss={result['peak_rss_mb']:.0f}MB")
+
+
+def quiet(enabled):
+    """Silence the app's per-request prints and log lines, which would otherwise dominate the run."""
+    if not enabled:
+        return contextlib.nullcontext()
+    stack = contextlib.ExitStack()
+    devnull = stack.enter_context(open(os.devnull, "w"))
+    stack.enter_context(contextlib.redirect_stdout(devnull))
+    stack.enter_context(contextlib.redirect_stderr(devnull))
+    return stack
+
+
+async def run(args):
+    key_dir = tempfile.mkdtemp(prefix="pricewise-bench-")
+    key, key_file = make_signing_key(key_dir)
+
+    async with StubSerpApiServer(latency_ms=args.serpapi_latency_ms) as stub:
+        configure_environment(args, stub, key_file)
+
+        import httpx
+        from motor.motor_asyncio import AsyncIOMotorClient
+        from config import get_settings
+        from database import get_database, ensure_indexes
+        from services.ai_service import ai_service
+        from services.serpapi_service import serpapi_service
+        from benchmarks import stub_llm
+        from main import app
+
+        settings = get_settings()
+        admin = AsyncIOMotorClient(settings.MONGODB_URI)
+        await admin.drop_database(settings.DATABASE_NAME)
+        server_info = await admin.server_info()
+
+        llm = stub_llm.install(
+            ai_service, args.provider, latency_ms=args.llm_latency_ms, chunk_ms=args.llm_chunk_ms
+        )
+        users = [f"bench_user_{i}" for i in range(args.users)]
+        products = [
+            product
+            for i in range(args.distinct_queries)
+            for product in serpapi_service._normalize_results(
+                stub.build_payload(f"{QUERIES[i % len(QUERIES)]} {i}")["shopping_results"]
+            )
+        ]
+        workload = Workload(settings.API_PREFIX, products, {user: session_token(key, user) for user in users},
+                            args.distinct_queries)
+
+        results = {"http": {}, "tracker": {}}
+        server = AppServer(app)
+        with quiet(not args.verbose):
+            await server.start()
+        try:
+            db = await get_database()
+            await ensure_indexes(db)
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=server.url, timeout=120, limits=limits) as client:
+                for scenario in args.scenarios:
+                    with quiet(not args.verbose):
+                        result = await drive(client, workload, scenario, args.requests, args.concurrency)
+                    results["http"][scenario] = result
+                    print_http(scenario, result)
+
+            for size in args.catalog_sizes:
+                with quiet(not args.verbose):
+                    result = await sweep(db, stub, size, args.change_ratio)
+                results["tracker"][str(size)] = result
+                print_sweep(result)
+        finally:
+            with quiet(not args.verbose):
+                await server.stop()
+            if not args.keep:
+                await admin.drop_database(settings.DATABASE_NAME)
+            admin.close()
+
+    results["mongodb"] = server_info.get("version")
+    results["llm_calls"] = llm.calls
+    results["peak_rss_mb"] = peak_rss_mb()
+    print(f"peak RSS {results['peak_rss_mb']:.0f}MB, {llm.calls} LLM calls")
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    """Human-readable list of metrics that got worse than the baseline by more than `tolerance`."""
+    found = []
+
+    def slower(label, current, previous):
+        if current > previous * (1 + tolerance) and current - previous > MIN_LATENCY_DELTA_MS:
+            found.append(f"{label}: {previous} -> {current}")
+
+    def lower(label, current, previous):
+        if current < previous * (1 - tolerance):
+            found.append(f"{label}: {previous} -> {current}")
+
+    for name, previous in baseline.get("http", {}).items():
+        current = results["http"].get(name)
+        if current is None:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            slower(f"{name} {metric}", current[metric], previous[metric])
+        lower(f"{name} throughput_per_s", current["throughput_per_s"], previous["throughput_per_s"])
+        if current["errors"] > previous["errors"]:
+            found.append(f"{name} errors: {previous['errors']} -> {current['errors']}")
+
+    for size, previous in baseline.get("tracker", {}).items():
+        current = results["tracker"].get(size)
+        if current is None:
+            continue
+        slower(f"update_all_prices[{size}] batch_p95_ms", current["batch_p95_ms"], previous["batch_p95_ms"])
+        lower(f"update_all_prices[{size}] throughput_per_s", current["throughput_per_s"], previous["throughput_per_s"])
+
+    if results["peak_rss_mb"] > baseline.get("peak_rss_mb", float("inf")) * (1 + tolerance):
+        found.append(f"peak_rss_mb: {baseline['peak_rss_mb']} -> {results['peak_rss_mb']}")
+    return found
+
+
+def profile(args):
+    return {option: getattr(args, option) for option in PROFILE_OPTIONS}
+
+
+def main(args):
+    results = asyncio.run(run(args))
+    results["profile"] = profile(args)
+    results["machine"] = {"python": platform.python_version(), "platform": platform.platform(),
+                          "cpus": os.cpu_count()}
+    if args.note:
+        results["note"] = args.note
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"no baseline at {args.baseline}: record one on this host with --save-baseline")
+            sys.exit(2)
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("profile") != results["profile"]:
+            print(f"warning: baseline was recorded with different options: {baseline.get('profile')}")
+        found = regressions(results, baseline, args.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        if found:
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+def csv_list(cast):
+    return lambda value: [cast(item) for item in value.split(",") if item]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300, help="Requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--distinct-queries", type=int, default=40,
+                        help="Distinct search/chat queries; fewer means more cache hits")
+    parser.add_argument("--scenarios", type=csv_list(str), default=list(SCENARIOS),
+                        help=f"Comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--catalog-sizes", type=csv_list(int), default=[1000, 10000],
+                        help="Synthetic catalog sizes for update_all_prices; empty to skip")
+    parser.add_argument("--change-ratio", type=float, default=0.2, help="Share of products whose price changes")
+    parser.add_argument("--serpapi-latency-ms", type=float, default=20)
+    parser.add_argument("--provider", choices=("gemini", "groq"), default="groq")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Stub LLM time to first token")
+    parser.add_argument("--llm-chunk-ms", type=float, default=10, help="Stub LLM delay between streamed chunks")
+    parser.add_argument("--tracker-concurrency", type=int, default=None,
+                        help="TRACKER_CONCURRENCY for the sweep (default: the configured value)")
+    parser.add_argument("--mongo-uri", default=None, help="Defaults to MONGODB_URI")
+    parser.add_argument("--database", default="pricewise_load_bench")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark database")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own output")
+    parser.add_argument("--output", help="Also write the results as JSON here")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="Record this run as the baseline")
+    parser.add_argument("--note", help="Free text stored with the results, e.g. where the baseline was recorded")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if this run regressed vs the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+    known, _ = parser.parse_known_args()
+    if known.check and os.path.exists(known.baseline):
+        # Rerun what the baseline measured unless told otherwise
+        with open(known.baseline) as f:
+            parser.set_defaults(**json.load(f).get("profile", {}))
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    main(args)
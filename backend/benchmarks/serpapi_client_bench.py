@@ -0,0 +1,81 @@
+"""
+Compare a fresh httpx.AsyncClient per search (the old behaviour) against the
+shared, pooled client owned by SerpApiService.
+
+Run from the backend directory:
+    python -m benchmarks.serpapi_client_bench --calls 200 --concurrency 10 --handshake-ms 30
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+
+os.environ.setdefault("SERPAPI_KEY", "benchmark")
+
+from benchmarks.stub_serpapi import StubSerpApiServer  # noqa: E402
+from services.serpapi_service import SerpApiService  # noqa: E402
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def per_call_client_search(url, query):
+    async with httpx.AsyncClient() as client:
+        response = await client.get(url, params={"engine": "google_shopping", "q": query})
+        response.raise_for_status()
+        return response.json()
+
+
+async def run_mode(name, search, calls, concurrency, stub):
+    stub.reset_counters()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await search(f"phone {i % 20}")
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{name:<16} calls={calls:<5} connections={stub.connections:<5} "
+        f"p50={percentile(latencies, 50):7.2f}ms p95={percentile(latencies, 95):7.2f}ms "
+        f"mean={statistics.mean(latencies):7.2f}ms throughput={calls / elapsed:8.1f}/s"
+    )
+
+
+async def main(args):
+    async with StubSerpApiServer(latency_ms=args.latency_ms, handshake_ms=args.handshake_ms) as stub:
+        await run_mode(
+            "per-call client",
+            lambda q: per_call_client_search(stub.url, q),
+            args.calls, args.concurrency, stub,
+        )
+
+        service = SerpApiService()
+        service.BASE_URL = stub.url
+        await service.start()
+        try:
+            # Bypass the search cache so only the HTTP client strategy is measured
+            await run_mode("shared client", service._fetch_products, args.calls, args.concurrency, stub)
+        finally:
+            await service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Simulated upstream processing time")
+    parser.add_argument("--handshake-ms", type=float, default=30.0, help="Simulated TCP+TLS setup cost per connection")
+    asyncio.run(main(parser.parse_args()))
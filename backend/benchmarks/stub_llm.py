@@ -0,0 +1,81 @@
+"""
+Local stand-ins for the Gemini and Groq SDK clients used by AIService, so chat
+benchmarks exercise prompt building, answer caching and streaming without
+spending provider quota.
+
+Each call waits `latency_ms` (time to first token), then produces a canned
+answer in `chunks` pieces spaced `chunk_ms` apart; non-streaming calls return
+once the last chunk would have arrived.
+"""
+import asyncio
+import hashlib
+from types import SimpleNamespace
+
+
+class StubLLM:
+    def __init__(self, latency_ms=0.0, chunk_ms=0.0, chunks=8):
+        self.latency_ms = latency_ms
+        self.chunk_ms = chunk_ms
+        self.chunks = max(1, chunks)
+        self.calls = 0
+
+    def answer(self, prompt: str):
+        digest = hashlib.md5(prompt.encode()).hexdigest()[:8]
+        words = [f"Recommendation {digest}:"] + ["this option balances price and ratings well."] * self.chunks
+        return " ".join(words)
+
+    def split(self, text: str):
+        size = max(1, len(text) // self.chunks)
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    async def complete(self, prompt: str):
+        self.calls += 1
+        await asyncio.sleep((self.latency_ms + self.chunk_ms * self.chunks) / 1000)
+        return self.answer(prompt)
+
+    async def stream(self, prompt: str):
+        self.calls += 1
+        await asyncio.sleep(self.latency_ms / 1000)
+        for piece in self.split(self.answer(prompt)):
+            yield piece
+            if self.chunk_ms:
+                await asyncio.sleep(self.chunk_ms / 1000)
+
+
+class StubGeminiModel(StubLLM):
+    """Mimics google.generativeai.GenerativeModel.generate_content_async."""
+
+    async def generate_content_async(self, contents, stream=False, request_options=None):
+        prompt = contents[-1]["parts"][0]["text"]
+        if not stream:
+            return SimpleNamespace(text=await self.complete(prompt))
+        return (SimpleNamespace(text=piece) async for piece in self.stream(prompt))
+
+
+class StubGroqClient(StubLLM):
+    """Mimics groq.AsyncGroq: `client.chat.completions.create(model=..., messages=..., stream=...)`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, stream=False, **kwargs):
+        prompt = messages[-1]["content"]
+        if not stream:
+            message = SimpleNamespace(content=await self.complete(prompt))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        return (
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+            async for piece in self.stream(prompt)
+        )
+
+
+def install(service, provider="groq", **options):
+    """Point `service` (an AIService) at a stub for `provider` and return the stub."""
+    service.gemini_enabled = provider == "gemini"
+    service.groq_enabled = provider == "groq"
+    if provider == "gemini":
+        service.gemini_model = StubGeminiModel(**options)
+        return service.gemini_model
+    service.groq_client = StubGroqClient(**options)
+    return service.groq_client
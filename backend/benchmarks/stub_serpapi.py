@@ -0,0 +1,114 @@
+"""
+Minimal local stand-in for serpapi.com used by the benchmarks.
+
+Speaks just enough HTTP/1.1 (keep-alive, Content-Length) to serve
+`/search.json` with a fake `shopping_results` payload, and counts how many
+TCP connections clients open so connection reuse can be measured.
+"""
+import asyncio
+import hashlib
+import json
+from urllib.parse import urlsplit, parse_qs
+
+
+class StubSerpApiServer:
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0.0, handshake_ms=0.0, results_per_query=10):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        # Extra delay charged once per new connection, standing in for the TCP+TLS handshake
+        self.handshake_ms = handshake_ms
+        self.results_per_query = results_per_query
+        self.connections = 0
+        self.requests = 0
+        self._server = None
+        self._connections = {}
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/search.json"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            # Drop idle keep-alive connections so wait_closed() doesn't hang on them
+            for writer in list(self._connections):
+                writer.close()
+            await asyncio.gather(*self._connections.values(), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    def reset_counters(self):
+        self.connections = 0
+        self.requests = 0
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def build_payload(self, query: str):
+        results = []
+        for i in range(self.results_per_query):
+            digest = hashlib.md5(f"{query}:{i}".encode()).hexdigest()
+            price = 1000 + int(digest[:6], 16) % 99000
+            results.append({
+                "title": f"{query.title()} Model {i}",
+                "price": f"₹{price:,}",
+                "extracted_price": price,
+                "source": ["Amazon.in", "Flipkart", "Croma"][i % 3],
+                "link": f"https://example.com/p/{digest}",
+                "thumbnail": f"https://example.com/t/{digest}.jpg",
+                "rating": round(3.5 + (i % 15) / 10, 1),
+                "reviews": 10 * (i + 1),
+                "product_id": digest[:16],
+            })
+        return {"shopping_results": results}
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._connections[writer] = asyncio.current_task()
+        if self.handshake_ms:
+            await asyncio.sleep(self.handshake_ms / 1000)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                headers = {}
+                for line in header_lines:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0) or 0)
+                if length:
+                    await reader.readexactly(length)
+
+                self.requests += 1
+                if self.latency_ms:
+                    await asyncio.sleep(self.latency_ms / 1000)
+
+                target = request_line.split(" ")[1]
+                query = parse_qs(urlsplit(target).query).get("q", [""])[0]
+                body = json.dumps(self.build_payload(query)).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: application/json\r\n"
+                    + f"Content-Length: {len(body)}\r\n".encode()
+                    + b"Connection: keep-alive\r\n\r\n"
+                    + body
+                )
+                await writer.drain()
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
@@ -0,0 +1,34 @@
+from celery import Celery
+from config import get_settings
+
+settings = get_settings()
+
+def broker_url():
+    return settings.CELERY_BROKER_URL or settings.REDIS_URL or "memory://"
+
+def check_broker():
+    """
+    Raise unless tasks sent from this process reach workers: the in-memory broker
+    (the default without CELERY_BROKER_URL/REDIS_URL) is only read in-process.
+    """
+    if broker_url().startswith("memory://"):
+        raise RuntimeError("TRACKER_USE_CELERY needs a shared broker: set CELERY_BROKER_URL or REDIS_URL")
+
+celery_app = Celery(
+    "pricewise",
+    broker=broker_url(),
+    backend=settings.CELERY_RESULT_BACKEND,
+    include=["jobs.tasks"],
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    task_ignore_result=settings.CELERY_RESULT_BACKEND is None,
+    # Ack only after the task finished, and put it back if the worker dies mid-task
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    # Each refresh waits on SerpApi; don't let one worker hoard queued tasks
+    worker_prefetch_multiplier=1,
+    task_routes={"tracker.*": {"queue": "tracker"}},
+)
@@ -9,6 +9,8 @@ class Settings(BaseSettings):
     # Database
     MONGODB_URI: str = "mongodb://localhost:27017"
     DATABASE_NAME: str = "pricewise_db"
+    CREATE_INDEXES_ON_STARTUP: bool = True
+    INDEX_CREATION_TIMEOUT_SECONDS: float = 120.0  # Startup index creation runs in the background and gives up after this
     
     # Security
     SECRET_KEY: str = "secret" # Change in production
@@ -18,12 +20,132 @@ class Settings(BaseSettings):
     # AI (Optional)
     GROQ_API_KEY: str | None = None
     GEMINI_API_KEY: str | None = None
+    GEMINI_MODEL: str = "gemini-1.5-flash"
+    GROQ_MODEL: str = "llama-3.3-70b-versatile"
+    AI_TIMEOUT_SECONDS: float = 30.0
+    AI_MAX_CONTEXT_PRODUCTS: int = 10  # Products included in the prompt table
+    AI_PROMPT_TOKEN_BUDGET_GEMINI: int = 6000  # Prompt + history budget per request
+    AI_PROMPT_TOKEN_BUDGET_GROQ: int = 4000
+    AI_ANSWER_CACHE_ENABLED: bool = False  # Opt-in: reuse answers for identical query + products
+    AI_ANSWER_CACHE_BACKEND: str = "memory"  # "memory" or "redis" (needs REDIS_URL)
+    AI_ANSWER_CACHE_TTL_SECONDS: int = 1800
+    AI_ANSWER_CACHE_MAX_ENTRIES: int = 512
+    AI_PREWARM: bool = False  # Load the provider SDKs in the background at startup, not on the first chat
+    AI_PRIMARY_PROVIDER: str = "gemini"  # Tried first when both keys are set; the other is the failover
+    AI_BREAKER_FAILURE_THRESHOLD: int = 3  # Consecutive failures before a provider is skipped
+    AI_BREAKER_RESET_SECONDS: float = 30.0  # Then one trial call decides whether it is back
+    AI_LATENCY_WINDOW: int = 200  # Recent calls per provider used for latency percentiles
+    AI_HEDGE_ENABLED: bool = False  # Also ask the other provider once the first is slower than its p95
+    AI_HEDGE_DEFAULT_DELAY_SECONDS: float = 3.0  # Hedge delay until enough latencies are recorded
+    AI_HEDGE_MIN_DELAY_SECONDS: float = 0.5
     
     # External APIs
     SERPAPI_KEY: str | None = None
+    SERPAPI_BASE_URL: str = "https://serpapi.com/search.json"
+
+    # Upstream HTTP client (shared, pooled)
+    HTTP_TIMEOUT_SECONDS: float = 20.0
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    HTTP_MAX_CONNECTIONS: int = 50
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    HTTP2_ENABLED: bool = False  # Requires the optional 'h2' package
+
+    # SerpApi admission (interactive searches are served before background refreshes)
+    SERPAPI_RATE_PER_SECOND: float = 10.0  # Global, all callers; 0 disables pacing
+    SERPAPI_BURST: int = 20
+    SERPAPI_DAILY_QUOTA: int = 0  # Calls per UTC day, across all processes via REDIS_URL (else per process); 0 = unlimited
+    SERPAPI_BACKGROUND_DAILY_BUDGET: int = 0  # Share of the day's calls the price tracker may use; 0 = no cap
+    SERPAPI_USER_PER_MINUTE: int = 30  # Uncached searches per user (or client IP), per process; 0 = unlimited
+    SERPAPI_MAX_QUEUE: int = 1000  # Callers waiting for a token before new ones are refused
+
+    # Caching
+    REDIS_URL: str | None = None  # Enables the shared Redis cache tier when set
+    SEARCH_CACHE_ENABLED: bool = True
+    SEARCH_CACHE_TTL_SECONDS: int = 900
+    SEARCH_CACHE_MAX_ENTRIES: int = 1024
+
+    # Local product index (chat refinements are answered from it, not SerpApi)
+    PRODUCT_INDEX_ENABLED: bool = True
+    PRODUCT_INDEX_MAX_PRODUCTS: int = 20000  # Most recently seen products kept in memory
+    PRODUCT_INDEX_MAX_QUERIES: int = 5000  # Recent queries whose results follow-ups can refine
+    PRODUCT_INDEX_QUERY_TTL_SECONDS: int = 3600
+    PRODUCT_INDEX_LOAD_TRACKED: bool = True  # Index the tracked catalog at startup
+
+    # Background price tracker
+    TRACKER_CONCURRENCY: int = 8  # Max upstream lookups in flight per refresh
+    TRACKER_RATE_PER_SECOND: float = 5.0  # 0 disables rate limiting
+    TRACKER_REFRESH_WINDOW_HOURS: float = 6.0  # Every product is refreshed once per window
+    TRACKER_TICK_SECONDS: int = 60  # How often a batch of the stalest products is refreshed
+    TRACKER_MAX_BATCH_SIZE: int = 200  # Upper bound on distinct products refreshed per tick
+    TRACKER_LEADER_ELECTION: bool = True  # Only lease holders run the tracker (safe with many workers)
+    TRACKER_LEASE_SECONDS: int = 30  # A dead owner's work fails over after this long
+    TRACKER_HEARTBEAT_SECONDS: int = 10
+    TRACKER_PARTITIONS: int = 1  # >1 splits products by hash across the live processes
+    TRACKER_INSTANCE_ID: str | None = None  # Defaults to host:pid:random
+    CATALOG_GC_GRACE_HOURS: float = 24.0  # Products without subscribers (incl. anonymous tracks) are dropped, with their history, after this long
+    CATALOG_GC_INTERVAL_MINUTES: int = 60
+    CATALOG_GC_BATCH_SIZE: int = 1000  # Max products dropped per run
+
+    # Out-of-process refresh workers (Celery)
+    TRACKER_USE_CELERY: bool = False  # The API only enqueues refresh tasks; `celery -A celery_app worker` runs them
+    CELERY_BROKER_URL: str | None = None  # Defaults to REDIS_URL; "memory://" for tests only
+    CELERY_RESULT_BACKEND: str | None = None  # Results are not needed by the tracker; set to inspect them
+    CELERY_REFRESH_RATE_LIMIT: str | None = "5/s"  # Per worker process
+    CELERY_REFRESH_MAX_RETRIES: int = 3
+
+    # Server-side chat sessions ('chat_sessions' collection; clients send only the new message)
+    CHAT_SESSIONS_ENABLED: bool = True
+    CHAT_SESSION_MAX_TURNS: int = 6  # Newest messages kept verbatim; older ones are summarized
+    CHAT_SESSION_SUMMARY_TOPICS: int = 5  # Earlier questions kept in the rolling summary
+    CHAT_SESSION_MAX_RESULTS: int = 40  # Products of the last search kept for follow-ups
+    CHAT_SESSION_CACHE_SIZE: int = 2000  # Recently used sessions kept in memory
+    CHAT_SESSION_CACHE_SECONDS: int = 1800
+    CHAT_SESSION_TTL_DAYS: int = 7  # Idle sessions are deleted after this long
+
+    # Search/chat history writer (batched, off the request path)
+    HISTORY_WRITER_BATCH_SIZE: int = 100
+    HISTORY_WRITER_FLUSH_SECONDS: float = 1.0
+    HISTORY_WRITER_MAX_QUEUE: int = 10000  # Callers wait once this many items are pending
+
+    # Price history (bucketed 'price_history' collection)
+    PRICE_HISTORY_BUCKET_SIZE: int = 200  # Points per bucket document
+    PRICE_HISTORY_PREVIEW_POINTS: int = 30  # Recent points kept inline on tracked products
+    PRICE_HISTORY_MAX_LIMIT: int = 5000
+
+    # Listings (keyset pagination)
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 200
+
+    # Bulk endpoints (track/untrack, bookmarks)
+    BULK_MAX_ITEMS: int = 500
+
+    # Price-drop alerts
+    ALERT_SINK: str = "log"  # "log", or "module:Class" for a custom AlertSink
+    ALERT_DELIVERY_BATCH_SIZE: int = 500  # Outbox alerts delivered per tracker tick
+    ALERT_MAX_ATTEMPTS: int = 5
+    ALERT_DELIVERY_LEASE_SECONDS: int = 300  # One Celery worker drains the outbox at a time
+    ALERT_CLAIM_TIMEOUT_SECONDS: int = 300  # A claimed alert whose deliverer died is sent again after this
+
+    # Observability
+    LOG_LEVEL: str = "INFO"  # Per-request detail (searches, prompts) is logged at DEBUG
+    LOG_FORMAT: str = "text"  # "text" or "json" (one object per line)
+    METRICS_ENABLED: bool = True  # Prometheus text format at GET /metrics
+
     CLERK_SECRET_KEY: str | None = None
     CLERK_PUBLISHABLE_KEY: str | None = None
 
+    # Clerk session token verification
+    CLERK_JWKS_URL: str | None = None  # Defaults to Clerk's Backend API /v1/jwks (uses CLERK_SECRET_KEY)
+    CLERK_JWKS_FILE: str | None = None  # Local JWKS JSON or PEM public key for offline/test runs
+    CLERK_ISSUER: str | None = None  # Checked against the token's 'iss' when set
+    CLERK_AUTHORIZED_PARTIES: str | None = None  # Comma-separated allowed 'azp' origins
+    CLERK_JWKS_CACHE_SECONDS: int = 3600
+    CLERK_JWKS_MIN_REFRESH_SECONDS: int = 30  # JWKS refreshes (unknown 'kid' or expiry) are throttled to this
+    CLERK_JWKS_TIMEOUT_SECONDS: float = 3.0
+    CLERK_TOKEN_CACHE_SIZE: int = 10000
+    CLERK_CLOCK_SKEW_SECONDS: int = 5
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,7 +1,9 @@
+import logging
 from motor.motor_asyncio import AsyncIOMotorClient
 from config import get_settings
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 class Database:
     client: AsyncIOMotorClient = None
@@ -15,9 +17,65 @@ async def get_database():
 async def connect_to_mongo():
     db.client = AsyncIOMotorClient(settings.MONGODB_URI)
     db.db = db.client[settings.DATABASE_NAME]
-    print(f"Connected to MongoDB")
+    logger.info("Connected to MongoDB")
 
 async def close_mongo_connection():
     if db.client:
         db.client.close()
-        print("Closed MongoDB connection")
+        logger.info("Closed MongoDB connection")
+
+# Indexes backing every route and job query. Each entry: (collection, keys, options).
+# Kept in one place so startup, the CLI (scripts/ensure_indexes.py) and the
+# query-plan test (tests/test_query_plans.py) all agree.
+INDEXES = [
+    # One catalog document per external product; every tracker lookup and $lookup join goes through it
+    ("catalog", [("product_id", 1)], {"name": "product_id_unique", "unique": True}),
+    # Incremental tracker: stalest products first
+    ("catalog", [("last_checked", 1)], {"name": "last_checked"}),
+    # Garbage collection: only the entries nobody subscribes to
+    ("catalog", [("subscribers", 1)], {
+        "name": "unsubscribed", "partialFilterExpression": {"subscribers": {"$lte": 0}},
+    }),
+    # One subscription per (user, product)
+    ("subscriptions", [("clerk_id", 1), ("product_id", 1)], {"name": "clerk_product_unique", "unique": True}),
+    # get_user_tracked_products pages: price filter, sort and keyset on the subscription's copied keys
+    ("subscriptions", [("clerk_id", 1), ("last_updated", -1), ("_id", -1)], {"name": "clerk_last_updated_id"}),
+    ("subscriptions", [("clerk_id", 1), ("price_minor", 1), ("_id", 1)], {"name": "clerk_price_id"}),
+    # All subscribers of a product
+    ("subscriptions", [("product_id", 1)], {"name": "product_id"}),
+    ("price_history", [("product_id", 1), ("first_ts", -1)], {"name": "product_first_ts"}),
+    # Alert evaluation: the rules a new price triggers are one range scan per product
+    ("alert_rules", [("product_id", 1), ("active", 1), ("trigger_below_minor", 1)], {"name": "product_active_trigger"}),
+    ("alert_rules", [("clerk_id", 1), ("_id", -1)], {"name": "clerk_id"}),
+    ("alert_outbox", [("status", 1), ("_id", 1)], {"name": "status_id"}),
+    ("alert_outbox", [("clerk_id", 1), ("_id", -1)], {"name": "clerk_id"}),
+    ("history", [("user_id", 1), ("timestamp", -1), ("_id", -1)], {"name": "user_timestamp_id"}),
+    # One bookmark per (user, product); also closes the duplicate-insert race in add_bookmark
+    ("bookmarks", [("user_id", 1), ("product.product_id", 1)], {"name": "user_product_unique", "unique": True}),
+    ("bookmarks", [("user_id", 1), ("timestamp", -1), ("_id", -1)], {"name": "user_timestamp_id"}),
+    ("users", [("clerk_id", 1)], {"name": "clerk_id_unique", "unique": True}),
+    ("chat_sessions", [("updated_at", 1)], {
+        "name": "updated_at_ttl", "expireAfterSeconds": settings.CHAT_SESSION_TTL_DAYS * 86400,
+    }),
+    # Tracker partition membership: members that stopped heartbeating are cleaned up after an hour
+    ("tracker_members", [("expires_at", 1)], {"name": "expires_at_ttl", "expireAfterSeconds": 3600}),
+]
+
+async def ensure_indexes(database=None):
+    """
+    Idempotently create every index in INDEXES. Failures (e.g. existing duplicates
+    blocking a unique index) are reported and don't stop the remaining indexes.
+    Returns the list of (collection, name, error) failures.
+    """
+    from pymongo import IndexModel
+
+    database = database if database is not None else db.db
+    failures = []
+    for collection, keys, options in INDEXES:
+        try:
+            await database[collection].create_indexes([IndexModel(keys, **options)])
+        except Exception as e:
+            failures.append((collection, options["name"], str(e)))
+            logger.error(f"Failed to create index {collection}.{options['name']}: {e}")
+    logger.info(f"Ensured {len(INDEXES) - len(failures)}/{len(INDEXES)} indexes")
+    return failures
@@ -0,0 +1,170 @@
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+def default_instance_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+class MongoLease:
+    """
+    A named lease in the 'leases' collection, held by at most one owner until
+    `expires_at`. The owner renews it on every heartbeat; if the owner dies the
+    lease expires and the next caller of `acquire` takes it over (failover).
+    Expiry uses each process's clock, so keep hosts NTP-synced and the TTL well
+    above the expected skew.
+    """
+    COLLECTION = "leases"
+
+    def __init__(self, name: str, owner: str, ttl_seconds: float):
+        self.name = name
+        self.owner = owner
+        self.ttl_seconds = ttl_seconds
+
+    async def acquire(self, db) -> bool:
+        """Take or renew the lease. Returns whether this owner holds it now."""
+        now = datetime.utcnow()
+        try:
+            lease = await db[self.COLLECTION].find_one_and_update(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lte": now}}]},
+                {"$set": {
+                    "owner": self.owner,
+                    "expires_at": now + timedelta(seconds=self.ttl_seconds),
+                    "renewed_at": now,
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Held by someone else and not expired: the upsert collided with their document
+            return False
+        return lease is not None and lease["owner"] == self.owner
+
+    async def release(self, db):
+        await db[self.COLLECTION].delete_one({"_id": self.name, "owner": self.owner})
+
+class TrackerCoordinator:
+    """
+    Decides which price-tracker work this process owns, so scaling out uvicorn or
+    gunicorn workers doesn't multiply SerpApi calls or duplicate history points.
+
+    - TRACKER_PARTITIONS <= 1: a single "price_tracker" lease; its holder (the leader)
+      refreshes everything.
+    - TRACKER_PARTITIONS = N > 1: catalog products are split by `hash_bucket % N`.
+      Live processes register in 'tracker_members' and take partitions round-robin
+      in instance-id order; each partition is also a lease, so two processes never
+      refresh the same partition while membership is changing.
+
+    `heartbeat` runs every TRACKER_HEARTBEAT_SECONDS. A process that dies stops
+    renewing, and its partitions move to the survivors once TRACKER_LEASE_SECONDS pass.
+    A process that can't renew (e.g. cut off from MongoDB) stops working on its
+    partitions once its own view of the leases expires, measured from before the
+    last successful renewal, so it never overlaps with whoever takes them over.
+    """
+    MEMBERS = "tracker_members"
+    LEASE_NAME = "price_tracker"
+
+    def __init__(self, instance_id: str | None = None, partitions: int = settings.TRACKER_PARTITIONS,
+                 ttl_seconds: float = settings.TRACKER_LEASE_SECONDS):
+        self.instance_id = instance_id or settings.TRACKER_INSTANCE_ID or default_instance_id()
+        self.partitions = max(1, partitions)
+        self.ttl_seconds = ttl_seconds
+        self._owned: set[int] = set()
+        self._owned_until = 0.0  # time.monotonic() at which the leases in _owned lapse
+
+    def lease(self, partition: int):
+        name = self.LEASE_NAME if self.partitions == 1 else f"{self.LEASE_NAME}:{partition}"
+        return MongoLease(name, self.instance_id, self.ttl_seconds)
+
+    async def live_members(self, db):
+        now = datetime.utcnow()
+        await db[self.MEMBERS].update_one(
+            {"_id": self.instance_id},
+            {"$set": {"expires_at": now + timedelta(seconds=self.ttl_seconds), "renewed_at": now}},
+            upsert=True,
+        )
+        cursor = db[self.MEMBERS].find({"expires_at": {"$gt": now}}, {"_id": 1}).sort("_id", 1)
+        return [member["_id"] async for member in cursor]
+
+    async def assigned_partitions(self, db):
+        if self.partitions == 1:
+            return {0}
+        members = await self.live_members(db)
+        if self.instance_id not in members:
+            return set()
+        index = members.index(self.instance_id)
+        return {partition for partition in range(self.partitions) if partition % len(members) == index}
+
+    @property
+    def owned(self) -> set:
+        """Partitions whose leases this process still holds (empty once they may have lapsed)."""
+        if time.monotonic() >= self._owned_until:
+            return set()
+        return self._owned
+
+    def lapse(self):
+        """Forget the leases without releasing them (renewal failed; another process will take over)."""
+        if self._owned:
+            logger.warning(f"Tracker instance {self.instance_id} gave up partitions {sorted(self._owned)}")
+        self._owned = set()
+        self._owned_until = 0.0
+
+    async def heartbeat(self, db):
+        """Renew or acquire this process's leases and release the ones no longer assigned to it."""
+        # Leases acquired below expire ttl_seconds after the database's write, which is after now
+        valid_until = time.monotonic() + self.ttl_seconds
+        wanted = await self.assigned_partitions(db)
+        for partition in self._owned - wanted:
+            await self.lease(partition).release(db)
+
+        owned = set()
+        for partition in wanted:
+            if await self.lease(partition).acquire(db):
+                owned.add(partition)
+
+        if owned != self._owned:
+            logger.info(f"Tracker instance {self.instance_id} now owns partitions {sorted(owned)} of {self.partitions}")
+        self._owned = owned
+        self._owned_until = valid_until
+        return owned
+
+    @property
+    def is_leader(self):
+        """Owner of partition 0, which also runs the cluster-wide chores (e.g. alert delivery)."""
+        return 0 in self.owned
+
+    def partition_filter(self):
+        """
+        Catalog filter for the products this process refreshes, or None if it owns nothing.
+        Products from before partitioning (no `hash_bucket`) belong to partition 0.
+        """
+        owned = self.owned
+        if not owned:
+            return None
+        if self.partitions == 1:
+            return {}
+        clauses = [{"hash_bucket": {"$mod": [self.partitions, partition]}} for partition in sorted(owned)]
+        if 0 in owned:
+            clauses.append({"hash_bucket": {"$exists": False}})
+        return {"$or": clauses}
+
+    def share(self):
+        """Fraction of the catalog this process refreshes."""
+        return len(self.owned) / self.partitions
+
+    async def release_all(self, db):
+        for partition in self._owned:
+            await self.lease(partition).release(db)
+        self.lapse()
+        if self.partitions > 1:
+            await db[self.MEMBERS].delete_one({"_id": self.instance_id})
+
+tracker_coordinator = TrackerCoordinator()
@@ -1,49 +1,357 @@
+import asyncio
+import logging
+import math
+import time
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from pymongo import UpdateOne
+from config import get_settings
 from database import get_database
 from services.serpapi_service import serpapi_service
-from datetime import datetime
+from services.upstream_scheduler import upstream_scheduler, UpstreamBusy, BACKGROUND
+from services.rate_limit import AsyncTokenBucket
+from services.price_history import price_history_store
+from services.pricing import parse_price
+from services.catalog import catalog_store, product_hash_bucket
+from services.alerts import alert_rule_store, alert_dispatcher
+from services.product_index import product_index
+from services.metrics import TRACKER_CYCLE_SECONDS, TRACKER_PRICE_CHANGES, TRACKER_PRODUCTS, TRACKER_THROUGHPUT
+from jobs.leader import tracker_coordinator
+from datetime import datetime, timedelta
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
 
 scheduler = AsyncIOScheduler()
+# One pace for the whole process: concurrent refresh_products calls (overlapping
+# Celery batches, an admin refresh during a tick) share it instead of each getting a fresh burst
+tracker_limiter = AsyncTokenBucket(settings.TRACKER_RATE_PER_SECOND, burst=settings.TRACKER_CONCURRENCY)
+
+# Only what the refresh needs; never load the (unbounded) price history
+REFRESH_PROJECTION = {"product_id": 1, "title": 1, "price": 1, "price_minor": 1, "hash_bucket": 1}
 
-async def update_all_prices():
+# Lookup refused by the upstream scheduler: the product stays due for a later tick
+DEFERRED = object()
+
+async def fetch_latest_price(product_id: str, title: str):
+    """
+    Re-search a product and return its latest normalized result, or None.
     """
-    Background job to fetch latest prices for all tracked products.
+    # Re-search the specific product to get latest price
+    # In a real app, you'd use a specific 'product_details' engine if possible
+    results = await serpapi_service.search_products(title, priority=BACKGROUND)
+
+    # Find the match in results
+    return next((item for item in results if item["product_id"] == product_id), None)
+
+def price_changed(product: dict, latest: dict):
+    """Compare integer prices when both sides have one; fall back to the display strings."""
+    if product.get("price_minor") is not None and latest.get("price_minor") is not None:
+        return product["price_minor"] != latest["price_minor"]
+    return product["price"] != latest["price"]
+
+def _due_filter(due_before: datetime):
+    # Rows never checked (no last_checked) sort first and are always due
+    return {"last_checked": {"$not": {"$gte": due_before}}}
+
+async def select_due_products(db, due_before: datetime, limit: int, partition_filter: dict | None = None):
+    """
+    Return up to `limit` catalog product ids not checked since `due_before`, stalest first,
+    optionally only from this process's partitions.
+    """
+    query = _due_filter(due_before)
+    if partition_filter:
+        query = {"$and": [query, partition_filter]}
+    cursor = catalog_store.catalog(db).find(query, {"product_id": 1}) \
+        .sort("last_checked", 1) \
+        .limit(limit)
+    return [row["product_id"] async for row in cursor]
+
+async def refresh_products(db, product_ids: list, raise_errors: bool = False):
+    """
+    Refresh the given catalog products. Each product is looked up once, with
+    bounded concurrency and rate limiting, and all writes for the batch go out
+    in one bulk write per collection. Every product is stamped with
+    `last_checked`, even when the lookup fails, so one bad product can't pin
+    the front of the queue; only lookups refused by the upstream scheduler
+    (quota or budget spent) are left due. Subscribers read prices through the
+    catalog; only a price change is copied onto their subscriptions (the sort
+    fields of their listings). Price changes are then checked against the alert
+    rules. Returns how many products were refreshed.
+    With `raise_errors` (Celery tasks) a failed lookup propagates instead, so
+    the task is retried; a refused one is not retried but made due again, as
+    enqueueing stamped it checked.
+    """
+    products = await catalog_store.catalog(db).find(
+        {"product_id": {"$in": product_ids}}, REFRESH_PROJECTION
+    ).to_list(length=len(product_ids))
+
+    semaphore = asyncio.Semaphore(settings.TRACKER_CONCURRENCY)
+
+    async def refresh(product):
+        async with semaphore:
+            await tracker_limiter.acquire()
+            try:
+                return await fetch_latest_price(product["product_id"], product["title"])
+            except UpstreamBusy as e:
+                logger.debug(f"Deferred price update for {product['title']}: {e}")
+                return DEFERRED
+            except Exception as e:
+                logger.warning(f"Failed to update price for {product['title']}: {e}")
+                if raise_errors:
+                    raise
+                return None
+
+    latest_matches = await asyncio.gather(*(refresh(product) for product in products))
+
+    operations = []
+    history_operations = []
+    changes = []
+    requeue = []
+    now = datetime.utcnow()
+    for product, latest_match in zip(products, latest_matches):
+        if latest_match is DEFERRED:
+            if raise_errors:
+                requeue.append(product["_id"])
+            continue
+        update = {"$set": {"last_checked": now}}
+        if "hash_bucket" not in product:
+            # Catalog entries from before partitioning leave partition 0 once refreshed
+            update["$set"]["hash_bucket"] = product_hash_bucket(product["product_id"])
+        if latest_match and price_changed(product, latest_match):
+            new_price = latest_match["price"]
+            new_price_minor = latest_match.get("price_minor")
+            if new_price_minor is None:
+                new_price_minor, _ = parse_price(new_price)
+
+            logger.debug(f"Price change detected for {product['title']}: {product['price']} -> {new_price}")
+            history_operations.append(
+                price_history_store.record_operation(product["product_id"], new_price, now, new_price_minor)
+            )
+            update["$push"] = price_history_store.preview_push(new_price, now, new_price_minor)
+            if new_price_minor is not None:
+                update["$min"] = {"all_time_low_minor": new_price_minor}
+            changes.append({
+                "product_id": product["product_id"],
+                "title": product["title"],
+                "price": new_price,
+                "price_minor": new_price_minor,
+                "previous_price_minor": product.get("price_minor"),
+            })
+            product_index.update_price(product["product_id"], new_price, new_price_minor)
+            update["$set"].update({
+                "price": new_price,
+                "price_minor": new_price_minor,
+                "currency": latest_match.get("currency"),
+                "last_updated": now,
+            })
+        operations.append(UpdateOne({"_id": product["_id"]}, update))
+
+    if history_operations:
+        await price_history_store.collection(db).bulk_write(history_operations, ordered=False)
+    if operations:
+        await catalog_store.catalog(db).bulk_write(operations, ordered=False)
+    if requeue:
+        # Stamped as checked when they were enqueued: make them due again
+        due_again = now - timedelta(hours=settings.TRACKER_REFRESH_WINDOW_HOURS)
+        await catalog_store.catalog(db).update_many({"_id": {"$in": requeue}}, {"$set": {"last_checked": due_again}})
+    if changes:
+        # Subscribers' listings sort and filter on their copies of price and last_updated
+        await catalog_store.subscriptions(db).bulk_write([
+            catalog_store.subscription_keys_update(change["product_id"], {**change, "last_updated": now})
+            for change in changes
+        ], ordered=False)
+    TRACKER_PRODUCTS.inc(len(operations))
+    if changes:
+        TRACKER_PRICE_CHANGES.inc(len(changes))
+        triggered = await alert_rule_store.evaluate(db, changes, now)
+        if triggered:
+            logger.info(f"{triggered} price alerts triggered")
+    return len(operations)
+
+async def tick_batch_size(db, share: float = 1.0):
+    """
+    Products per tick needed to get through the catalog (or this process's `share`
+    of it) once per refresh window, so upstream load is spread evenly instead of
+    spiking once per window.
+    """
+    ticks_per_window = max(1, settings.TRACKER_REFRESH_WINDOW_HOURS * 3600 / settings.TRACKER_TICK_SECONDS)
+    catalog_size = await catalog_store.catalog(db).estimated_document_count()
+    return max(1, min(settings.TRACKER_MAX_BATCH_SIZE, math.ceil(catalog_size * share / ticks_per_window)))
+
+async def deliver_alerts(db):
+    try:
+        await alert_dispatcher.deliver_pending(db)
+    except Exception as e:
+        # Alerts stay in the outbox and go out on the next tick
+        logger.error(f"Alert delivery failed: {e}")
+
+def record_cycle(cycle: str, products: int, seconds: float):
+    TRACKER_CYCLE_SECONDS.observe(seconds, cycle=cycle)
+    if seconds > 0:
+        TRACKER_THROUGHPUT.set(products / seconds, cycle=cycle)
+
+async def refresh_due_prices():
+    """
+    Scheduler tick: refresh the stalest batch of products that are due.
+    All progress lives in `last_checked`, so a restarted process simply
+    resumes from the stalest products. With leader election on, only the
+    lease holder(s) do any work, each on its own partitions.
     """
     db = await get_database()
     if db is None:
-        print("Database not connected, skipping price update.")
+        logger.warning("Database not connected, skipping price update.")
         return
 
-    tracked_products = await db.products.find().to_list(None)
-    print(f"Running background price update for {len(tracked_products)} products...")
+    partition_filter, share, leader = {}, 1.0, True
+    if settings.TRACKER_LEADER_ELECTION:
+        partition_filter = tracker_coordinator.partition_filter()
+        if partition_filter is None:
+            return
+        share, leader = tracker_coordinator.share(), tracker_coordinator.is_leader
 
-    for product in tracked_products:
-        try:
-            # Re-search the specific product to get latest price
-            # In a real app, you'd use a specific 'product_details' engine if possible
-            results = await serpapi_service.search_products(product["title"])
-            
-            # Find the match in results
-            latest_match = next((item for item in results if item["product_id"] == product["product_id"]), None)
-            
-            if latest_match:
-                new_price = latest_match["price"]
-                
-                # If price changed, add to history
-                if new_price != product["price"]:
-                    print(f"Price change detected for {product['title']}: {product['price']} -> {new_price}")
-                    await db.products.update_one(
-                        {"_id": product["_id"]},
-                        {
-                            "$push": {"history": {"price": new_price, "timestamp": datetime.utcnow()}},
-                            "$set": {"price": new_price, "last_updated": datetime.utcnow()}
-                        }
-                    )
-        except Exception as e:
-            print(f"Failed to update price for {product['title']}: {e}")
+    due_before = datetime.utcnow() - timedelta(hours=settings.TRACKER_REFRESH_WINDOW_HOURS)
+    batch_size = await tick_batch_size(db, share)
+    allowance = upstream_scheduler.background_allowance(await upstream_scheduler.refresh_usage())
+    if allowance is not None and allowance < batch_size:
+        # Spend no more of the SerpApi budget than has been released so far today
+        logger.info(f"Price tracker tick limited to {allowance} of {batch_size} products by the SerpApi budget")
+        batch_size = allowance
+    product_ids = await select_due_products(db, due_before, batch_size, partition_filter) if batch_size else []
+    if settings.TRACKER_USE_CELERY:
+        if product_ids:
+            # The workers count their lookups against the shared budget as they make them
+            logger.info(f"Price tracker tick enqueued {await enqueue_refreshes(db, product_ids)} products")
+        if leader:
+            from jobs.tasks import deliver_alerts_task
+            await asyncio.to_thread(deliver_alerts_task.delay)
+        return
+
+    if product_ids:
+        started = time.perf_counter()
+        refreshed = await refresh_products(db, product_ids)
+        record_cycle("tick", refreshed, time.perf_counter() - started)
+        logger.info(f"Price tracker tick refreshed {refreshed} products")
+    if leader:
+        await deliver_alerts(db)
+
+async def enqueue_refreshes(db, product_ids: list):
+    """
+    Hand products to the Celery workers. Once sent they are stamped as checked,
+    so later ticks don't queue them again while they wait; a failed send leaves
+    them due. Retries are the workers' job (see jobs/tasks.py).
+    """
+    from jobs.tasks import enqueue_refreshes as send_tasks
+
+    # Publishing blocks on the broker: keep it off the event loop
+    sent = await asyncio.to_thread(send_tasks, product_ids)
+    await catalog_store.catalog(db).update_many(
+        {"product_id": {"$in": product_ids}}, {"$set": {"last_checked": datetime.utcnow()}}
+    )
+    return sent
+
+async def update_all_prices(enqueue: bool | None = None):
+    """
+    Refresh every tracked product once, in batches, regardless of the refresh window.
+    Useful for manual runs and scripts; the scheduler uses `refresh_due_prices`.
+    With `enqueue` (default: TRACKER_USE_CELERY) it only produces one Celery
+    task per product and returns as soon as they are queued.
+    """
+    db = await get_database()
+    if db is None:
+        logger.warning("Database not connected, skipping price update.")
+        return
+
+    if settings.TRACKER_USE_CELERY if enqueue is None else enqueue:
+        total = 0
+        cursor = catalog_store.catalog(db).find({}, {"product_id": 1}).sort("_id", 1)
+        batch = []
+        async for product in cursor:
+            batch.append(product["product_id"])
+            if len(batch) >= settings.TRACKER_MAX_BATCH_SIZE:
+                total += await enqueue_refreshes(db, batch)
+                batch = []
+        if batch:
+            total += await enqueue_refreshes(db, batch)
+        logger.info(f"Full price update enqueued {total} products")
+        return
+
+    cycle_started = datetime.utcnow()
+    started = time.perf_counter()
+    total = 0
+    while True:
+        product_ids = await select_due_products(db, cycle_started, settings.TRACKER_MAX_BATCH_SIZE)
+        if not product_ids:
+            break
+        refreshed = await refresh_products(db, product_ids)
+        if not refreshed:
+            logger.warning("Full price update stopped early: the SerpApi budget is spent")
+            break
+        total += refreshed
+    record_cycle("full", total, time.perf_counter() - started)
+    logger.info(f"Full price update refreshed {total} products")
+    await deliver_alerts(db)
+
+async def collect_catalog_garbage():
+    """Drop products nobody has subscribed to for CATALOG_GC_GRACE_HOURS, with their price history."""
+    db = await get_database()
+    if db is None:
+        return
+    if settings.TRACKER_LEADER_ELECTION and not tracker_coordinator.is_leader:
+        return
+    older_than = datetime.utcnow() - timedelta(hours=settings.CATALOG_GC_GRACE_HOURS)
+    try:
+        removed = await catalog_store.collect_garbage(db, older_than)
+    except Exception as e:
+        logger.error(f"Catalog garbage collection failed: {e}")
+        return
+    if removed:
+        logger.info(f"Dropped {len(removed)} unsubscribed products and their price history")
+
+async def tracker_heartbeat():
+    db = await get_database()
+    if db is None:
+        return
+    try:
+        await tracker_coordinator.heartbeat(db)
+    except Exception as e:
+        # Without a renewal the leases lapse and another process takes over: stop
+        # refreshing (and delivering alerts) now rather than alongside it
+        logger.error(f"Tracker heartbeat failed: {e}")
+        tracker_coordinator.lapse()
 
 def start_tracker():
-    # Run every 6 hours
-    scheduler.add_job(update_all_prices, 'interval', hours=6)
+    if settings.TRACKER_USE_CELERY:
+        # Fail at startup rather than queue refreshes no worker will ever see
+        from celery_app import check_broker
+        check_broker()
+    if settings.TRACKER_LEADER_ELECTION:
+        scheduler.add_job(
+            tracker_heartbeat, 'interval',
+            seconds=settings.TRACKER_HEARTBEAT_SECONDS,
+            max_instances=1, coalesce=True,
+            next_run_time=datetime.now(),
+        )
+    scheduler.add_job(
+        refresh_due_prices, 'interval',
+        seconds=settings.TRACKER_TICK_SECONDS,
+        max_instances=1, coalesce=True,
+    )
+    scheduler.add_job(
+        collect_catalog_garbage, 'interval',
+        minutes=settings.CATALOG_GC_INTERVAL_MINUTES,
+        max_instances=1, coalesce=True,
+    )
     scheduler.start()
-    print("Price Tracker Scheduler started (Interval: 6h)")
+    logger.info(f"Price Tracker Scheduler started (tick: {settings.TRACKER_TICK_SECONDS}s, "
+          f"window: {settings.TRACKER_REFRESH_WINDOW_HOURS}h)")
+
+async def stop_tracker():
+    """Stop scheduling and hand this process's leases back so another process takes over immediately."""
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    db = await get_database()
+    if settings.TRACKER_LEADER_ELECTION and db is not None:
+        try:
+            await tracker_coordinator.release_all(db)
+        except Exception as e:
+            logger.error(f"Failed to release tracker leases: {e}")
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from celery import group
+from celery_app import celery_app
+from config import get_settings
+from database import get_database, connect_to_mongo
+from jobs.leader import MongoLease, default_instance_id
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Held while a worker drains the alert outbox, so two workers never send the same alerts
+ALERT_DELIVERY_LEASE = "alert_delivery"
+
+# Motor and the shared SerpApi client are bound to the event loop they were created on,
+# so each worker process keeps one loop for all its tasks instead of asyncio.run per task
+_loop: asyncio.AbstractEventLoop | None = None
+
+def run_async(coroutine):
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coroutine)
+
+async def _worker_database():
+    db = await get_database()
+    if db is None:
+        await connect_to_mongo()
+        db = await get_database()
+    return db
+
+@celery_app.task(
+    bind=True,
+    name="tracker.refresh_product",
+    acks_late=True,
+    rate_limit=settings.CELERY_REFRESH_RATE_LIMIT,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_jitter=True,
+    max_retries=settings.CELERY_REFRESH_MAX_RETRIES,
+)
+def refresh_product_task(self, product_id: str):
+    """
+    Refresh one catalog product: look up its latest price, record a change and
+    evaluate alert rules. A failed lookup raises, so Celery retries it with backoff.
+    Safe to run twice: the second run sees no change and only stamps `last_checked`.
+    """
+    from jobs.price_tracker import refresh_products
+
+    async def refresh():
+        return await refresh_products(await _worker_database(), [product_id], raise_errors=True)
+
+    return run_async(refresh())
+
+@celery_app.task(name="tracker.deliver_alerts", acks_late=True)
+def deliver_alerts_task():
+    """
+    Drain the alert outbox; queued after each enqueued refresh cycle. Skipped
+    while another worker holds the delivery lease.
+    """
+    from jobs.price_tracker import deliver_alerts
+
+    async def deliver():
+        db = await _worker_database()
+        lease = MongoLease(ALERT_DELIVERY_LEASE, default_instance_id(), settings.ALERT_DELIVERY_LEASE_SECONDS)
+        if not await lease.acquire(db):
+            logger.debug("Alert delivery already running on another worker")
+            return False
+        try:
+            await deliver_alerts(db)
+        finally:
+            await lease.release(db)
+        return True
+
+    return run_async(deliver())
+
+def enqueue_refreshes(product_ids: list):
+    """Send one refresh task per product, in a single group publish. Blocking: call it off the event loop."""
+    group(refresh_product_task.s(product_id) for product_id in product_ids).apply_async()
+    return len(product_ids)
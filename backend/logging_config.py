@@ -0,0 +1,44 @@
+import json
+import logging
+import sys
+from datetime import datetime, timezone
+from config import get_settings
+
+settings = get_settings()
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Libraries that log every request (httpx's request lines include SerpApi's api_key
+# query parameter) or every scheduler run; only their warnings are kept
+QUIET_LOGGERS = ("httpx", "httpcore", "apscheduler")
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging(level: str | None = None, log_format: str | None = None):
+    """
+    Route every module's `logging.getLogger(__name__)` output to stdout at LOG_LEVEL,
+    as plain text or, with LOG_FORMAT=json, one JSON object per line.
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    if (log_format or settings.LOG_FORMAT) == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel((level or settings.LOG_LEVEL).upper())
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
@@ -1,10 +1,25 @@
+import asyncio
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from config import get_settings
+from logging_config import configure_logging
 from routes import products, chat, tracker, user
-from jobs.price_tracker import start_tracker
+from jobs.price_tracker import start_tracker, stop_tracker
+from services.serpapi_service import serpapi_service
+from services.upstream_scheduler import upstream_scheduler
+from services.answer_cache import answer_cache
+from services.ai_service import ai_service
+from services.product_index import product_index
+from services.alerts import alert_dispatcher
+from services.history_writer import history_writer
+from services.chat_sessions import chat_sessions
+from services.metrics import registry, MetricsMiddleware, collect_service_stats
 
 settings = get_settings()
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="PriceWise API", version="1.0.0")
 
@@ -26,15 +41,65 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.METRICS_ENABLED:
+    # Added last, so it is outermost and also times CORS preflights and errors
+    app.add_middleware(MetricsMiddleware)
+    registry.on_collect(collect_service_stats)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus text exposition of this worker process's metrics."""
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+async def load_product_index(db):
+    if db is None:
+        return
+    try:
+        await product_index.load_catalog(db)
+    except Exception as e:
+        # Chat refinements still work from search results
+        logger.warning(f"Could not load tracked products into the product index: {e}")
+
+async def create_indexes():
+    from database import ensure_indexes
+    try:
+        await asyncio.wait_for(ensure_indexes(), settings.INDEX_CREATION_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.error(
+            f"Index creation did not finish within {settings.INDEX_CREATION_TIMEOUT_SECONDS}s; "
+            "run `python -m scripts.ensure_indexes` once MongoDB is reachable"
+        )
+
 @app.on_event("startup")
 async def startup_db_client():
-    from database import connect_to_mongo
+    from database import connect_to_mongo, get_database
     await connect_to_mongo()
+    if settings.CREATE_INDEXES_ON_STARTUP:
+        # In the background: an unreachable or slow MongoDB must not hold up startup
+        app.state.index_creation = asyncio.create_task(create_indexes())
+    if settings.PRODUCT_INDEX_ENABLED and settings.PRODUCT_INDEX_LOAD_TRACKED:
+        # In the background: a large catalog must not hold up the first request
+        app.state.product_index_load = asyncio.create_task(load_product_index(await get_database()))
+    await serpapi_service.start()
+    await history_writer.start()
     start_tracker()
+    if settings.AI_PREWARM:
+        # In the background, so requests are served while the SDKs load
+        app.state.ai_prewarm = asyncio.create_task(ai_service.prewarm())
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     from database import close_mongo_connection
+    index_creation = getattr(app.state, "index_creation", None)
+    if index_creation is not None:
+        index_creation.cancel()
+    await stop_tracker()
+    await history_writer.stop()
+    await chat_sessions.flush()
+    await serpapi_service.close()
+    await upstream_scheduler.close()
+    await answer_cache.close()
+    await alert_dispatcher.close()
     await close_mongo_connection()
 
 @app.get("/health")
@@ -0,0 +1,46 @@
+from pydantic import BaseModel, Field
+from typing import Optional, Literal
+from datetime import datetime
+
+AlertKind = Literal["target", "percent_drop", "all_time_low"]
+
+class AlertRuleCreate(BaseModel):
+    clerk_id: str
+    product_id: str
+    kind: AlertKind
+    target_price: Optional[str] = None # kind == "target", e.g. "₹1,499" or "1499"
+    percent: Optional[float] = Field(None, gt=0, lt=100) # kind == "percent_drop", from the current price
+
+class AlertRule(BaseModel):
+    """
+    A price-drop rule ('alert_rules' collection). Every kind is reduced to
+    `trigger_below_minor`: the rule fires when the price drops to or below it.
+    """
+    id: Optional[str] = Field(None, alias="_id")
+    clerk_id: str
+    product_id: str
+    kind: AlertKind
+    target_price: Optional[str] = None
+    percent: Optional[float] = None
+    baseline_minor: Optional[int] = None # Price the rule was set against (paise)
+    trigger_below_minor: int
+    active: bool = True
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    last_triggered_at: Optional[datetime] = None
+
+class Alert(BaseModel):
+    """A triggered rule waiting in (or delivered from) the 'alert_outbox' collection."""
+    id: Optional[str] = Field(None, alias="_id")
+    rule_id: str
+    clerk_id: str
+    product_id: str
+    kind: AlertKind
+    title: Optional[str] = None
+    price: str
+    price_minor: int
+    previous_price_minor: Optional[int] = None
+    status: Literal["pending", "sending", "sent", "failed"] = "pending"
+    attempts: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    claimed_at: Optional[datetime] = None  # When a deliverer took it ("sending")
+    sent_at: Optional[datetime] = None
@@ -4,21 +4,43 @@ from datetime import datetime
 
 class PriceHistory(BaseModel):
     price: str
+    price_minor: Optional[int] = None # Integer minor units (paise)
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
+class PriceHistoryBucket(BaseModel):
+    """A bounded run of price points for one product in the 'price_history' collection."""
+    product_id: str
+    count: int = 0
+    first_ts: datetime
+    last_ts: datetime
+    points: List[PriceHistory] = []
+
 class Product(BaseModel):
     id: Optional[str] = Field(None, alias="_id")
     title: str
     price: str
+    price_minor: Optional[int] = None # Integer minor units (paise), parsed once at ingest
+    currency: Optional[str] = None # ISO 4217 code, e.g. "INR"
     source: str
     link: str
     thumbnail: Optional[str] = None
     rating: Optional[float] = None
     reviews: Optional[int] = None
     product_id: str # External ID from SerpApi
-    history: List[PriceHistory] = []
+    history: List[PriceHistory] = [] # Most recent points only; full series lives in price_history
     last_updated: datetime = Field(default_factory=datetime.utcnow)
+    last_checked: Optional[datetime] = None
+    subscribers: int = 0 # Users tracking this product ('catalog' collection)
     
+class Subscription(BaseModel):
+    """A user's tracker on a catalog product ('subscriptions' collection)."""
+    id: Optional[str] = Field(None, alias="_id")
+    clerk_id: str
+    product_id: str # Catalog product (external ID from SerpApi)
+    added_at: datetime = Field(default_factory=datetime.utcnow)
+    target_price: Optional[str] = None
+    target_price_minor: Optional[int] = None
+
 class Watchlist(BaseModel):
     user_id: str
     product_ids: List[str] = [] # List of internal MongoDB IDs
@@ -1,10 +1,23 @@
-from fastapi import APIRouter, HTTPException, Body
+import logging
+from fastapi import APIRouter, HTTPException, Body, Depends, Request
+from fastapi.responses import StreamingResponse
 from services.ai_service import ai_service
+from services.answer_cache import answer_cache
 from services.serpapi_service import serpapi_service
+from services.upstream_scheduler import client_key
+from services.intent_router import intent_router, REFINE
+from services.metrics import CHAT_SEARCH_ROUTES
+from config import get_settings
 from pydantic import BaseModel
 from typing import Optional, List
-from database import get_database
 from models.history import HistoryItem
+from services.history_writer import history_writer
+from services.chat_sessions import chat_sessions
+from routes.user import optional_clerk_token
+import json
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
@@ -13,51 +26,223 @@ class ChatRequest(BaseModel):
     include_search: bool = True
     context_products: Optional[List] = None
     user_id: Optional[str] = None # Clerk ID
-    history: Optional[List[dict]] = []
+    history: Optional[List[dict]] = [] # Only for clients without sessions
+    session_id: Optional[str] = None # From the previous response; omit to start a conversation
+
+class ChatContext:
+    """
+    What a chat turn is answered from: the server-side session (turns, summary and
+    last results), or, for clients still replaying history, what the request carries.
+    """
+
+    def __init__(self, request: ChatRequest, session=None):
+        self.session = session
+        self.summary = ""
+        if session is not None:
+            self.history = chat_sessions.history(session)
+            self.summary = session.summary
+            self.products = request.context_products or session.last_results or None
+        else:
+            self.history = request.history or []
+            self.products = request.context_products
+
+    @property
+    def session_id(self):
+        return self.session.session_id if self.session is not None else None
+
+    def record(self, request: ChatRequest, response: str, results: list):
+        # Saved in the background, off the request path
+        if self.session is not None:
+            chat_sessions.record(self.session, request.message, response, results)
+
+async def _chat_context(request: ChatRequest):
+    # A client sending history without a session id predates sessions: keep using its history
+    if not settings.CHAT_SESSIONS_ENABLED or (request.history and not request.session_id):
+        return ChatContext(request)
+    session = await chat_sessions.get_or_create(request.session_id, request.user_id)
+    return ChatContext(request, session)
+
+async def _search_for_chat(request: ChatRequest, context: ChatContext, user_key: str | None = None):
+    if request.include_search and settings.PRODUCT_INDEX_ENABLED:
+        # Follow-ups like "only Samsung under 15k" filter the products already shown, locally
+        intent = intent_router.route(request.message, context.history, context.products)
+        if intent.action == REFINE:
+            results = intent_router.refine(intent)
+            logger.debug(f"Refined {len(intent.scope)} products to {len(results)} locally: {intent.filters}")
+            if results:
+                intent_router.index.remember(request.message, results)
+                CHAT_SEARCH_ROUTES.inc(route="refine")
+                return results
+            # Nothing shown so far matches: look further afield
+
+    if request.include_search and len(request.message.split()) > 2:
+        CHAT_SEARCH_ROUTES.inc(route="search")
+        # Simple heuristic: if message is more than 2 words, try searching
+        try:
+            # Refused (rate limited) searches land here too: the model answers without fresh results
+            return await serpapi_service.search_products(request.message, user_key=user_key)
+        except Exception as e:
+            logger.warning(f"Search failed (continuing without results): {e}")
+    return []
+
+async def _save_chat_history(request: ChatRequest, response: str, results: list):
+    # Save to History if Authenticated (queued; written in batches off the request path)
+    if request.user_id:
+        try:
+            history_item = HistoryItem(
+                user_id=request.user_id,
+                type="chat",
+                query=request.message,
+                response_summary=response[:200] + "..." if len(response) > 200 else response,
+                related_products=len(results)
+            )
+            await history_writer.enqueue(history_item)
+        except Exception as e:
+            logger.error(f"Failed to save chat history: {e}")
+
+def _sse(event: str, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
 @router.post("/")
-async def chat_with_ai(request: ChatRequest = Body(...)):
+async def chat_with_ai(http_request: Request, request: ChatRequest = Body(...)):
     """
     Unified AI Chat Endpoint.
     1. Optionally searches for products if intent is detected or requested.
     2. Sends context + results to AI for reasoning.
-    3. Saves conversation to history if user_id is provided.
+    3. Records the turn in the chat session and saves it to history if user_id is provided.
+    The response carries the `session_id` to send with the next message.
     """
     try:
-        results = []
-        if request.include_search and len(request.message.split()) > 2:
-            # Simple heuristic: if message is more than 2 words, try searching
-            try:
-                results = await serpapi_service.search_products(request.message)
-            except Exception as e:
-                print(f"Search failed (continuing without results): {e}")
-                results = []
-        
+        context = await _chat_context(request)
+        results = await _search_for_chat(request, context, request.user_id or client_key(http_request))
+
         response = await ai_service.get_chat_response(
             user_query=request.message,
-            search_results=results or request.context_products,
-            history=request.history or []
+            search_results=results or context.products,
+            history=context.history,
+            summary=context.summary
         )
-        
-        # Save to History if Authenticated
-        if request.user_id:
-            try:
-                db = await get_database()
-                history_item = HistoryItem(
-                    user_id=request.user_id,
-                    type="chat",
-                    query=request.message,
-                    response_summary=response[:200] + "..." if len(response) > 200 else response,
-                    related_products=len(results)
-                )
-                await db.history.insert_one(history_item.dict(by_alias=True))
-            except Exception as e:
-                print(f"Failed to save chat history: {e}")
+
+        context.record(request, response, results)
+        await _save_chat_history(request, response, results)
 
         return {
             "response": response,
-            "results": results
+            "results": results,
+            "session_id": context.session_id
         }
     except Exception as e:
-        print(f"Chat Error: {e}")
+        logger.exception(f"Chat Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/stream")
+async def stream_chat_with_ai(http_request: Request, request: ChatRequest = Body(...)):
+    """
+    Streaming variant of the chat endpoint, sent as Server-Sent Events:
+    - `session`: {"session_id": ...} to send with the next message (sent first)
+    - `results`: the product results used as context (sent first)
+    - `token`: {"text": ...} chunks of the answer as the model produces them
+    - `done`: {"response": ...} the full answer
+    - `error`: {"detail": ...} if the stream fails midway
+    """
+    user_key = request.user_id or client_key(http_request)
+
+    async def event_stream():
+        try:
+            context = await _chat_context(request)
+            yield _sse("session", {"session_id": context.session_id})
+            results = await _search_for_chat(request, context, user_key)
+            yield _sse("results", results)
+
+            chunks = []
+            async for chunk in ai_service.stream_chat_response(
+                user_query=request.message,
+                search_results=results or context.products,
+                history=context.history,
+                summary=context.summary
+            ):
+                chunks.append(chunk)
+                yield _sse("token", {"text": chunk})
+
+            response = "".join(chunks)
+            yield _sse("done", {"response": response})
+            context.record(request, response, results)
+            await _save_chat_history(request, response, results)
+        except Exception as e:
+            logger.exception(f"Chat Stream Error: {e}")
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Stop proxies (e.g. nginx) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/cache/stats")
+async def answer_cache_stats():
+    """
+    Hit-rate counters for the AI answer cache.
+    """
+    return answer_cache.stats()
+
+@router.get("/providers/stats")
+async def provider_stats():
+    """
+    Circuit state, failure counts and recent latency percentiles for each AI provider.
+    """
+    return ai_service.provider_stats()
+
+@router.get("/sessions/stats")
+async def chat_session_stats():
+    """
+    Cache and write counters for server-side chat sessions.
+    """
+    return chat_sessions.stats()
+
+async def _owned_session(session_id: str, clerk_id: str | None):
+    """
+    Load a session for its owner. Anonymous sessions are open to whoever holds
+    their (unguessable) id; a user's session needs that user's token.
+    """
+    try:
+        session = await chat_sessions.get(session_id)
+    except Exception as e:
+        logger.exception(f"Chat session Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if session is None:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    if session.user_id is not None:
+        if clerk_id is None:
+            raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
+        if session.user_id != clerk_id:
+            raise HTTPException(status_code=403, detail="Access denied")
+    return session
+
+@router.get("/sessions/{session_id}")
+async def get_chat_session(session_id: str, clerk_id: Optional[str] = Depends(optional_clerk_token)):
+    """
+    A chat session: its recent turns, the summary of older ones and the last results.
+    """
+    session = await _owned_session(session_id, clerk_id)
+    return {
+        "session_id": session.session_id,
+        "user_id": session.user_id,
+        "turns": session.turns,
+        "summary": session.summary,
+        "last_results": session.last_results,
+        "created_at": session.created_at,
+    }
+
+@router.delete("/sessions/{session_id}")
+async def delete_chat_session(session_id: str, clerk_id: Optional[str] = Depends(optional_clerk_token)):
+    """
+    Forget a chat session (e.g. when the user clears the conversation).
+    """
+    await _owned_session(session_id, clerk_id)
+    try:
+        deleted = await chat_sessions.delete(session_id)
+    except Exception as e:
+        logger.exception(f"Chat session Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    return {"deleted": deleted}
@@ -1,16 +1,54 @@
-from fastapi import APIRouter, HTTPException, Query
+import logging
+import math
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import Optional, Literal
 from services.serpapi_service import serpapi_service
+from services.upstream_scheduler import upstream_scheduler, UpstreamBusy, client_key
+from services.pricing import filter_by_price
+from services.product_index import product_index
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/products", tags=["products"])
 
 @router.get("/search")
-async def search_products(q: str = Query(..., description="Product search query")):
+async def search_products(
+    request: Request,
+    q: str = Query(..., description="Product search query"),
+    min_price: Optional[float] = Query(None, ge=0, description="Minimum price in rupees"),
+    max_price: Optional[float] = Query(None, ge=0, description="Maximum price in rupees"),
+    sort: Optional[Literal["price_asc", "price_desc"]] = Query(None, description="Sort by numeric price"),
+):
     """
     Search for products using SerpApi (Google Shopping).
     """
     try:
-        results = await serpapi_service.search_products(q)
-        return {"results": results}
+        results = await serpapi_service.search_products(q, user_key=client_key(request))
+        return {"results": filter_by_price(results, min_price, max_price, sort)}
+    except UpstreamBusy as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
     except Exception as e:
-        print(f"Search Error: {e}")
+        logger.exception(f"Search Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/cache/stats")
+async def search_cache_stats():
+    """
+    Hit/miss/eviction counters for the SerpApi search cache.
+    """
+    return serpapi_service.cache_stats()
+
+@router.get("/upstream/stats")
+async def upstream_stats():
+    """
+    SerpApi admission: queued calls per priority, calls used today and the remaining quota/budget.
+    """
+    await upstream_scheduler.refresh_usage()
+    return upstream_scheduler.stats()
+
+@router.get("/index/stats")
+async def product_index_stats():
+    """
+    Size of the local product index that chat refinements are answered from.
+    """
+    return product_index.stats()
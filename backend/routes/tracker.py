@@ -1,77 +1,180 @@
-from fastapi import APIRouter, HTTPException, Depends
+import logging
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional, Literal, List
+from pydantic import BaseModel, Field
+from config import get_settings
 from database import get_database
-from models.product import Product, PriceHistory
-from services.serpapi_service import serpapi_service
+from services.price_history import price_history_store, to_naive_utc
+from services.pricing import price_range_filter
+from services.catalog import catalog_store
+from services.pagination import paginate, InvalidCursor, CURSOR_VALUE_FIELD
+from services.alerts import alert_rule_store
+from services.product_index import product_index
+from models.alert import AlertRuleCreate
 from datetime import datetime
 from bson import ObjectId
 
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/tracker", tags=["tracker"])
 
+# Left out of listings unless include_history=true (full history: GET /history/{product_id})
+HEAVY_PRODUCT_FIELDS = ("history",)
+
 @router.post("/track")
 async def track_product(product_data: dict, db = Depends(get_database)):
     """
     Add a product to the database to start tracking its price.
-    Accepts optional 'clerk_id' in payload to associate tracker with a user.
+    Accepts optional 'clerk_id' in payload to associate tracker with a user,
+    and an optional 'target_price' for that user's subscription.
     """
     try:
-        # Check if already tracking for the same user+product combo
-        query: dict = {"product_id": product_data["product_id"]}
-        if "clerk_id" in product_data:
-            query["clerk_id"] = product_data["clerk_id"]
-
-        existing = await db.products.find_one(query)
-        if existing:
-            return {"message": "Already tracking this product", "id": str(existing["_id"])}
-
-        # Initial history entry
-        product_data["history"] = [
-            {"price": product_data["price"], "timestamp": datetime.utcnow()}
-        ]
-        product_data["last_updated"] = datetime.utcnow()
-
-        result = await db.products.insert_one(product_data)
-        return {"message": "Started tracking product", "id": str(result.inserted_id)}
+        clerk_id = product_data.pop("clerk_id", None)
+        target_price = product_data.pop("target_price", None)
+        created, tracker_id = await catalog_store.subscribe(db, product_data, clerk_id, target_price)
+        product_index.add(product_data)
+        if not created:
+            return {"message": "Already tracking this product", "id": tracker_id}
+        return {"message": "Started tracking product", "id": tracker_id}
     except Exception as e:
-        print(f"Track Error: {e}")
+        logger.exception(f"Track Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+class BulkTrackRequest(BaseModel):
+    clerk_id: Optional[str] = None
+    products: List[dict] = Field(..., max_length=settings.BULK_MAX_ITEMS)
+
+class BulkUntrackRequest(BaseModel):
+    product_ids: List[str] = Field(..., max_length=settings.BULK_MAX_ITEMS)
+
+# Fields a product needs before it can be tracked
+REQUIRED_TRACK_FIELDS = ("product_id", "title", "price")
+
+@router.post("/track/bulk")
+async def track_products_bulk(request: BulkTrackRequest, db = Depends(get_database)):
+    """
+    Track a list of products (e.g. a wishlist import) in one request, with upsert
+    semantics: repeats and double submits are reported as "exists", not duplicated.
+    Returns one result per product, in request order.
+    """
+    try:
+        results = [None] * len(request.products)
+        valid = []
+        for index, product in enumerate(request.products):
+            missing = [field for field in REQUIRED_TRACK_FIELDS if not product.get(field)]
+            if missing:
+                results[index] = {"product_id": product.get("product_id"), "status": "invalid",
+                                  "detail": f"Missing {', '.join(missing)}"}
+            else:
+                product.pop("clerk_id", None)
+                valid.append((index, product))
+
+        applied = await catalog_store.subscribe_many(db, [product for _, product in valid], request.clerk_id)
+        product_index.add_many(product for _, product in valid)
+        for (index, _), result in zip(valid, applied):
+            results[index] = result
+        return {"results": results}
+    except Exception as e:
+        logger.exception(f"Bulk Track Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/history/{product_id}")
-async def get_price_history(product_id: str, db = Depends(get_database)):
-    """Get the full price history for a specific product."""
+async def get_price_history(
+    product_id: str,
+    start: Optional[datetime] = Query(None, description="Only points at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only points at or before this time"),
+    limit: int = Query(500, ge=1, le=settings.PRICE_HISTORY_MAX_LIMIT, description="Most recent N points"),
+    db = Depends(get_database),
+):
+    """Get the price history for a specific product, oldest point first."""
+    start, end = to_naive_utc(start), to_naive_utc(end)
     try:
-        product = await db.products.find_one({"product_id": product_id})
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        return {"history": product.get("history", [])}
+        history = await price_history_store.get_history(db, product_id, start=start, end=end, limit=limit)
+        if not history:
+            # Not migrated to price_history yet (see scripts/migrate_price_history.py): use the inline preview
+            product = await catalog_store.catalog(db).find_one({"product_id": product_id}, {"history": 1})
+            if not product:
+                raise HTTPException(status_code=404, detail="Product not found")
+            history = [
+                point for point in product.get("history", [])
+                if (not start or point["timestamp"] >= start) and (not end or point["timestamp"] <= end)
+            ][-limit:]
+        return {"history": history}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/tracked")
-async def get_tracked_products(db = Depends(get_database)):
-    """Get ALL tracked products (admin / global view)."""
+async def get_tracked_products(
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    include_history: bool = Query(False, description="Include the inline price history preview"),
+    db = Depends(get_database),
+):
+    """Get ALL tracked products (admin / global view): the catalog, walked in _id order page by page."""
     try:
-        products = await db.products.find().to_list(length=100)
-        for p in products:
-            p["id"] = str(p["_id"])
-            del p["_id"]
-        return {"products": products}
+        products, next_cursor = await paginate(
+            catalog_store.catalog(db), {}, limit=limit, cursor=cursor,
+            exclude=() if include_history else HEAVY_PRODUCT_FIELDS,
+        )
+        return {"products": products, "next_cursor": next_cursor}
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Error fetching tracked products: {e}")
+        logger.exception(f"Error fetching tracked products: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/tracked/{clerk_id}")
-async def get_user_tracked_products(clerk_id: str, db = Depends(get_database)):
+async def get_user_tracked_products(
+    clerk_id: str,
+    min_price: Optional[float] = Query(None, ge=0, description="Minimum price in rupees"),
+    max_price: Optional[float] = Query(None, ge=0, description="Maximum price in rupees"),
+    sort: Literal["last_updated", "price_asc", "price_desc"] = Query("last_updated"),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    include_history: bool = Query(False, description="Include the inline price history preview"),
+    db = Depends(get_database),
+):
     """
-    Get all products tracked by a specific Clerk user.
+    Get the products tracked by a specific Clerk user, optionally filtered by price range.
+    Paginated: pass the returned `next_cursor` back as `cursor` (with the same filters) for the next page.
     """
     try:
-        products = await db.products.find({"clerk_id": clerk_id}).sort("last_updated", -1).to_list(length=100)
-        for p in products:
-            p["id"] = str(p["_id"])
-            del p["_id"]
-        return {"products": products}
+        # Filter, sort and page on the subscriptions' copies of the catalog sort fields
+        # (one index range scan); only the page's rows are joined to the catalog
+        sort_field, direction = {
+            "last_updated": ("last_updated", -1),
+            "price_asc": ("price_minor", 1),
+            "price_desc": ("price_minor", -1),
+        }[sort]
+        products, next_cursor = await paginate(
+            catalog_store.subscriptions(db),
+            {"clerk_id": clerk_id, **price_range_filter(min_price, max_price)},
+            sort_field, direction, limit=limit, cursor=cursor,
+            page_stages=catalog_store.subscription_join(carry=(CURSOR_VALUE_FIELD,)),
+            exclude=("subscribers",) if include_history else ("subscribers", *HEAVY_PRODUCT_FIELDS),
+        )
+        return {"products": products, "next_cursor": next_cursor}
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Error fetching user tracked products: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/tracked/{clerk_id}/remove")
+async def stop_tracking_bulk(clerk_id: str, request: BulkUntrackRequest, db = Depends(get_database)):
+    """
+    Remove several products from the user's tracker. Returns one result per id.
+    """
+    try:
+        results = await catalog_store.unsubscribe_many(db, clerk_id, request.product_ids)
+        await alert_rule_store.delete_for_products(
+            db, clerk_id, [result["product_id"] for result in results if result["status"] == "removed"]
+        )
+        return {"results": results}
     except Exception as e:
-        print(f"Error fetching user tracked products: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/tracked/{clerk_id}/{product_id}")
@@ -80,12 +183,75 @@ async def stop_tracking(clerk_id: str, product_id: str, db = Depends(get_databas
     Remove a product from the user's tracker.
     """
     try:
-        result = await db.products.delete_one({
-            "clerk_id": clerk_id,
-            "product_id": product_id
-        })
-        if result.deleted_count == 0:
+        if not await catalog_store.unsubscribe(db, clerk_id, product_id):
             raise HTTPException(status_code=404, detail="Tracked product not found")
+        await alert_rule_store.delete_for_products(db, clerk_id, [product_id])
         return {"message": "Stopped tracking product"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# --- Price-drop alerts ---
+
+@router.post("/alerts")
+async def create_alert(rule: AlertRuleCreate, db = Depends(get_database)):
+    """
+    Register a price-drop alert on a product the user tracks:
+    - target: fire when the price reaches `target_price`
+    - percent_drop: fire when the price falls `percent`% below the current price
+    - all_time_low: fire whenever the price drops below its lowest recorded value
+    """
+    try:
+        return await alert_rule_store.create_rule(db, rule)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Create Alert Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/alerts/{clerk_id}")
+async def get_alerts(
+    clerk_id: str,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db = Depends(get_database),
+):
+    """Get a user's alert rules, newest first."""
+    try:
+        rules, next_cursor = await paginate(alert_rule_store.rules(db), {"clerk_id": clerk_id}, limit=limit, cursor=cursor)
+        return {"rules": rules, "next_cursor": next_cursor}
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/alerts/{clerk_id}/triggered")
+async def get_triggered_alerts(
+    clerk_id: str,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db = Depends(get_database),
+):
+    """Get the alerts triggered for a user, newest first."""
+    try:
+        alerts, next_cursor = await paginate(alert_rule_store.outbox(db), {"clerk_id": clerk_id}, limit=limit, cursor=cursor)
+        return {"alerts": alerts, "next_cursor": next_cursor}
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/alerts/{clerk_id}/{rule_id}")
+async def delete_alert(clerk_id: str, rule_id: str, db = Depends(get_database)):
+    """Remove one of the user's alert rules."""
+    try:
+        if not ObjectId.is_valid(rule_id) or not await alert_rule_store.delete_rule(db, clerk_id, ObjectId(rule_id)):
+            raise HTTPException(status_code=404, detail="Alert rule not found")
+        return {"message": "Alert rule removed"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
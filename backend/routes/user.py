@@ -1,14 +1,29 @@
-from fastapi import APIRouter, HTTPException, Body, Header, Depends
+from fastapi import APIRouter, HTTPException, Header, Depends, Query
 from typing import List, Optional
 from pydantic import BaseModel, Field
 from models.user import User, UserCreate
 from models.history import HistoryItem
 from database import get_database
+from services.history_writer import history_writer
+from services.clerk_auth import clerk_verifier
+from services.pagination import paginate, InvalidCursor
+from config import get_settings
 from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 import jwt
 import logging
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# What a bookmark card needs; the rest of the saved product is only sent with full=true
+BOOKMARK_SUMMARY_FIELDS = (
+    "user_id", "timestamp",
+    "product.product_id", "product.title", "product.price", "product.price_minor",
+    "product.currency", "product.source", "product.link", "product.thumbnail",
+    "product.rating", "product.reviews",
+)
 
 async def verify_clerk_token(authorization: str = Header(None)) -> str:
     if not authorization or not authorization.startswith("Bearer "):
@@ -16,9 +31,8 @@ async def verify_clerk_token(authorization: str = Header(None)) -> str:
     
     token = authorization.split(" ")[1]
     try:
-        # For full production, fetch JWKS from Clerk and verify signature using PyJWT
-        # Here we do a basic decode to check validity and expiration
-        decoded = jwt.decode(token, options={"verify_signature": False})
+        # Signature checked against Clerk's cached JWKS; verified tokens are memoized until exp
+        decoded = await clerk_verifier.verify(token)
         clerk_id = decoded.get("sub")
         if not clerk_id:
             raise HTTPException(status_code=401, detail="Invalid token payload: missing sub")
@@ -32,6 +46,12 @@ async def verify_clerk_token(authorization: str = Header(None)) -> str:
         logger.error(f"JWT Verification failed: {str(e)}")
         raise HTTPException(status_code=401, detail="Authentication failed")
 
+async def optional_clerk_token(authorization: str = Header(None)) -> str | None:
+    """The caller's Clerk ID when a bearer token is sent (and valid), None for anonymous callers."""
+    if not authorization:
+        return None
+    return await verify_clerk_token(authorization)
+
 router = APIRouter(prefix="/user", tags=["User"])
 
 @router.post("/sync")
@@ -61,22 +81,23 @@ async def sync_user(user_data: UserCreate):
     return {"message": "User created"}
 
 @router.get("/{clerk_id}/history")
-async def get_history(clerk_id: str, limit: int = 20):
+async def get_history(
+    clerk_id: str,
+    limit: int = Query(20, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
     db = await get_database()
-    cursor = db.history.find({"user_id": clerk_id}).sort("timestamp", -1).limit(limit)
-    history = await cursor.to_list(length=limit)
-    
-    # Convert _id to string
-    for item in history:
-        item["id"] = str(item["_id"])
-        del item["_id"]
-        
-    return history
+    try:
+        history, next_cursor = await paginate(
+            db.history, {"user_id": clerk_id}, "timestamp", -1, limit=limit, cursor=cursor
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"history": history, "next_cursor": next_cursor}
 
 @router.post("/history")
 async def add_history(item: HistoryItem):
-    db = await get_database()
-    await db.history.insert_one(item.dict(by_alias=True))
+    await history_writer.enqueue(item)
     return {"message": "History added"}
 
 # --- Bookmarks ---
@@ -87,7 +108,13 @@ class BookmarkItem(BaseModel):
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 @router.get("/{clerk_id}/bookmarks")
-async def get_bookmarks(clerk_id: str, authenticated_clerk_id: str = Depends(verify_clerk_token)):
+async def get_bookmarks(
+    clerk_id: str,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    full: bool = Query(False, description="Return the whole saved product instead of the card fields"),
+    authenticated_clerk_id: str = Depends(verify_clerk_token),
+):
     if clerk_id != authenticated_clerk_id:
         raise HTTPException(status_code=403, detail="Access denied")
         
@@ -96,23 +123,38 @@ async def get_bookmarks(clerk_id: str, authenticated_clerk_id: str = Depends(ver
         if db is None:
             raise Exception("Database connection not established")
             
-        cursor = db.bookmarks.find({"user_id": clerk_id}).sort("timestamp", -1)
-        bookmarks = await cursor.to_list(length=100)
-        
-        for item in bookmarks:
-            item["id"] = str(item["_id"])
-            del item["_id"]
-            
-        return bookmarks
+        bookmarks, next_cursor = await paginate(
+            db.bookmarks, {"user_id": clerk_id}, "timestamp", -1, limit=limit, cursor=cursor,
+            fields=() if full else BOOKMARK_SUMMARY_FIELDS,
+        )
+        return {"bookmarks": bookmarks, "next_cursor": next_cursor}
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"ERROR in get_bookmarks: {str(e)}")
-        print(f"CRASH in GET /bookmarks: {str(e)}")
+        logger.exception(f"ERROR in get_bookmarks: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@router.get("/{clerk_id}/bookmarks/ids")
+async def get_bookmarked_ids(clerk_id: str, authenticated_clerk_id: str = Depends(verify_clerk_token)):
+    """
+    Every product the user has saved, ids only (e.g. to mark saved cards site-wide).
+    Answered from the (user_id, product.product_id) index alone.
+    """
+    if clerk_id != authenticated_clerk_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    try:
+        db = await get_database()
+        if db is None:
+            raise Exception("Database connection not established")
+        cursor = db.bookmarks.find({"user_id": clerk_id}, {"_id": 0, "product.product_id": 1})
+        return {"product_ids": [doc["product"]["product_id"] async for doc in cursor if doc.get("product")]}
+    except Exception as e:
+        logger.exception(f"ERROR in get_bookmarked_ids: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/bookmarks")
 async def add_bookmark(item: BookmarkItem, clerk_id: str = Depends(verify_clerk_token)):
-    print(f"DEBUG: Processing bookmark addition for clerk_id: {clerk_id}")
-    logger.info(f"Adding bookmark for user: {item.user_id}")
+    logger.debug(f"Adding bookmark for user: {item.user_id}")
     
     # Ensure they're adding for themselves
     if item.user_id != clerk_id:
@@ -123,22 +165,100 @@ async def add_bookmark(item: BookmarkItem, clerk_id: str = Depends(verify_clerk_
         if db is None:
             raise Exception("Database connection not established")
             
-        # Check if already exists
-        existing = await db.bookmarks.find_one({
-            "user_id": item.user_id,
-            "product.product_id": item.product.get("product_id")
-        })
-        
-        if existing:
+        # The unique (user_id, product.product_id) index rejects duplicates atomically
+        try:
+            await db.bookmarks.insert_one(item.dict(by_alias=True))
+        except DuplicateKeyError:
             return {"message": "Already bookmarked"}
-
-        await db.bookmarks.insert_one(item.dict(by_alias=True))
         return {"message": "Bookmark added", "success": True}
         
     except Exception as e:
         # CRITICAL: This was missing, causing silent 500 crashes
-        logger.error(f"ERROR in add_bookmark: {str(e)}")
-        print(f"CRASH in POST /bookmarks: {str(e)}")
+        logger.exception(f"ERROR in add_bookmark: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+class BulkBookmarkRequest(BaseModel):
+    user_id: str
+    products: List[dict] = Field(..., max_length=settings.BULK_MAX_ITEMS)
+
+class BulkBookmarkRemoveRequest(BaseModel):
+    product_ids: List[str] = Field(..., max_length=settings.BULK_MAX_ITEMS)
+
+@router.post("/bookmarks/bulk")
+async def add_bookmarks_bulk(request: BulkBookmarkRequest, clerk_id: str = Depends(verify_clerk_token)):
+    """
+    Bookmark a list of products with one unordered bulk upsert. Returns one result
+    per product, in request order: "added", "exists", "duplicate" or "invalid".
+    """
+    if request.user_id != clerk_id:
+        raise HTTPException(status_code=403, detail="Cannot add bookmarks for another user")
+
+    try:
+        db = await get_database()
+        if db is None:
+            raise Exception("Database connection not established")
+
+        now = datetime.utcnow()
+        results, operations, positions, seen = [], [], [], set()
+        for product in request.products:
+            product_id = product.get("product_id")
+            results.append({"product_id": product_id})
+            if not product_id:
+                results[-1].update(status="invalid", detail="Missing product_id")
+                continue
+            if product_id in seen:
+                results[-1]["status"] = "duplicate"
+                continue
+            seen.add(product_id)
+            positions.append(len(results) - 1)
+            operations.append(UpdateOne(
+                {"user_id": clerk_id, "product.product_id": product_id},
+                {"$setOnInsert": {"user_id": clerk_id, "product": product, "timestamp": now}},
+                upsert=True,
+            ))
+
+        upserted, errors = {}, {}
+        if operations:
+            try:
+                upserted = (await db.bookmarks.bulk_write(operations, ordered=False)).upserted_ids
+            except BulkWriteError as e:
+                upserted = {item["index"]: item["_id"] for item in e.details.get("upserted", [])}
+                errors = {item["index"]: item.get("errmsg", "write failed") for item in e.details.get("writeErrors", [])}
+
+        for position, index in enumerate(positions):
+            if position in errors:
+                results[index].update(status="error", detail=errors[position])
+            elif position in upserted:
+                results[index].update(status="added", id=str(upserted[position]))
+            else:
+                results[index]["status"] = "exists"
+        return {"results": results}
+    except Exception as e:
+        logger.error(f"ERROR in add_bookmarks_bulk: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.post("/{clerk_id}/bookmarks/remove")
+async def remove_bookmarks_bulk(clerk_id: str, request: BulkBookmarkRemoveRequest,
+                                authenticated_clerk_id: str = Depends(verify_clerk_token)):
+    """Remove several bookmarks at once. Returns one result per id: "removed" or "not_found"."""
+    if clerk_id != authenticated_clerk_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    try:
+        db = await get_database()
+        if db is None:
+            raise Exception("Database connection not established")
+
+        query = {"user_id": clerk_id, "product.product_id": {"$in": request.product_ids}}
+        bookmarked = set(await db.bookmarks.distinct("product.product_id", query))
+        if bookmarked:
+            await db.bookmarks.delete_many(query)
+        return {"results": [
+            {"product_id": product_id, "status": "removed" if product_id in bookmarked else "not_found"}
+            for product_id in request.product_ids
+        ]}
+    except Exception as e:
+        logger.exception(f"ERROR in remove_bookmarks_bulk: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.delete("/{clerk_id}/bookmarks/{product_id}")
@@ -163,5 +283,5 @@ async def remove_bookmark(clerk_id: str, product_id: str, authenticated_clerk_id
     except HTTPException:
         raise
     except Exception as e:
-        print(f"CRASH in DELETE /bookmarks: {str(e)}")
+        logger.exception(f"ERROR in remove_bookmark: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -0,0 +1,101 @@
+"""
+Backfill numeric prices (`price_minor` in paise + `currency`) parsed from the stored
+display strings, for tracked products, their inline history, bookmarks and
+price_history buckets.
+
+Run from the backend directory:
+    python -m scripts.backfill_prices [--dry-run] [--batch-size 500]
+
+Only documents still missing `price_minor` are touched, so it is safe to re-run.
+"""
+import argparse
+import asyncio
+
+from pymongo import UpdateOne
+
+from database import connect_to_mongo, close_mongo_connection, get_database
+from services.pricing import parse_price
+from services.price_history import price_history_store
+
+
+def with_price_minor(points):
+    updated = []
+    for point in points or []:
+        if point.get("price_minor") is None:
+            point = {**point, "price_minor": parse_price(point.get("price"))[0]}
+        updated.append(point)
+    return updated
+
+
+async def flush(collection, operations, dry_run):
+    if operations and not dry_run:
+        await collection.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+async def backfill_collection(collection, query, projection, build_update, batch_size, dry_run):
+    operations, total = [], 0
+    async for doc in collection.find(query, projection):
+        update = build_update(doc)
+        if update:
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+        if len(operations) >= batch_size:
+            total += await flush(collection, operations, dry_run)
+            operations = []
+    total += await flush(collection, operations, dry_run)
+    return total
+
+
+def product_update(doc):
+    update = {"history": with_price_minor(doc.get("history"))}
+    if doc.get("price_minor") is None:
+        update["price_minor"], update["currency"] = parse_price(doc.get("price"))
+    return update
+
+
+def bookmark_update(doc):
+    price_minor, currency = parse_price(doc.get("product", {}).get("price"))
+    return {"product.price_minor": price_minor, "product.currency": currency}
+
+
+def bucket_update(doc):
+    return {"points": with_price_minor(doc.get("points"))}
+
+
+async def backfill(db, batch_size=500, dry_run=False):
+    products = await backfill_collection(
+        db.products,
+        {"$or": [
+            {"price_minor": {"$exists": False}},
+            {"history": {"$elemMatch": {"price_minor": {"$exists": False}}}},
+        ]},
+        {"price": 1, "price_minor": 1, "currency": 1, "history": 1},
+        product_update, batch_size, dry_run,
+    )
+    bookmarks = await backfill_collection(
+        db.bookmarks, {"product.price_minor": {"$exists": False}}, {"product.price": 1},
+        bookmark_update, batch_size, dry_run,
+    )
+    buckets = await backfill_collection(
+        price_history_store.collection(db),
+        {"points": {"$elemMatch": {"price_minor": {"$exists": False}}}},
+        {"points": 1},
+        bucket_update, batch_size, dry_run,
+    )
+    verb = "Would update" if dry_run else "Updated"
+    print(f"{verb} {products} tracked products, {bookmarks} bookmarks, {buckets} price_history buckets")
+
+
+async def main(args):
+    await connect_to_mongo()
+    try:
+        await backfill(await get_database(), batch_size=args.batch_size, dry_run=args.dry_run)
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be updated without writing")
+    parser.add_argument("--batch-size", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,35 @@
+"""
+Create all MongoDB indexes the API relies on.
+
+Run from the backend directory (e.g. as a deploy step):
+    python -m scripts.ensure_indexes            # create indexes (idempotent); exit 1 on a failure
+
+The same index creation runs in the background at app startup unless
+CREATE_INDEXES_ON_STARTUP is false. That every route and job query is served by
+one of them is checked by tests/test_query_plans.py.
+"""
+import argparse
+import asyncio
+import sys
+
+from database import connect_to_mongo, close_mongo_connection, get_database, ensure_indexes
+from logging_config import configure_logging
+
+
+async def main(args):
+    await connect_to_mongo()
+    try:
+        failures = await ensure_indexes(await get_database())
+    finally:
+        await close_mongo_connection()
+
+    if failures:
+        for collection, name, error in failures:
+            print(f"index {collection}.{name} failed: {error}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    configure_logging()
+    asyncio.run(main(parser.parse_args()))
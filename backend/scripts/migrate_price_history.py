@@ -0,0 +1,123 @@
+"""
+Move embedded `products.history` arrays into the bucketed 'price_history' collection.
+
+Run from the backend directory:
+    python -m scripts.migrate_price_history [--dry-run]
+
+Safe to re-run: rows already migrated are skipped and points already present in
+price_history are not duplicated. Afterwards each tracked row keeps only the last
+PRICE_HISTORY_PREVIEW_POINTS points inline.
+
+Migrated buckets are written closed, so live points keep going to the newest
+bucket. Partly filled buckets left open by an earlier run are closed too, all but
+each product's newest one.
+"""
+import argparse
+import asyncio
+
+from config import get_settings
+from database import connect_to_mongo, close_mongo_connection, get_database
+from services.price_history import price_history_store
+
+settings = get_settings()
+
+
+async def migrate_product(db, product_id, rows, dry_run=False):
+    collection = price_history_store.collection(db)
+
+    existing = set()
+    async for bucket in collection.find({"product_id": product_id}, {"points": 1}):
+        for point in bucket.get("points", []):
+            existing.add((point["timestamp"], point["price"]))
+
+    # Subscribers of the same product share price changes; keep each point once
+    points = {}
+    for row in rows:
+        for point in row.get("history") or []:
+            if not point.get("timestamp"):
+                continue
+            key = (point["timestamp"], point["price"])
+            if key not in existing:
+                points[key] = {"price": point["price"], "timestamp": point["timestamp"]}
+
+    ordered = sorted(points.values(), key=lambda point: point["timestamp"])
+    size = price_history_store.bucket_size
+    buckets = [
+        {
+            "product_id": product_id,
+            "count": len(chunk),
+            "open": False,
+            "first_ts": chunk[0]["timestamp"],
+            "last_ts": chunk[-1]["timestamp"],
+            "points": chunk,
+        }
+        for chunk in (ordered[i:i + size] for i in range(0, len(ordered), size))
+    ]
+
+    if not dry_run:
+        if buckets:
+            await collection.insert_many(buckets)
+        await db.products.update_many(
+            {"_id": {"$in": [row["_id"] for row in rows]}},
+            {
+                "$push": {"history": {"$each": [], "$slice": -settings.PRICE_HISTORY_PREVIEW_POINTS}},
+                "$set": {"history_migrated": True},
+            },
+        )
+    return len(ordered)
+
+
+async def migrate(db, dry_run=False):
+    cursor = db.products.find(
+        {"history_migrated": {"$ne": True}, "product_id": {"$exists": True}},
+        {"product_id": 1, "history": 1},
+        allow_disk_use=True,
+    ).sort("product_id", 1)
+
+    products = points = 0
+    current_id, rows = None, []
+    async for row in cursor:
+        if rows and row.get("product_id") != current_id:
+            points += await migrate_product(db, current_id, rows, dry_run)
+            products += 1
+            rows = []
+        current_id = row.get("product_id")
+        rows.append(row)
+    if rows:
+        points += await migrate_product(db, current_id, rows, dry_run)
+        products += 1
+
+    print(f"{'Would migrate' if dry_run else 'Migrated'} {points} price points for {products} products")
+    closed = await close_stale_buckets(db, dry_run)
+    print(f"{'Would close' if dry_run else 'Closed'} {closed} stale partly filled buckets")
+
+
+async def close_stale_buckets(db, dry_run=False):
+    """Close every open, not yet full bucket of a product except the one with the newest points."""
+    collection = price_history_store.collection(db)
+    pipeline = [
+        {"$match": {"open": {"$ne": False}, "count": {"$lt": price_history_store.bucket_size}}},
+        {"$sort": {"last_ts": -1}},
+        {"$group": {"_id": "$product_id", "buckets": {"$push": "$_id"}}},
+        {"$match": {"buckets.1": {"$exists": True}}},
+    ]
+    stale = []
+    async for product in collection.aggregate(pipeline, allowDiskUse=True):
+        stale += product["buckets"][1:]
+    if stale and not dry_run:
+        await collection.update_many({"_id": {"$in": stale}}, {"$set": {"open": False}})
+    return len(stale)
+
+
+async def main(args):
+    await connect_to_mongo()
+    try:
+        await migrate(await get_database(), dry_run=args.dry_run)
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be migrated without writing")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,161 @@
+"""
+Split the per-user `products` rows into the shared 'catalog' (one document per
+product_id) and per-user 'subscriptions'.
+
+Run from the backend directory (after scripts.migrate_price_history):
+    python -m scripts.migrate_to_catalog [--dry-run] [--batch-size 500]
+
+For each product the most recently updated row supplies the catalog details and
+price; the inline history previews of all its rows are merged. Rows with a
+clerk_id become subscriptions (added_at = the row's creation time). Safe to
+re-run: existing catalog entries and subscriptions are left as they are and rows
+already migrated are skipped. The `products` collection is kept; drop it once
+the new collections are verified. Finally, subscriptions without a copy of their
+product's sort fields (price_minor, last_updated) get one.
+"""
+import argparse
+import asyncio
+
+from pymongo import UpdateOne
+
+from config import get_settings
+from database import connect_to_mongo, close_mongo_connection, get_database
+from services.catalog import catalog_store, CATALOG_FIELDS, product_hash_bucket
+from services.pricing import parse_price
+
+settings = get_settings()
+
+
+def catalog_entry(rows):
+    latest = max(rows, key=lambda row: row.get("last_updated") or row["_id"].generation_time.replace(tzinfo=None))
+    entry = {field: latest[field] for field in CATALOG_FIELDS if field in latest}
+    if entry.get("price_minor") is None:
+        entry["price_minor"], entry["currency"] = parse_price(entry.get("price"))
+
+    points = {}
+    for row in rows:
+        for point in row.get("history") or []:
+            if point.get("timestamp"):
+                points[(point["timestamp"], point["price"])] = point
+    entry["history"] = sorted(points.values(), key=lambda point: point["timestamp"])[
+        -settings.PRICE_HISTORY_PREVIEW_POINTS:
+    ]
+
+    checked = [row["last_checked"] for row in rows if row.get("last_checked")]
+    entry["last_updated"] = latest.get("last_updated")
+    entry["last_checked"] = max(checked) if checked else None
+    entry["created_at"] = min(row["_id"].generation_time.replace(tzinfo=None) for row in rows)
+    entry["hash_bucket"] = product_hash_bucket(latest["product_id"])
+    return entry
+
+
+def migrate_operations(product_id, rows):
+    catalog_op = UpdateOne(
+        {"product_id": product_id},
+        {"$setOnInsert": catalog_entry(rows)},
+        upsert=True,
+    )
+    subscription_ops = [
+        UpdateOne(
+            {"clerk_id": row["clerk_id"], "product_id": product_id},
+            {"$setOnInsert": {"added_at": row["_id"].generation_time.replace(tzinfo=None)}},
+            upsert=True,
+        )
+        for row in rows if row.get("clerk_id")
+    ]
+    return catalog_op, subscription_ops
+
+
+async def recount_subscribers(db, product_ids):
+    """Set each catalog entry's `subscribers` from the subscriptions collection."""
+    counts = dict.fromkeys(product_ids, 0)
+    pipeline = [
+        {"$match": {"product_id": {"$in": product_ids}}},
+        {"$group": {"_id": "$product_id", "count": {"$sum": 1}}},
+    ]
+    async for row in catalog_store.subscriptions(db).aggregate(pipeline):
+        counts[row["_id"]] = row["count"]
+    if counts:
+        await catalog_store.catalog(db).bulk_write(
+            [UpdateOne({"product_id": pid}, {"$set": {"subscribers": count}}) for pid, count in counts.items()],
+            ordered=False,
+        )
+
+
+async def flush(db, catalog_ops, subscription_ops, groups, dry_run):
+    if dry_run:
+        return
+    if subscription_ops:
+        await catalog_store.subscriptions(db).bulk_write(subscription_ops, ordered=False)
+    if catalog_ops:
+        await catalog_store.catalog(db).bulk_write(catalog_ops, ordered=False)
+    await recount_subscribers(db, [product_id for product_id, _ in groups])
+    await db.products.update_many(
+        {"_id": {"$in": [row["_id"] for _, rows in groups for row in rows]}},
+        {"$set": {"catalog_migrated": True}},
+    )
+
+
+async def migrate(db, batch_size=500, dry_run=False):
+    cursor = db.products.find(
+        {"catalog_migrated": {"$ne": True}, "product_id": {"$exists": True}},
+        {"history_migrated": 0},
+        allow_disk_use=True,
+    ).sort("product_id", 1)
+
+    products = subscriptions = 0
+    catalog_ops, subscription_ops, groups = [], [], []
+
+    async def add_group(product_id, rows):
+        nonlocal products, subscriptions, catalog_ops, subscription_ops, groups
+        catalog_op, ops = migrate_operations(product_id, rows)
+        catalog_ops.append(catalog_op)
+        subscription_ops += ops
+        groups.append((product_id, rows))
+        products += 1
+        subscriptions += len(ops)
+        if len(catalog_ops) >= batch_size:
+            await flush(db, catalog_ops, subscription_ops, groups, dry_run)
+            catalog_ops, subscription_ops, groups = [], [], []
+
+    current_id, rows = None, []
+    async for row in cursor:
+        if rows and row["product_id"] != current_id:
+            await add_group(current_id, rows)
+            rows = []
+        current_id = row["product_id"]
+        rows.append(row)
+    if rows:
+        await add_group(current_id, rows)
+    await flush(db, catalog_ops, subscription_ops, groups, dry_run)
+
+    verb = "Would migrate" if dry_run else "Migrated"
+    print(f"{verb} {products} products into the catalog with {subscriptions} subscriptions")
+    synced = await sync_subscription_keys(db, batch_size, dry_run)
+    print(f"{'Would copy' if dry_run else 'Copied'} sort fields onto the subscriptions of {synced} products")
+
+
+async def sync_subscription_keys(db, batch_size=500, dry_run=False):
+    """Copy catalog sort fields onto subscriptions that predate them (or were just migrated)."""
+    product_ids = await catalog_store.subscriptions(db).distinct(
+        "product_id", {"last_updated": {"$exists": False}}
+    )
+    if not dry_run:
+        for start in range(0, len(product_ids), batch_size):
+            await catalog_store.sync_subscriptions(db, product_ids[start:start + batch_size])
+    return len(product_ids)
+
+
+async def main(args):
+    await connect_to_mongo()
+    try:
+        await migrate(await get_database(), batch_size=args.batch_size, dry_run=args.dry_run)
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be migrated without writing")
+    parser.add_argument("--batch-size", type=int, default=500, help="Products per bulk write")
+    asyncio.run(main(parser.parse_args()))
@@ -1,37 +1,165 @@
-import os
-import google.generativeai as genai
-from groq import Groq
+import asyncio
+import logging
+import time
 from config import get_settings
-import json
+from services.prompt_builder import prompt_builder
+from services.answer_cache import answer_cache
+from services.metrics import track_upstream
+from services.circuit_breaker import CircuitBreaker
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+class ProviderUnavailable(Exception):
+    """No call was made: the provider's circuit is open."""
 
 class AIService:
     def __init__(self):
         self.gemini_enabled = bool(settings.GEMINI_API_KEY)
         self.groq_enabled = bool(settings.GROQ_API_KEY)
-        
-        if self.gemini_enabled:
+
+        # Provider SDKs are imported and their clients built on first use (or by `prewarm`);
+        # importing google.generativeai alone takes about half of the app's cold start
+        self._clients: dict = {}
+        self._clients_lock = asyncio.Lock()
+
+        self.breakers = {
+            name: CircuitBreaker(
+                name,
+                failure_threshold=settings.AI_BREAKER_FAILURE_THRESHOLD,
+                reset_seconds=settings.AI_BREAKER_RESET_SECONDS,
+                latency_window=settings.AI_LATENCY_WINDOW,
+            )
+            for name in self.PROVIDER_LABELS
+        }
+
+    @property
+    def gemini_model(self):
+        return self._clients.get("gemini")
+
+    @gemini_model.setter
+    def gemini_model(self, model):
+        self._clients["gemini"] = model
+
+    @property
+    def groq_client(self):
+        return self._clients.get("groq")
+
+    @groq_client.setter
+    def groq_client(self, client):
+        self._clients["groq"] = client
+
+    def _build_client(self, provider: str):
+        if provider == "gemini":
+            import google.generativeai as genai
             genai.configure(api_key=settings.GEMINI_API_KEY)
-            self.gemini_model = genai.GenerativeModel('gemini-1.5-flash')
-            
-        if self.groq_enabled:
-            self.groq_client = Groq(api_key=settings.GROQ_API_KEY)
+            return genai.GenerativeModel(settings.GEMINI_MODEL)
+        from groq import AsyncGroq
+        return AsyncGroq(api_key=settings.GROQ_API_KEY, timeout=settings.AI_TIMEOUT_SECONDS)
+
+    async def _client(self, provider: str):
+        client = self._clients.get(provider)
+        if client is None:
+            async with self._clients_lock:
+                client = self._clients.get(provider)
+                if client is None:
+                    started = time.perf_counter()
+                    # The SDK import is slow, blocking work; keep the event loop serving meanwhile
+                    client = self._clients[provider] = await asyncio.to_thread(self._build_client, provider)
+                    logger.info(f"{self.PROVIDER_LABELS[provider]} client ready in "
+                                f"{(time.perf_counter() - started) * 1000:.0f}ms")
+        return client
 
-    async def get_chat_response(self, user_query: str, search_results: list = None, history: list = None):
+    async def prewarm(self):
+        """Import the SDKs and build the clients of every configured provider now instead of on first use."""
+        for provider in self._configured():
+            try:
+                await self._client(provider)
+            except Exception as e:
+                logger.warning(f"Could not prewarm the {self.PROVIDER_LABELS[provider]} client: {e}")
+
+    async def get_chat_response(self, user_query: str, search_results: list = None, history: list = None,
+                                summary: str = ""):
         """
         Generates an AI response based on user query, optional search results,
-        and optional conversation history for multi-turn context.
+        and optional conversation history (plus a `summary` of older turns) for multi-turn context.
+        Providers whose circuit is open are skipped and a failed provider fails
+        over to the other one (see `_first_success`).
         """
-        history = history or []
-        prompt = self._build_prompt(user_query, search_results)
-        
-        if self.gemini_enabled:
-            return await self._get_gemini_response(prompt, history)
-        elif self.groq_enabled:
-            return await self._get_groq_response(prompt, history)
-        else:
-            return "AI services are not configured. Please add GEMINI_API_KEY or GROQ_API_KEY to your environment."
+        provider = self._provider()
+        if provider is None:
+            return self.NOT_CONFIGURED_MESSAGE
+
+        async def generate():
+            attempts = [
+                (name, lambda name=name: self._complete(name, user_query, search_results, history, summary))
+                for name in self._candidates()
+            ]
+            try:
+                return await self._first_success(attempts, kind="complete")
+            except Exception:
+                return self._error_message(provider)
+
+        if answer_cache.cacheable(history):
+            key = answer_cache.key(user_query, search_results, provider, self._model_name(provider))
+            return await answer_cache.get_or_generate(key, generate, should_cache=self._is_answer)
+        return await generate()
+
+    async def stream_chat_response(self, user_query: str, search_results: list = None, history: list = None,
+                                   summary: str = ""):
+        """
+        Same as get_chat_response, but yields the answer in text chunks as the provider produces them.
+        Failover and hedging apply until the first chunk; a provider failing after that
+        ends the answer with the error message.
+        """
+        provider = self._provider()
+        if provider is None:
+            yield self.NOT_CONFIGURED_MESSAGE
+            return
+
+        cache_key = None
+        if answer_cache.cacheable(history):
+            cache_key = answer_cache.key(user_query, search_results, provider, self._model_name(provider))
+            cached = await answer_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        attempts = [
+            (name, lambda name=name: self._open_stream(name, user_query, search_results, history, summary))
+            for name in self._candidates()
+        ]
+        try:
+            first, stream, answered_by = await self._first_success(
+                attempts, kind="first_token", discard=self._close_stream
+            )
+        except Exception:
+            yield self._error_message(provider)
+            return
+
+        chunks = []
+        if first:
+            chunks.append(first)
+            yield first
+        try:
+            async for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            # Too late to switch providers: the user has part of this answer already
+            self.breakers[answered_by].record_failure()
+            logger.error(f"{self.PROVIDER_LABELS[answered_by]} Error: {e!r}")
+            yield self._error_message(answered_by)
+            return
+
+        answer = "".join(chunks)
+        if cache_key and self._is_answer(answer):
+            await answer_cache.set(cache_key, answer)
+
+    NOT_CONFIGURED_MESSAGE = "AI services are not configured. Please add GEMINI_API_KEY or GROQ_API_KEY to your environment."
+    GEMINI_ERROR_MESSAGE = "Sorry, I encountered an error while processing your request with Gemini."
+    GROQ_ERROR_MESSAGE = "Sorry, I encountered an error while processing your request with Groq."
+    PROVIDER_LABELS = {"gemini": "Gemini", "groq": "Groq"}
 
     SYSTEM_PERSONA = (
         "You are PriceWise AI, a professional shopping assistant. "
@@ -41,53 +169,232 @@ class AIService:
         "work with those results. Only perform a fresh product search if it is a completely new query."
     )
 
-    def _build_prompt(self, user_query: str, search_results: list = None):
-        context = ""
-        if search_results:
-            context = f"Here are the current real-time product results:\n{json.dumps(search_results, indent=2)}\n\n"
-        
-        return f"""
-        {context}
-        User says: "{user_query}"
-
-        Instructions:
-        1. If products are provided, compare them and recommend the best value-for-money option.
-        2. Be concise, professional, and helpful.
-        3. Use bullet points for comparisons.
-        4. If the user is filtering or refining (e.g. by budget, brand, feature) — apply the filter to the products already shown in the conversation.
-        5. If no products are relevant, ask for more details to help narrow down the search.
+    def _configured(self):
+        enabled = [name for name, on in (("gemini", self.gemini_enabled), ("groq", self.groq_enabled)) if on]
+        return sorted(enabled, key=lambda name: name != settings.AI_PRIMARY_PROVIDER)
+
+    def _provider(self):
+        """The preferred provider; answers are cached under its name whichever provider answered."""
+        configured = self._configured()
+        return configured[0] if configured else None
+
+    def _candidates(self):
+        """Configured providers in preference order, minus those whose circuit is open."""
+        return [name for name in self._configured() if self.breakers[name].available()]
+
+    def _error_message(self, provider: str):
+        return self.GEMINI_ERROR_MESSAGE if provider == "gemini" else self.GROQ_ERROR_MESSAGE
+
+    def _hedge_delay(self, provider: str, kind: str):
+        p95 = self.breakers[provider].percentile(95, kind)
+        delay = settings.AI_HEDGE_DEFAULT_DELAY_SECONDS if p95 is None else p95
+        return max(settings.AI_HEDGE_MIN_DELAY_SECONDS, delay)
+
+    def provider_stats(self):
+        return {
+            name: {"enabled": name in self._configured(), **breaker.stats()}
+            for name, breaker in self.breakers.items()
+        }
+
+    async def _first_success(self, attempts: list, kind: str, discard=None):
         """
+        Run `attempts` ([(provider, start)], in preference order) until one succeeds.
+        A failed provider falls over to the next one straight away. With AI_HEDGE_ENABLED
+        the next one is also started when the current one is slower than its p95 (of
+        `kind` latencies); the first success wins and the rest are cancelled, so the
+        answer takes as long as the faster healthy provider. Successful results that
+        lose a tie are handed to `discard`.
+        """
+        if not attempts:
+            raise ProviderUnavailable("No AI provider is available (all circuits open)")
 
-    async def _get_gemini_response(self, prompt: str, history: list = None):
+        queue = list(attempts)
+        pending = {}
+        hedge_at = None
+        error = None
+
+        def launch():
+            nonlocal hedge_at
+            provider, start = queue.pop(0)
+            pending[asyncio.create_task(start())] = provider
+            if settings.AI_HEDGE_ENABLED and queue:
+                hedge_at = time.monotonic() + self._hedge_delay(provider, kind)
+            else:
+                hedge_at = None
+
+        launch()
+        try:
+            while pending:
+                timeout = None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.debug(f"Hedging slow {', '.join(pending.values())} request with {queue[0][0]}")
+                    launch()
+                    continue
+
+                winner = None
+                for task in done:
+                    pending.pop(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                    elif discard is not None:
+                        await discard(task.result())
+                if winner is not None:
+                    return winner.result()
+                if not pending and queue:
+                    launch()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+                for task in pending:
+                    # Finished just before it could be cancelled
+                    if discard is not None and not task.cancelled() and task.exception() is None:
+                        await discard(task.result())
+
+    async def _complete(self, provider: str, user_query: str, search_results: list = None, history: list = None,
+                        summary: str = ""):
+        """One non-streaming answer from `provider`, with its outcome recorded on its circuit breaker."""
+        breaker = self.breakers[provider]
+        if not breaker.allow():
+            raise ProviderUnavailable(f"{provider} circuit is open")
+
+        built = self._build_prompt(user_query, search_results, history, provider, summary)
+        started = time.perf_counter()
         try:
-            # Build Gemini-style contents: history turns + current prompt
-            contents = []
-            for turn in (history or []):
-                role = "user" if turn.get("role") == "user" else "model"
-                contents.append({"role": role, "parts": [{"text": turn.get("content", "")}]})
-            # Append the current user prompt (which includes product context)
-            contents.append({"role": "user", "parts": [{"text": self.SYSTEM_PERSONA + "\n\n" + prompt}]})
-            response = self.gemini_model.generate_content(contents)
-            return response.text
+            with track_upstream(provider):
+                if provider == "gemini":
+                    call = self._get_gemini_response(built.prompt, built.history)
+                else:
+                    call = self._get_groq_response(built.prompt, built.history)
+                answer = await asyncio.wait_for(call, settings.AI_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            breaker.record_cancelled()
+            raise
         except Exception as e:
-            print(f"Gemini Error: {e}")
-            return "Sorry, I encountered an error while processing your request with Gemini."
+            breaker.record_failure()
+            logger.error(f"{self.PROVIDER_LABELS[provider]} Error: {e!r}")
+            raise
+        breaker.record_success(time.perf_counter() - started, kind="complete")
+        return answer
 
-    async def _get_groq_response(self, prompt: str, history: list = None):
+    async def _open_stream(self, provider: str, user_query: str, search_results: list = None, history: list = None,
+                           summary: str = ""):
+        """
+        Start streaming from `provider` and wait for its first chunk.
+        Returns (first chunk or "" for an empty answer, stream of the remaining chunks, provider).
+        """
+        breaker = self.breakers[provider]
+        if not breaker.allow():
+            raise ProviderUnavailable(f"{provider} circuit is open")
+
+        built = self._build_prompt(user_query, search_results, history, provider, summary)
+        stream = self._tracked_stream(provider, built.prompt, built.history)
+        started = time.perf_counter()
         try:
-            # Build OpenAI-style messages: system persona + history + current prompt
-            messages = [{"role": "system", "content": self.SYSTEM_PERSONA}]
-            for turn in (history or []):
-                role = turn.get("role", "user")  # "user" or "assistant"
-                messages.append({"role": role, "content": turn.get("content", "")})
-            messages.append({"role": "user", "content": prompt})
-            completion = self.groq_client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=messages,
-            )
-            return completion.choices[0].message.content
+            first = await asyncio.wait_for(stream.__anext__(), settings.AI_TIMEOUT_SECONDS)
+        except StopAsyncIteration:
+            first = ""
+        except asyncio.CancelledError:
+            breaker.record_cancelled()
+            await stream.aclose()
+            raise
         except Exception as e:
-            print(f"Groq Error: {e}")
-            return "Sorry, I encountered an error while processing your request with Groq."
+            breaker.record_failure()
+            logger.error(f"{self.PROVIDER_LABELS[provider]} Error: {e!r}")
+            await stream.aclose()
+            raise
+        breaker.record_success(time.perf_counter() - started, kind="first_token")
+        return first, stream, provider
+
+    async def _close_stream(self, opened):
+        await opened[1].aclose()
+
+    async def _tracked_stream(self, provider: str, prompt: str, history: list = None):
+        with track_upstream(provider):
+            if provider == "gemini":
+                stream = self._stream_gemini_response(prompt, history)
+            else:
+                stream = self._stream_groq_response(prompt, history)
+            async for chunk in stream:
+                yield chunk
+
+    def _model_name(self, provider: str):
+        return settings.GEMINI_MODEL if provider == "gemini" else settings.GROQ_MODEL
+
+    def _is_answer(self, response: str):
+        # Never cache canned error replies
+        return bool(response) and response not in (self.GEMINI_ERROR_MESSAGE, self.GROQ_ERROR_MESSAGE)
+
+    def _build_prompt(self, user_query: str, search_results: list = None, history: list = None,
+                      provider: str = "groq", summary: str = ""):
+        built = prompt_builder.build(
+            user_query, search_results, history, provider=provider, persona=self.SYSTEM_PERSONA, summary=summary
+        )
+        logger.debug(f"Prompt for {provider}: ~{built.total_tokens} tokens "
+              f"({built.products_included} products, {len(built.history)} history turns, "
+              f"{built.history_turns_dropped} turns trimmed)")
+        return built
+
+    def _gemini_contents(self, prompt: str, history: list = None):
+        # Build Gemini-style contents: history turns + current prompt
+        contents = []
+        for turn in (history or []):
+            role = "user" if turn.get("role") == "user" else "model"
+            contents.append({"role": role, "parts": [{"text": turn.get("content", "")}]})
+        # Append the current user prompt (which includes product context)
+        contents.append({"role": "user", "parts": [{"text": self.SYSTEM_PERSONA + "\n\n" + prompt}]})
+        return contents
+
+    def _groq_messages(self, prompt: str, history: list = None):
+        # Build OpenAI-style messages: system persona + history + current prompt
+        messages = [{"role": "system", "content": self.SYSTEM_PERSONA}]
+        for turn in (history or []):
+            role = turn.get("role", "user")  # "user" or "assistant"
+            messages.append({"role": role, "content": turn.get("content", "")})
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    async def _get_gemini_response(self, prompt: str, history: list = None):
+        model = await self._client("gemini")
+        response = await model.generate_content_async(
+            self._gemini_contents(prompt, history),
+            request_options={"timeout": settings.AI_TIMEOUT_SECONDS},
+        )
+        return response.text
+
+    async def _stream_gemini_response(self, prompt: str, history: list = None):
+        model = await self._client("gemini")
+        response = await model.generate_content_async(
+            self._gemini_contents(prompt, history),
+            stream=True,
+            request_options={"timeout": settings.AI_TIMEOUT_SECONDS},
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    async def _get_groq_response(self, prompt: str, history: list = None):
+        client = await self._client("groq")
+        completion = await client.chat.completions.create(
+            model=settings.GROQ_MODEL,
+            messages=self._groq_messages(prompt, history),
+        )
+        return completion.choices[0].message.content
+
+    async def _stream_groq_response(self, prompt: str, history: list = None):
+        client = await self._client("groq")
+        stream = await client.chat.completions.create(
+            model=settings.GROQ_MODEL,
+            messages=self._groq_messages(prompt, history),
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
 
 ai_service = AIService()
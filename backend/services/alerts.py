@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime, timedelta
+from importlib import import_module
+from pymongo import UpdateOne, UpdateMany, ReturnDocument
+from config import get_settings
+from services.catalog import catalog_store
+from services.price_history import price_history_store
+from services.pricing import parse_price
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+class AlertRuleStore:
+    """
+    Price-drop alert rules ('alert_rules') and the alerts they trigger ('alert_outbox').
+
+    Every rule kind is reduced to one number, `trigger_below_minor`, the price (paise)
+    at or below which it fires:
+    - target: the user's target price
+    - percent_drop: the price when the rule was created, less `percent`
+    - all_time_low: one paisa under the product's lowest recorded price
+    Rules are indexed on (product_id, active, trigger_below_minor), so a price change
+    reads only the rules it triggers with a range scan, however many rules exist.
+    Target and percent-drop rules fire once and deactivate; all-time-low rules stay
+    active and move their threshold down to the new low.
+    """
+    RULES = "alert_rules"
+    OUTBOX = "alert_outbox"
+
+    # Product ids per $or query, to keep each evaluation query a bounded size
+    EVALUATION_CHUNK = 200
+
+    def rules(self, db):
+        return db[self.RULES]
+
+    def outbox(self, db):
+        return db[self.OUTBOX]
+
+    async def all_time_low(self, db, product_id: str, current_minor: int | None = None):
+        """Lowest recorded price: the catalog's running minimum, else computed from price_history once."""
+        product = await catalog_store.catalog(db).find_one({"product_id": product_id}, {"all_time_low_minor": 1})
+        if product and product.get("all_time_low_minor") is not None:
+            return product["all_time_low_minor"]
+
+        pipeline = [
+            {"$match": {"product_id": product_id}},
+            {"$unwind": "$points"},
+            {"$group": {"_id": None, "low": {"$min": "$points.price_minor"}}},
+        ]
+        rows = await price_history_store.collection(db).aggregate(pipeline).to_list(length=1)
+        candidates = [low for low in (rows[0]["low"] if rows else None, current_minor) if low is not None]
+        low = min(candidates) if candidates else None
+        if low is not None:
+            await catalog_store.catalog(db).update_one({"product_id": product_id}, {"$min": {"all_time_low_minor": low}})
+        return low
+
+    async def create_rule(self, db, rule) -> dict:
+        """
+        Register a rule on a product the user tracks. Raises LookupError when the user
+        doesn't track the product and ValueError for an unusable threshold.
+        """
+        subscribed = await catalog_store.subscriptions(db).find_one(
+            {"clerk_id": rule.clerk_id, "product_id": rule.product_id}, {"_id": 1}
+        )
+        product = await catalog_store.catalog(db).find_one({"product_id": rule.product_id}, {"price_minor": 1})
+        if not subscribed or not product:
+            raise LookupError("Product is not tracked by this user")
+
+        current = product.get("price_minor")
+        doc = rule.dict(exclude_none=True)
+        if rule.kind == "target":
+            trigger, _ = parse_price(rule.target_price)
+            if trigger is None:
+                raise ValueError("target_price is required for a target alert")
+        elif rule.kind == "percent_drop":
+            if rule.percent is None or current is None:
+                raise ValueError("percent (and a known current price) is required for a percent_drop alert")
+            doc["baseline_minor"] = current
+            trigger = math.floor(current * (100 - rule.percent) / 100)
+        else:
+            low = await self.all_time_low(db, rule.product_id, current)
+            if low is None:
+                raise ValueError("No price recorded yet for this product")
+            doc["baseline_minor"] = low
+            trigger = low - 1
+
+        doc.update(trigger_below_minor=trigger, active=True, created_at=datetime.utcnow())
+        result = await self.rules(db).insert_one(doc)
+        doc["id"] = str(doc.pop("_id", result.inserted_id))
+        return doc
+
+    async def delete_rule(self, db, clerk_id: str, rule_id):
+        result = await self.rules(db).delete_one({"_id": rule_id, "clerk_id": clerk_id})
+        return result.deleted_count > 0
+
+    async def delete_for_products(self, db, clerk_id: str, product_ids: list):
+        """Drop a user's rules on products they no longer track."""
+        await self.rules(db).delete_many({"clerk_id": clerk_id, "product_id": {"$in": product_ids}})
+
+    async def evaluate(self, db, changes: list, now: datetime | None = None):
+        """
+        Find the rules triggered by a batch of price changes and queue an alert for each.
+        `changes`: dicts with product_id, title, price, price_minor, previous_price_minor.
+        One range query per EVALUATION_CHUNK products, then one bulk write per collection.
+        Returns the number of alerts queued.
+        """
+        now = now or datetime.utcnow()
+        changes = {change["product_id"]: change for change in changes if change.get("price_minor") is not None}
+        if not changes:
+            return 0
+
+        alerts, rule_operations = [], []
+        product_ids = list(changes)
+        for start in range(0, len(product_ids), self.EVALUATION_CHUNK):
+            chunk = product_ids[start:start + self.EVALUATION_CHUNK]
+            query = {"$or": [
+                {"product_id": product_id, "active": True, "trigger_below_minor": {"$gte": changes[product_id]["price_minor"]}}
+                for product_id in chunk
+            ]}
+            new_lows = set()
+            async for rule in self.rules(db).find(query, {"clerk_id": 1, "product_id": 1, "kind": 1}):
+                change = changes[rule["product_id"]]
+                alerts.append({
+                    "rule_id": str(rule["_id"]),
+                    "clerk_id": rule["clerk_id"],
+                    "product_id": rule["product_id"],
+                    "kind": rule["kind"],
+                    "title": change.get("title"),
+                    "price": change["price"],
+                    "price_minor": change["price_minor"],
+                    "previous_price_minor": change.get("previous_price_minor"),
+                    "status": "pending",
+                    "attempts": 0,
+                    "created_at": now,
+                })
+                if rule["kind"] == "all_time_low":
+                    new_lows.add(rule["product_id"])
+                else:
+                    rule_operations.append(UpdateOne(
+                        {"_id": rule["_id"], "active": True},
+                        {"$set": {"active": False, "last_triggered_at": now}},
+                    ))
+            for product_id in new_lows:
+                # Every all-time-low rule on the product tracks the same low: one update re-arms them all
+                price_minor = changes[product_id]["price_minor"]
+                rule_operations.append(UpdateMany(
+                    {"product_id": product_id, "active": True, "kind": "all_time_low",
+                     "trigger_below_minor": {"$gte": price_minor}},
+                    {"$set": {"trigger_below_minor": price_minor - 1, "last_triggered_at": now}},
+                ))
+
+        if alerts:
+            # Outbox first: a crash before the rule updates re-fires a rule rather than losing an alert
+            await self.outbox(db).insert_many(alerts, ordered=False)
+        if rule_operations:
+            await self.rules(db).bulk_write(rule_operations, ordered=False)
+        return len(alerts)
+
+class AlertSink(ABC):
+    """Delivery channel for triggered alerts. Subclass and point ALERT_SINK at it ("module:Class")."""
+
+    @abstractmethod
+    async def send(self, alert: dict):
+        """Deliver one alert; raise to have it retried on the next run."""
+
+    async def close(self):
+        pass
+
+class LogAlertSink(AlertSink):
+    """Logs alerts and keeps the most recent ones in memory (for local runs and tests)."""
+
+    def __init__(self, keep: int = 1000):
+        self.sent = deque(maxlen=keep)
+
+    async def send(self, alert: dict):
+        logger.info(f"ALERT for {alert['clerk_id']}: {alert.get('title') or alert['product_id']} "
+                    f"dropped to {alert['price']} ({alert['kind']})")
+        self.sent.append(alert)
+
+SINKS = {"log": LogAlertSink}
+
+def load_sink(name: str) -> AlertSink:
+    if name in SINKS:
+        return SINKS[name]()
+    module, _, attr = name.partition(":")
+    return getattr(import_module(module), attr)()
+
+class AlertDispatcher:
+    """
+    Drains pending alerts from the outbox to the sink. Each alert is claimed
+    atomically ("sending") before it is sent, so concurrent deliverers never send
+    the same one; a claim older than ALERT_CLAIM_TIMEOUT_SECONDS (its deliverer
+    died) is taken over. Failed sends are retried on the next run until
+    ALERT_MAX_ATTEMPTS, then marked failed.
+    """
+
+    def __init__(self, sink: AlertSink | None = None):
+        self._sink = sink
+
+    @property
+    def sink(self):
+        if self._sink is None:
+            self._sink = load_sink(settings.ALERT_SINK)
+        return self._sink
+
+    async def claim(self, db, limit: int):
+        """Claim up to `limit` deliverable alerts, oldest first."""
+        outbox = alert_rule_store.outbox(db)
+        now = datetime.utcnow()
+        deliverable = {"$or": [
+            {"status": "pending"},
+            {"status": "sending", "claimed_at": {"$lt": now - timedelta(seconds=settings.ALERT_CLAIM_TIMEOUT_SECONDS)}},
+        ]}
+        claimed = []
+        while len(claimed) < limit:
+            alert = await outbox.find_one_and_update(
+                deliverable,
+                {"$set": {"status": "sending", "claimed_at": now}},
+                sort=[("_id", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if alert is None:
+                break
+            claimed.append(alert)
+        return claimed
+
+    async def deliver_pending(self, db, limit: int = settings.ALERT_DELIVERY_BATCH_SIZE):
+        outbox = alert_rule_store.outbox(db)
+        pending = await self.claim(db, limit)
+        if not pending:
+            return 0
+
+        results = await asyncio.gather(*(self.sink.send(alert) for alert in pending), return_exceptions=True)
+        now = datetime.utcnow()
+        operations = []
+        sent = [alert["_id"] for alert, result in zip(pending, results) if not isinstance(result, Exception)]
+        if sent:
+            operations.append(UpdateMany(
+                {"_id": {"$in": sent}, "status": "sending"}, {"$set": {"status": "sent", "sent_at": now}}
+            ))
+        for alert, result in zip(pending, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to deliver alert {alert['_id']}: {result}")
+                failed = alert.get("attempts", 0) + 1 >= settings.ALERT_MAX_ATTEMPTS
+                operations.append(UpdateOne(
+                    {"_id": alert["_id"], "status": "sending"},
+                    {"$inc": {"attempts": 1}, "$set": {"status": "failed" if failed else "pending"}},
+                ))
+        await outbox.bulk_write(operations, ordered=False)
+        return len(sent)
+
+    async def close(self):
+        if self._sink is not None:
+            await self._sink.close()
+
+alert_rule_store = AlertRuleStore()
+alert_dispatcher = AlertDispatcher()
@@ -0,0 +1,75 @@
+import logging
+from config import get_settings
+from services.cache import TieredCache, normalize_text, fingerprint
+from services.prompt_builder import PRODUCT_FIELDS, prompt_builder
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+class AnswerCache:
+    """
+    Opt-in cache of AI answers keyed on the normalized question, a fingerprint of the
+    product context the model sees, and the provider/model that answered. Multi-turn
+    requests (non-empty history) are never cached since the answer depends on the
+    conversation. Backed by the in-process LRU/TTL cache, or Redis when
+    AI_ANSWER_CACHE_BACKEND is "redis".
+    """
+
+    def __init__(self):
+        self.enabled = settings.AI_ANSWER_CACHE_ENABLED
+        self.cache = None
+        self.skipped = 0
+        if not self.enabled:
+            return
+
+        redis_url = None
+        if settings.AI_ANSWER_CACHE_BACKEND == "redis":
+            redis_url = settings.REDIS_URL
+            if not redis_url:
+                logger.warning("AI_ANSWER_CACHE_BACKEND is 'redis' but REDIS_URL is not set, using in-process cache only")
+        self.cache = TieredCache(
+            "answers",
+            max_entries=settings.AI_ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.AI_ANSWER_CACHE_TTL_SECONDS,
+            redis_url=redis_url,
+        )
+
+    def cacheable(self, history: list = None):
+        if self.cache is None:
+            return False
+        if history:
+            self.skipped += 1
+            return False
+        return True
+
+    @staticmethod
+    def products_fingerprint(products: list = None):
+        # Only what ends up in the prompt matters for the answer
+        context = [
+            [product.get("product_id")] + [product.get(name) for name in PRODUCT_FIELDS]
+            for product in (products or [])[:prompt_builder.max_products]
+        ]
+        return fingerprint(context)
+
+    def key(self, user_query: str, products: list, provider: str, model: str):
+        return f"{provider}:{model}:{self.products_fingerprint(products)}:{fingerprint(normalize_text(user_query))}"
+
+    async def get(self, key: str):
+        return await self.cache.get(key)
+
+    async def set(self, key: str, answer: str):
+        await self.cache.set(key, answer)
+
+    async def get_or_generate(self, key: str, generate, should_cache=None):
+        return await self.cache.get_or_load(key, generate, should_cache=should_cache)
+
+    def stats(self):
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, "skipped_with_history": self.skipped, **self.cache.stats()}
+
+    async def close(self):
+        if self.cache is not None:
+            await self.cache.close()
+
+answer_cache = AnswerCache()
@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def normalize_text(text: str):
+    """Case-, width- and whitespace-insensitive form of free text, used in cache keys."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip().lower()
+
+
+def fingerprint(value):
+    """Stable short hash of any JSON-serializable value."""
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()[:32]
+
+
+class LRUTTLCache:
+    """
+    Bounded in-process cache. Entries expire after `ttl_seconds` and the least
+    recently used entry is evicted once `max_entries` is reached.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl_seconds: float | None = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCacheTier:
+    """
+    Optional shared tier backed by Redis. Values are stored as JSON.
+    Any Redis failure is logged and treated as a miss so the cache never
+    takes the request path down with it.
+    """
+
+    def __init__(self, url: str, namespace: str):
+        self.url = url
+        self.namespace = namespace
+        self._client = None
+
+    def _key(self, key):
+        return f"pricewise:{self.namespace}:{key}"
+
+    def _get_client(self):
+        if self._client is None:
+            import redis.asyncio as redis
+            self._client = redis.from_url(self.url)
+        return self._client
+
+    async def get(self, key):
+        try:
+            raw = await self._get_client().get(self._key(key))
+        except Exception as e:
+            logger.warning(f"Redis cache read failed ({self.namespace}): {e}")
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key, value, ttl_seconds: float):
+        try:
+            await self._get_client().set(self._key(key), json.dumps(value, default=str), ex=max(1, int(ttl_seconds)))
+        except Exception as e:
+            logger.warning(f"Redis cache write failed ({self.namespace}): {e}")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class TieredCache:
+    """
+    In-process LRU/TTL cache with an optional Redis tier behind it, plus
+    single-flight loading: concurrent callers asking for the same missing key
+    share one call to the loader instead of each hitting the upstream.
+    """
+
+    def __init__(self, namespace: str, max_entries: int, ttl_seconds: float, redis_url: str | None = None):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.local = LRUTTLCache(max_entries, ttl_seconds)
+        self.remote = RedisCacheTier(redis_url, namespace) if redis_url else None
+        self._inflight: dict = {}
+        self.hits = 0
+        self.remote_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def _lookup(self, key):
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        if self.remote is not None:
+            value = await self.remote.get(key)
+            if value is not None:
+                self.remote_hits += 1
+                self.local.set(key, value)
+                return value
+
+        return _MISSING
+
+    async def get(self, key):
+        value = await self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            return None
+        return value
+
+    async def set(self, key, value):
+        self.local.set(key, value)
+        if self.remote is not None:
+            await self.remote.set(key, value, self.ttl_seconds)
+
+    async def get_or_load(self, key, loader, should_cache=None):
+        """
+        Return the cached value for `key`, or await `loader()` to produce it.
+        `should_cache(value)` can veto storing a result (e.g. empty responses).
+        The loader runs as its own task shared by every caller waiting on the key,
+        so a caller that is cancelled (e.g. a client that disconnected) stops
+        waiting without cancelling the load for the others.
+        """
+        value = await self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._load(key, loader, should_cache))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._load_done(key, done))
+        return await asyncio.shield(task)
+
+    async def _load(self, key, loader, should_cache):
+        value = await loader()
+        if should_cache is None or should_cache(value):
+            await self.set(key, value)
+        return value
+
+    def _load_done(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark retrieved so an exception nobody awaited isn't logged as unhandled
+            task.exception()
+
+    def stats(self):
+        served = self.hits + self.remote_hits + self.coalesced
+        lookups = served + self.misses
+        return {
+            "namespace": self.namespace,
+            "size": len(self.local),
+            "max_entries": self.local.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "remote_hits": self.remote_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.local.evictions,
+            "expirations": self.local.expirations,
+            "hit_rate": round(served / lookups, 4) if lookups else 0.0,
+            "redis_enabled": self.remote is not None,
+        }
+
+    async def close(self):
+        if self.remote is not None:
+            await self.remote.close()
@@ -0,0 +1,330 @@
+import asyncio
+import zlib
+from datetime import datetime
+from pymongo import UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
+from config import get_settings
+from services.price_history import price_history_store
+from services.pricing import parse_price
+
+settings = get_settings()
+
+# Product fields shared by every tracker of a product; stored once in the catalog
+CATALOG_FIELDS = (
+    "product_id", "title", "price", "price_minor", "currency",
+    "source", "link", "thumbnail", "rating", "reviews",
+)
+
+# Catalog fields copied onto each subscription so a user's listing can filter,
+# sort and paginate on the subscriptions index before joining the catalog
+SUBSCRIPTION_SORT_FIELDS = ("price_minor", "last_updated")
+
+# Stable per-product hash used to partition tracker work (`hash_bucket % TRACKER_PARTITIONS`)
+HASH_BUCKETS = 1 << 16
+
+def product_hash_bucket(product_id: str):
+    return zlib.crc32(product_id.encode()) % HASH_BUCKETS
+
+class CatalogStore:
+    """
+    Tracked products, normalized:
+    - 'catalog': one document per external product_id with the product details,
+      the latest price, the inline history preview, refresh bookkeeping
+      (`last_checked`) and a `subscribers` count. Entries left with no subscribers
+      (`unsubscribed_at`, or anonymous tracking) are dropped by `collect_garbage`.
+    - 'subscriptions': one small document per (clerk_id, product_id) with the
+      user's own data (`added_at`, optional target price) and a copy of the
+      product's SUBSCRIPTION_SORT_FIELDS, kept current by the tracker.
+    Storage and refresh work scale with distinct products; users only add a row each.
+    """
+    CATALOG = "catalog"
+    SUBSCRIPTIONS = "subscriptions"
+
+    def catalog(self, db):
+        return db[self.CATALOG]
+
+    def subscriptions(self, db):
+        return db[self.SUBSCRIPTIONS]
+
+    @staticmethod
+    def prepare(product_data: dict):
+        """Parse the numeric price once, at ingest, if the caller didn't send it."""
+        if not isinstance(product_data.get("price_minor"), int):
+            product_data["price_minor"], product_data["currency"] = parse_price(product_data.get("price"))
+        return product_data
+
+    def catalog_upsert(self, product_data: dict, now: datetime, new_subscribers: int = 0):
+        """
+        Bulk-write operation creating the product's catalog document if it doesn't
+        exist yet (with its first history point) and counting new subscribers.
+        Existing details are left alone; the tracker keeps the price current.
+        """
+        details = {field: product_data[field] for field in CATALOG_FIELDS if field in product_data}
+        return UpdateOne(
+            {"product_id": product_data["product_id"]},
+            {
+                "$setOnInsert": {
+                    **details,
+                    "history": [price_history_store.point(product_data["price"], now, product_data.get("price_minor"))],
+                    "all_time_low_minor": product_data.get("price_minor"),
+                    "hash_bucket": product_hash_bucket(product_data["product_id"]),
+                    "last_updated": now,
+                    # The price was just observed, so the next refresh is due one window from now
+                    "last_checked": now,
+                    "created_at": now,
+                },
+                "$inc": {"subscribers": new_subscribers},
+            },
+            upsert=True,
+        )
+
+    @staticmethod
+    def subscription_upsert(clerk_id: str, product_id: str, now: datetime, target_price=None):
+        """
+        Bulk-write operation subscribing a user to a product; a repeat only updates
+        the target price (when one is given). The result's upserted ids tell new
+        subscriptions apart.
+        """
+        update: dict = {"$setOnInsert": {"clerk_id": clerk_id, "product_id": product_id, "added_at": now}}
+        if target_price is not None:
+            target_minor, _ = parse_price(target_price)
+            update["$set"] = {"target_price": str(target_price), "target_price_minor": target_minor}
+        return UpdateOne({"clerk_id": clerk_id, "product_id": product_id}, update, upsert=True)
+
+    async def seed_history(self, db, product_data: dict, now: datetime):
+        # Only for products new to the catalog, and only if no history survived from earlier tracking
+        if not await price_history_store.has_history(db, product_data["product_id"]):
+            await price_history_store.record(
+                db, product_data["product_id"], product_data["price"], now, product_data.get("price_minor")
+            )
+
+    async def subscribe(self, db, product_data: dict, clerk_id: str | None = None, target_price=None):
+        """
+        Track a product, for `clerk_id` if given (anonymous tracking only adds it to the catalog).
+        Returns (created, id): the subscription id for users, the catalog id otherwise.
+        """
+        product_data = self.prepare(product_data)
+        product_id = product_data["product_id"]
+        now = datetime.utcnow()
+
+        created = True
+        if clerk_id:
+            # Subscription first: a new one then counts towards the catalog entry, so
+            # collect_garbage racing with us never sees a zero count and drops the product
+            result = await self.subscriptions(db).bulk_write(
+                [self.subscription_upsert(clerk_id, product_id, now, target_price)]
+            )
+            created = bool(result.upserted_ids)
+
+        result = await self.catalog(db).bulk_write(
+            [self.catalog_upsert(product_data, now, new_subscribers=1 if clerk_id and created else 0)]
+        )
+        if result.upserted_ids:
+            await self.seed_history(db, product_data, now)
+        elif not clerk_id:
+            created = False
+
+        if clerk_id:
+            await self.sync_subscriptions(db, [product_id], clerk_id)
+            subscription = await self.subscriptions(db).find_one(
+                {"clerk_id": clerk_id, "product_id": product_id}, {"_id": 1}
+            )
+            return created, str(subscription["_id"])
+        entry = await self.catalog(db).find_one({"product_id": product_id}, {"_id": 1})
+        return created, str(entry["_id"])
+
+    async def subscribe_many(self, db, products: list, clerk_id: str | None = None):
+        """
+        Track many products in one go (e.g. a wishlist import): one unordered bulk
+        upsert per collection instead of a round trip or two per product.
+        Each product may carry its own 'target_price'. Returns a result per input
+        item, in order: {"product_id", "status": "created"|"exists"|"duplicate"|"error", ...}.
+        """
+        now = datetime.utcnow()
+        results = [{"product_id": product.get("product_id")} for product in products]
+        pending = []  # (result index, product) for the first occurrence of each product_id
+        seen = set()
+        for index, product in enumerate(products):
+            if product["product_id"] in seen:
+                results[index]["status"] = "duplicate"
+                continue
+            seen.add(product["product_id"])
+            pending.append((index, self.prepare(product)))
+        if not pending:
+            return results
+
+        if clerk_id:
+            # Subscriptions first, for the same reason as in `subscribe`
+            upserted, errors = await self._bulk_upsert(self.subscriptions(db), [
+                self.subscription_upsert(clerk_id, product["product_id"], now, product.get("target_price"))
+                for _, product in pending
+            ])
+            for position, (index, _) in enumerate(pending):
+                if position in errors:
+                    results[index].update(status="error", detail=errors[position])
+                elif position in upserted:
+                    results[index].update(status="created", id=str(upserted[position]))
+                else:
+                    results[index]["status"] = "exists"
+            pending = [(index, product) for index, product in pending if results[index]["status"] != "error"]
+
+        catalog_upserted, errors = await self._bulk_upsert(self.catalog(db), [
+            self.catalog_upsert(product, now, new_subscribers=1 if results[index].get("status") == "created" else 0)
+            for index, product in pending
+        ])
+        new_products = []
+        for position, (index, product) in enumerate(pending):
+            if position in errors:
+                results[index].update(status="error", detail=errors[position])
+            elif position in catalog_upserted:
+                new_products.append(product)
+                if not clerk_id:
+                    results[index].update(status="created", id=str(catalog_upserted[position]))
+            elif not clerk_id:
+                results[index]["status"] = "exists"
+
+        if new_products:
+            await self.seed_history_many(db, new_products, now)
+        if clerk_id:
+            await self.sync_subscriptions(db, [
+                product["product_id"] for index, product in pending if results[index].get("status") == "created"
+            ], clerk_id)
+        return results
+
+    async def seed_history_many(self, db, products: list, now: datetime):
+        with_history = set(await price_history_store.collection(db).distinct(
+            "product_id", {"product_id": {"$in": [product["product_id"] for product in products]}}
+        ))
+        operations = [
+            price_history_store.record_operation(product["product_id"], product["price"], now, product.get("price_minor"))
+            for product in products if product["product_id"] not in with_history
+        ]
+        if operations:
+            await price_history_store.collection(db).bulk_write(operations, ordered=False)
+
+    @staticmethod
+    async def _bulk_upsert(collection, operations: list):
+        """Run an unordered bulk write; return ({op index: upserted _id}, {op index: error message})."""
+        try:
+            result = await collection.bulk_write(operations, ordered=False)
+            return result.upserted_ids, {}
+        except BulkWriteError as e:
+            # Unordered: every other operation was still applied
+            upserted = {item["index"]: item["_id"] for item in e.details.get("upserted", [])}
+            errors = {item["index"]: item.get("errmsg", "write failed") for item in e.details.get("writeErrors", [])}
+            return upserted, errors
+
+    @staticmethod
+    def unsubscribed_update(product_id: str, now: datetime):
+        """Bulk-write operation counting one subscriber out of a catalog entry."""
+        return UpdateOne({"product_id": product_id}, {"$inc": {"subscribers": -1}, "$set": {"unsubscribed_at": now}})
+
+    async def unsubscribe(self, db, clerk_id: str, product_id: str):
+        """
+        Remove a subscription. Returns False if none existed. An entry left without
+        subscribers stays until `collect_garbage`, so re-tracking it soon keeps its history.
+        """
+        removed = await self.unsubscribe_many(db, clerk_id, [product_id])
+        return removed[0]["status"] == "removed"
+
+    async def unsubscribe_many(self, db, clerk_id: str, product_ids: list):
+        """
+        Remove several of a user's subscriptions: one delete per product, run
+        concurrently, then one bulk decrement. Only the caller whose delete removed
+        a subscription counts it out, so concurrent unsubscribes never decrement twice.
+        Returns a result per input id: {"product_id", "status": "removed"|"not_found"}.
+        """
+        unique_ids = list(dict.fromkeys(product_ids))
+        deleted = await asyncio.gather(*(
+            self.subscriptions(db).delete_one({"clerk_id": clerk_id, "product_id": product_id})
+            for product_id in unique_ids
+        ))
+        removed = {product_id for product_id, result in zip(unique_ids, deleted) if result.deleted_count}
+        if removed:
+            now = datetime.utcnow()
+            await self.catalog(db).bulk_write(
+                [self.unsubscribed_update(product_id, now) for product_id in removed], ordered=False
+            )
+        return [
+            {"product_id": product_id, "status": "removed" if product_id in removed else "not_found"}
+            for product_id in product_ids
+        ]
+
+    @staticmethod
+    def _unsubscribed_filter(older_than: datetime):
+        # No subscribers since `older_than`: unsubscribed before it, or tracked anonymously before it
+        return {
+            "subscribers": {"$lte": 0},
+            "$or": [
+                {"unsubscribed_at": {"$lt": older_than}},
+                {"unsubscribed_at": {"$exists": False}, "created_at": {"$lt": older_than}},
+            ],
+        }
+
+    async def collect_garbage(self, db, older_than: datetime, limit: int = settings.CATALOG_GC_BATCH_SIZE):
+        """
+        Drop up to `limit` catalog entries nobody has subscribed to since `older_than`,
+        together with their price_history buckets. Returns the removed product ids.
+        """
+        query = self._unsubscribed_filter(older_than)
+        candidates = [
+            row["product_id"]
+            async for row in self.catalog(db).find(query, {"product_id": 1}).limit(limit)
+        ]
+        removed = []
+        for product_id in candidates:
+            # The filter is checked again by the delete: a subscribe since the find keeps the entry
+            result = await self.catalog(db).delete_one({"product_id": product_id, **query})
+            if result.deleted_count:
+                removed.append(product_id)
+        if removed:
+            await price_history_store.collection(db).delete_many({"product_id": {"$in": removed}})
+        return removed
+
+    @staticmethod
+    def subscription_keys_update(product_id: str, values: dict, clerk_id: str | None = None):
+        """Bulk-write operation copying a product's sort fields onto its subscriptions (one user's, or all)."""
+        query = {"product_id": product_id, **({"clerk_id": clerk_id} if clerk_id else {})}
+        return UpdateMany(query, {"$set": {field: values.get(field) for field in SUBSCRIPTION_SORT_FIELDS}})
+
+    async def sync_subscriptions(self, db, product_ids: list, clerk_id: str | None = None):
+        """Copy the catalog's current sort fields of `product_ids` onto their subscriptions."""
+        if not product_ids:
+            return
+        operations = [
+            self.subscription_keys_update(entry["product_id"], entry, clerk_id)
+            async for entry in self.catalog(db).find(
+                {"product_id": {"$in": list(product_ids)}},
+                {"product_id": 1, **{field: 1 for field in SUBSCRIPTION_SORT_FIELDS}},
+            )
+        ]
+        if operations:
+            await self.subscriptions(db).bulk_write(operations, ordered=False)
+
+    def subscription_join(self, carry: tuple = ()):
+        """
+        Aggregation stages turning subscription documents into the catalog product
+        merged with the user's subscription fields (keeping the subscription's _id),
+        plus the subscription fields named in `carry`. The $lookup hits the unique
+        catalog.product_id index once per subscription.
+        """
+        return [
+            {"$lookup": {
+                "from": self.CATALOG,
+                "localField": "product_id",
+                "foreignField": "product_id",
+                "as": "product",
+            }},
+            {"$unwind": "$product"},
+            {"$addFields": {
+                "product._id": "$_id",
+                "product.clerk_id": "$clerk_id",
+                "product.added_at": "$added_at",
+                "product.target_price": "$target_price",
+                "product.target_price_minor": "$target_price_minor",
+                **{f"product.{field}": f"${field}" for field in carry},
+            }},
+            {"$replaceRoot": {"newRoot": "$product"}},
+        ]
+
+catalog_store = CatalogStore()
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+from config import get_settings
+from database import get_database
+from services.cache import LRUTTLCache
+from services.catalog import CATALOG_FIELDS
+from services.prompt_builder import PromptBuilder
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ChatSession:
+    """
+    One conversation: the newest turns verbatim, the topics of older user turns
+    (the summary, updated as turns are evicted) and the products the last search returned.
+    `version` counts recorded exchanges and guards concurrent writers.
+    """
+    session_id: str
+    user_id: str | None = None
+    turns: list = field(default_factory=list)
+    topics: list = field(default_factory=list)
+    last_results: list = field(default_factory=list)
+    version: int = 0
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+    @property
+    def summary(self):
+        return PromptBuilder.render_summary(self.topics, max_topics=len(self.topics))
+
+    def add_exchange(self, message: str, response: str, results: list,
+                     max_turns: int, max_topics: int, max_results: int):
+        self.turns += [{"role": "user", "content": message}, {"role": "assistant", "content": response}]
+        overflow = len(self.turns) - max_turns
+        if overflow > 0:
+            # Older turns survive only as topics in the summary
+            evicted, self.turns = self.turns[:overflow], self.turns[overflow:]
+            for topic in PromptBuilder.summary_topics(evicted):
+                if topic not in self.topics:
+                    self.topics.append(topic)
+            self.topics = self.topics[-max_topics:]
+        if results:
+            self.last_results = [{name: product.get(name) for name in CATALOG_FIELDS} for product in results[:max_results]]
+        self.version += 1
+
+    def to_doc(self):
+        return {
+            "_id": self.session_id,
+            "user_id": self.user_id,
+            "turns": list(self.turns),
+            "topics": list(self.topics),
+            "last_results": list(self.last_results),
+            "version": self.version,
+            "created_at": self.created_at,
+            "updated_at": datetime.utcnow(),
+        }
+
+    @classmethod
+    def from_doc(cls, doc: dict):
+        return cls(
+            session_id=doc["_id"],
+            user_id=doc.get("user_id"),
+            turns=list(doc.get("turns", [])),
+            topics=list(doc.get("topics", [])),
+            last_results=list(doc.get("last_results", [])),
+            version=doc.get("version", 0),
+            created_at=doc.get("created_at") or datetime.utcnow(),
+        )
+
+class ChatSessionStore:
+    """
+    Server-side chat sessions, so clients send only the new message. Sessions live
+    in the 'chat_sessions' collection (expired by a TTL index on `updated_at`) with
+    an in-process cache of recently used ones in front. Every request works on its
+    own copy. Turns are saved in the background, one write at a time per session;
+    writes are conditional on `version`, so when another worker recorded a turn
+    first the session is reloaded and the turn applied again. Without a database
+    sessions are kept in the cache only.
+    """
+
+    def __init__(self, max_turns: int = settings.CHAT_SESSION_MAX_TURNS,
+                 max_topics: int = settings.CHAT_SESSION_SUMMARY_TOPICS,
+                 max_results: int = settings.CHAT_SESSION_MAX_RESULTS,
+                 cache_size: int = settings.CHAT_SESSION_CACHE_SIZE,
+                 cache_seconds: int = settings.CHAT_SESSION_CACHE_SECONDS):
+        self.max_turns = max_turns
+        self.max_topics = max_topics
+        self.max_results = max_results
+        self.cache = LRUTTLCache(max_entries=cache_size, ttl_seconds=cache_seconds)
+        self.created = 0
+        self.cache_hits = 0
+        self.loads = 0
+        self.conflicts = 0
+        self.save_failures = 0
+        # session_id -> the task saving its newest turn
+        self._writes: dict = {}
+
+    async def _load(self, db, session_id: str):
+        self.loads += 1
+        doc = await db.chat_sessions.find_one({"_id": session_id}) if db is not None else None
+        if doc is not None:
+            self.cache.set(session_id, doc)
+        return ChatSession.from_doc(doc) if doc is not None else None
+
+    async def get(self, session_id: str):
+        doc = self.cache.get(session_id)
+        if doc is not None:
+            self.cache_hits += 1
+            return ChatSession.from_doc(doc)
+        return await self._load(await get_database(), session_id)
+
+    async def get_or_create(self, session_id: str | None, user_id: str | None = None):
+        """
+        The session `session_id` names, or a new (not yet saved) one when it is
+        unknown, expired or belongs to another user.
+        """
+        if session_id:
+            try:
+                session = await self.get(session_id)
+            except Exception as e:
+                logger.warning(f"Failed to load chat session {session_id}: {e}")
+                session = None
+            if session is not None and session.user_id in (None, user_id):
+                session.user_id = session.user_id or user_id
+                return session
+        self.created += 1
+        return ChatSession(session_id=uuid.uuid4().hex, user_id=user_id)
+
+    def history(self, session: ChatSession):
+        """The session's turns as prompt history (the summary goes into the prompt separately)."""
+        return [dict(turn) for turn in session.turns]
+
+    def record(self, session: ChatSession, message: str, response: str, results: list):
+        """
+        Append one exchange and save the session in the background. The cached copy
+        is updated at once, so the next message to this process already sees the turn.
+        Returns the task writing it.
+        """
+        expected = session.version
+        session.add_exchange(message, response, results, self.max_turns, self.max_topics, self.max_results)
+        self.cache.set(session.session_id, session.to_doc())
+        previous = self._writes.get(session.session_id)
+        task = asyncio.create_task(self._write(session, expected, (message, response, results), previous))
+        self._writes[session.session_id] = task
+        task.add_done_callback(lambda done: self._write_done(session.session_id, done))
+        return task
+
+    async def _write(self, session: ChatSession, expected: int, exchange: tuple, previous=None):
+        if previous is not None:
+            # Keep one session's writes in order
+            await asyncio.wait([previous])
+        db = await get_database()
+        if db is None:
+            return session
+        for _ in range(3):
+            doc = session.to_doc()
+            try:
+                if await self._save(db, doc, expected):
+                    self.cache.set(session.session_id, doc)
+                    return session
+                self.conflicts += 1
+                fresh = await self._load(db, session.session_id)
+            except Exception as e:
+                self.save_failures += 1
+                logger.error(f"Failed to save chat session {session.session_id}: {e}")
+                return session
+            # Deleted meanwhile: start over under the same id
+            session = fresh or ChatSession(session_id=session.session_id, user_id=session.user_id)
+            expected = session.version
+            session.add_exchange(*exchange, self.max_turns, self.max_topics, self.max_results)
+        logger.warning(f"Chat session {session.session_id} kept changing, turn not saved")
+        return session
+
+    def _write_done(self, session_id: str, task):
+        if self._writes.get(session_id) is task:
+            del self._writes[session_id]
+
+    async def flush(self):
+        """Wait for the turns still being saved (at shutdown)."""
+        if self._writes:
+            await asyncio.wait(list(self._writes.values()))
+
+    @staticmethod
+    async def _save(db, doc: dict, expected_version: int):
+        if expected_version == 0:
+            try:
+                await db.chat_sessions.insert_one(doc)
+                return True
+            except DuplicateKeyError:
+                return False
+        result = await db.chat_sessions.replace_one({"_id": doc["_id"], "version": expected_version}, doc)
+        return result.matched_count == 1
+
+    async def delete(self, session_id: str):
+        pending = self._writes.get(session_id)
+        if pending is not None:
+            # Or the pending write would bring the session back
+            await asyncio.wait([pending])
+        self.cache.delete(session_id)
+        db = await get_database()
+        if db is None:
+            return False
+        result = await db.chat_sessions.delete_one({"_id": session_id})
+        return result.deleted_count == 1
+
+    def stats(self):
+        return {
+            "cached": len(self.cache),
+            "created": self.created,
+            "cache_hits": self.cache_hits,
+            "loads": self.loads,
+            "conflicts": self.conflicts,
+            "save_failures": self.save_failures,
+        }
+
+chat_sessions = ChatSessionStore()
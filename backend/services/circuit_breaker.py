@@ -0,0 +1,109 @@
+import math
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class LatencyWindow:
+    """The last `size` latencies (seconds) of one kind of call, for percentiles."""
+
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+    def __len__(self):
+        return len(self.samples)
+
+class CircuitBreaker:
+    """
+    Per-dependency circuit breaker. After `failure_threshold` consecutive failures
+    the circuit opens and callers skip the dependency for `reset_seconds`; then a
+    single trial call is let through (half-open) and its outcome closes or
+    re-opens the circuit. Latencies of successful calls are kept per kind
+    ("complete", "first_token") so callers can derive hedging delays.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_seconds: float = 30.0,
+                 latency_window: int = 200):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.latency_window = latency_window
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.latency: dict = {}
+        self.successes = 0
+        self.failures = 0
+        self.short_circuited = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go out now. In half-open state only one trial call is allowed."""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = HALF_OPEN
+            self.trial_in_flight = False
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        self.short_circuited += 1
+        return False
+
+    def available(self) -> bool:
+        """Like `allow`, without claiming the half-open trial call (callers skipping a provider use this)."""
+        if self.state == OPEN:
+            ready = time.monotonic() - self.opened_at >= self.reset_seconds
+        else:
+            ready = self.state == CLOSED or not self.trial_in_flight
+        if not ready:
+            self.short_circuited += 1
+        return ready
+
+    def record_success(self, seconds: float | None = None, kind: str = "complete"):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.trial_in_flight = False
+        if seconds is not None:
+            self.latency.setdefault(kind, LatencyWindow(self.latency_window)).observe(seconds)
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.trial_in_flight = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def record_cancelled(self):
+        """A call abandoned by the caller (e.g. a lost hedge) says nothing about health."""
+        self.trial_in_flight = False
+
+    def percentile(self, pct: float, kind: str = "complete", min_samples: int = 20):
+        window = self.latency.get(kind)
+        if window is None or len(window) < min_samples:
+            return None
+        return window.percentile(pct)
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "short_circuited": self.short_circuited,
+            "latency_p50": {kind: window.percentile(50) for kind, window in self.latency.items()},
+            "latency_p95": {kind: window.percentile(95) for kind, window in self.latency.items()},
+        }
@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import httpx
+import jwt
+from config import get_settings
+from services.cache import LRUTTLCache
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+CLERK_API_JWKS_URL = "https://api.clerk.com/v1/jwks"
+
+class ClerkTokenVerifier:
+    """
+    Verifies Clerk session JWTs (RS256) against Clerk's JWKS.
+
+    - Signing keys are cached for CLERK_JWKS_CACHE_SECONDS. A token signed with an
+      unknown `kid` (key rotation) or expired keys trigger a refresh, throttled to
+      one per CLERK_JWKS_MIN_REFRESH_SECONDS so bogus tokens can't hammer Clerk and
+      an outage can't stall every request. Stale keys are used until a refresh succeeds.
+    - Keys come from CLERK_JWKS_URL, else Clerk's Backend API using CLERK_SECRET_KEY,
+      falling back to CLERK_JWKS_FILE (JWKS JSON or a PEM public key) when no URL is
+      usable or the fetch fails.
+    - Successfully verified tokens are memoized by SHA-256 until their `exp`, so
+      repeat requests with the same session token skip the signature check.
+    """
+
+    def __init__(self):
+        self._keys: dict = {}
+        self._keys_loaded_at = 0.0
+        self._last_refresh_attempt = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._verified = LRUTTLCache(settings.CLERK_TOKEN_CACHE_SIZE, ttl_seconds=0)
+        self.cache_hits = 0
+        self.verifications = 0
+
+    async def verify(self, token: str) -> dict:
+        """Return the verified claims, or raise jwt.InvalidTokenError (incl. ExpiredSignatureError)."""
+        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        claims = self._verified.get(token_hash)
+        if claims is not None:
+            self.cache_hits += 1
+            return claims
+
+        header = jwt.get_unverified_header(token)
+        key = await self._get_key(header.get("kid"))
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=["RS256"],
+            issuer=settings.CLERK_ISSUER,
+            leeway=settings.CLERK_CLOCK_SKEW_SECONDS,
+            options={"require": ["exp", "sub"], "verify_aud": False},
+        )
+        self._check_authorized_party(claims)
+        self.verifications += 1
+
+        ttl = claims["exp"] - time.time()
+        if ttl > 0:
+            self._verified.set(token_hash, claims, ttl_seconds=ttl)
+        return claims
+
+    def _check_authorized_party(self, claims: dict):
+        if not settings.CLERK_AUTHORIZED_PARTIES:
+            return
+        allowed = {party.strip() for party in settings.CLERK_AUTHORIZED_PARTIES.split(",") if party.strip()}
+        if claims.get("azp") and claims["azp"] not in allowed:
+            raise jwt.InvalidTokenError("Token issued for an unauthorized party")
+
+    async def _get_key(self, kid: str | None):
+        expired = time.monotonic() - self._keys_loaded_at > settings.CLERK_JWKS_CACHE_SECONDS
+        key = self._lookup(kid)
+        # With a usable (if stale) key, don't queue behind a refresh already in flight
+        if (expired or key is None) and not (key is not None and self._refresh_lock.locked()):
+            await self._refresh()
+
+        key = self._lookup(kid)
+        if key is None:
+            raise jwt.InvalidTokenError("Token signed with an unknown key")
+        return key
+
+    def _lookup(self, kid):
+        # A PEM key file has no kid and is used for every token
+        return self._keys.get(kid) or self._keys.get(None)
+
+    async def _refresh(self):
+        async with self._refresh_lock:
+            now = time.monotonic()
+            # Expiry-driven refreshes are throttled too: during a Clerk outage each
+            # request would otherwise wait out its own failing fetch
+            if now - self._last_refresh_attempt < settings.CLERK_JWKS_MIN_REFRESH_SECONDS:
+                return
+            self._last_refresh_attempt = now
+            try:
+                keys = await self._load_keys()
+            except Exception as e:
+                # Keep serving with the keys we already have, stale or not
+                logger.error(f"Failed to load Clerk JWKS: {e}")
+                return
+            self._keys = keys
+            self._keys_loaded_at = now
+
+    async def _load_keys(self):
+        url, headers = self._jwks_source()
+        if url:
+            try:
+                async with httpx.AsyncClient(timeout=settings.CLERK_JWKS_TIMEOUT_SECONDS) as client:
+                    response = await client.get(url, headers=headers)
+                    response.raise_for_status()
+                    return self._parse_jwks(response.json())
+            except Exception as e:
+                if not settings.CLERK_JWKS_FILE:
+                    raise
+                logger.warning(f"Clerk JWKS fetch failed, using {settings.CLERK_JWKS_FILE}: {e}")
+
+        if settings.CLERK_JWKS_FILE:
+            return self._load_key_file(settings.CLERK_JWKS_FILE)
+        raise Exception("No Clerk JWKS source configured (set CLERK_SECRET_KEY, CLERK_JWKS_URL or CLERK_JWKS_FILE)")
+
+    def _jwks_source(self):
+        if settings.CLERK_JWKS_URL:
+            return settings.CLERK_JWKS_URL, {}
+        if settings.CLERK_SECRET_KEY:
+            return CLERK_API_JWKS_URL, {"Authorization": f"Bearer {settings.CLERK_SECRET_KEY}"}
+        return None, {}
+
+    @staticmethod
+    def _parse_jwks(jwks: dict):
+        keys = {}
+        for jwk in jwks.get("keys", []):
+            if jwk.get("kty") == "RSA" and jwk.get("use", "sig") == "sig":
+                keys[jwk.get("kid")] = jwt.PyJWK.from_dict(jwk).key
+        if not keys:
+            raise Exception("JWKS contains no RSA signing keys")
+        return keys
+
+    @classmethod
+    def _load_key_file(cls, path: str):
+        with open(path) as f:
+            content = f.read()
+        if content.lstrip().startswith("-----BEGIN"):
+            from cryptography.hazmat.primitives.serialization import load_pem_public_key
+            return {None: load_pem_public_key(content.encode())}
+        return cls._parse_jwks(json.loads(content))
+
+    def stats(self):
+        return {
+            "keys": len(self._keys),
+            "cached_tokens": len(self._verified),
+            "cache_hits": self.cache_hits,
+            "verifications": self.verifications,
+        }
+
+clerk_verifier = ClerkTokenVerifier()
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from config import get_settings
+from database import get_database
+from models.history import HistoryItem
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class HistoryWriter:
+    """
+    Queues search/chat history records and writes them with insert_many once
+    HISTORY_WRITER_BATCH_SIZE items are pending or HISTORY_WRITER_FLUSH_SECONDS
+    have passed, keeping MongoDB round trips off the request path.
+    The queue is bounded: when it is full, `enqueue` waits (backpressure).
+    """
+
+    def __init__(self, batch_size: int = settings.HISTORY_WRITER_BATCH_SIZE,
+                 flush_interval: float = settings.HISTORY_WRITER_FLUSH_SECONDS,
+                 max_queue: int = settings.HISTORY_WRITER_MAX_QUEUE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self.written = 0
+        self.failed = 0
+
+    @property
+    def running(self):
+        return self._task is not None and not self._stopping
+
+    async def start(self):
+        if self._task is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queue)
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+            logger.info("History writer started")
+
+    async def stop(self):
+        """Flush everything queued so far, then stop. Called from the shutdown hook."""
+        if self._task is None:
+            return
+        self._stopping = True
+        await self.queue.put(_STOP)
+        await self._task
+        self._task = None
+        logger.info(f"History writer stopped ({self.written} written, {self.failed} failed)")
+
+    async def enqueue(self, item: HistoryItem):
+        doc = item.dict(by_alias=True, exclude={"id"})
+        if not self.running:
+            # Outside the app lifecycle (scripts) or during shutdown: write directly
+            await self._flush([doc])
+            return
+        await self.queue.put(doc)
+
+    def pending(self):
+        return self.queue.qsize() if self.queue is not None else 0
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            stop_after_flush = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stop_after_flush = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+            if stop_after_flush:
+                return
+
+    async def _flush(self, docs: list):
+        try:
+            db = await get_database()
+            if db is None:
+                raise Exception("Database connection not established")
+            await db.history.insert_many(docs, ordered=False)
+            self.written += len(docs)
+        except Exception as e:
+            self.failed += len(docs)
+            logger.error(f"Failed to write {len(docs)} history items: {e}")
+
+history_writer = HistoryWriter()
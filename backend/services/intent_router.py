@@ -0,0 +1,169 @@
+import re
+from dataclasses import dataclass, field
+from services.cache import normalize_text
+from services.product_index import ProductIndex, product_index, tokenize
+
+REFINE = "refine"
+SEARCH = "search"
+
+# "15k", "1.5 lakh", "₹15,000", "rs. 15000"
+_AMOUNT = r"(?:₹|rs\.?|inr)?\s*(\d[\d,]*(?:\.\d+)?)\s*(k|thousand|lakhs?|lacs?)?\b"
+_MULTIPLIERS = {"k": 1_000, "thousand": 1_000, "lakh": 100_000, "lakhs": 100_000, "lac": 100_000, "lacs": 100_000}
+
+_RANGE = re.compile(rf"\b(?:between|from)\s+{_AMOUNT}\s*(?:and|to|-)\s*{_AMOUNT}|{_AMOUNT}\s*(?:-|to)\s*{_AMOUNT}")
+_MAX_PRICE = re.compile(
+    rf"(?:\b(?:under|below|less than|cheaper than|within|upto|up to|max(?:imum)?|at most|not more than)|<=?)\s*{_AMOUNT}"
+)
+_MIN_PRICE = re.compile(rf"(?:\b(?:above|over|more than|at least|min(?:imum)?|starting(?: at| from)?)|>=?)\s*{_AMOUNT}")
+_RATING = re.compile(
+    r"\b(?:rated|rating|ratings)\s*(?:of\s*)?(?:above|over|at least|>=?|=)?\s*(\d(?:\.\d)?)\s*(?:\+|stars?|and above|or more|or above)*"
+    r"|\b(?:above|over|at least)?\s*(\d(?:\.\d)?)\s*(?:\+\s*)?(?:stars?|★)(?:\s*(?:and above|or more|or above|\+|plus))?"
+)
+_SORTS = (
+    (re.compile(r"\b(?:cheapest|lowest price|least expensive|low to high|sort by price)\b"), "price_asc"),
+    (re.compile(r"\b(?:most expensive|highest price|priciest|high to low|premium)\b"), "price_desc"),
+    (re.compile(r"\b(?:best rated|top rated|highest rated|best reviewed|top reviewed)\b"), "rating_desc"),
+)
+# Words pointing back at products already shown
+_REFERENCES = re.compile(
+    r"\b(?:these|those|them|the above|above ones|the ones|shown|listed|from the list|of the results|"
+    r"ones|which one|which of|among|out of|only|just|filter|instead|compare|vs|versus)\b"
+)
+
+# Words that carry no product meaning in a follow-up
+STOPWORDS = frozenset(tokenize(
+    "a an the and or of for in on to with from by is are be it its me my i we you show give list find "
+    "get want need please can could would should which what whats one ones any some all only just also "
+    "filter sort them these those that this there here now then instead more less than other options "
+    "option result results product products item items available good better best budget price prices "
+    "priced cost costs costing range rupee rupees rs inr under below above over within upto up to "
+    "between cheaper cheap expensive star stars rated rating ratings plus and or around about like "
+    "do does have has out among brand brands make model models compare comparison vs versus difference "
+    "recommend suggest pick choose buy worth tell"
+))
+
+@dataclass
+class ChatIntent:
+    """What a chat message needs: a fresh SerpApi search, or a filter over products already shown."""
+    action: str
+    scope: list | None = None  # Product ids the refinement applies to
+    keywords: list = field(default_factory=list)
+    brand: str | None = None
+    min_price: float | None = None
+    max_price: float | None = None
+    min_rating: float | None = None
+    sort: str | None = None
+
+    @property
+    def filters(self):
+        return {
+            "keywords": self.keywords, "brand": self.brand, "min_price": self.min_price,
+            "max_price": self.max_price, "min_rating": self.min_rating, "sort": self.sort,
+        }
+
+def _amount(number: str, unit: str | None):
+    value = float(number.replace(",", ""))
+    return value * _MULTIPLIERS.get(unit or "", 1)
+
+class IntentRouter:
+    """
+    Rule-based router for chat messages, cheap enough for every request. A message
+    is a refinement when there are products it can refer to (the client's
+    `context_products`, or what an earlier message in the conversation returned),
+    it asks for a filter, a sort or points back at "these", and every remaining
+    word either names a brand or already appears in those products' titles
+    ("only Samsung under 15k", "which of these has 4+ stars"). Anything else is a
+    new search ("gaming laptop under 50000").
+    """
+
+    def __init__(self, index: ProductIndex):
+        self.index = index
+
+    def scope(self, history: list = None, context_products: list = None):
+        """
+        Product ids a follow-up refers to (the client's context, else what the newest
+        remembered turn returned) and the words of the query that produced them.
+        """
+        if context_products:
+            self.index.add_many(context_products)
+            return [product["product_id"] for product in context_products if product.get("product_id")], set()
+        for turn in reversed(history or []):
+            if turn.get("role") == "user":
+                ids = self.index.results_for(turn.get("content", ""))
+                if ids:
+                    return ids, set(tokenize(turn.get("content", "")))
+        return None, set()
+
+    def parse(self, message: str):
+        """Filters named in `message`, and the text left once they are cut out."""
+        text = normalize_text(message)
+        intent = ChatIntent(action=SEARCH)
+
+        match = _RANGE.search(text)
+        if match:
+            groups = match.groups()
+            low, low_unit, high, high_unit = groups[:4] if groups[0] else groups[4:]
+            # "10-15k": the unit applies to both ends
+            low_amount = _amount(low, low_unit or high_unit)
+            intent.min_price, intent.max_price = sorted((low_amount, _amount(high, high_unit)))
+            text = text[:match.start()] + " " + text[match.end():]
+
+        match = _RATING.search(text)
+        if match:
+            intent.min_rating = float(match.group(1) or match.group(2))
+            text = text[:match.start()] + " " + text[match.end():]
+
+        for pattern, attribute in ((_MAX_PRICE, "max_price"), (_MIN_PRICE, "min_price")):
+            match = pattern.search(text)
+            if match and getattr(intent, attribute) is None:
+                setattr(intent, attribute, _amount(match.group(1), match.group(2)))
+                text = text[:match.start()] + " " + text[match.end():]
+
+        for pattern, sort in _SORTS:
+            match = pattern.search(text)
+            if match:
+                intent.sort = sort
+                text = text[:match.start()] + " " + text[match.end():]
+                break
+        return intent, text
+
+    def route(self, message: str, history: list = None, context_products: list = None):
+        intent, rest = self.parse(message)
+        refers_back = bool(_REFERENCES.search(rest))
+        asks_filter = any(value is not None for value in (
+            intent.min_price, intent.max_price, intent.min_rating, intent.sort
+        ))
+
+        words = [token for token in tokenize(rest) if token not in STOPWORDS and not token.isdigit()]
+        if not (asks_filter or refers_back or words):
+            # Nothing left to search for ("under 15k", "cheapest?"): only a refinement makes sense
+            refers_back = True
+        if not (asks_filter or refers_back):
+            return intent
+
+        scope, asked_before = self.scope(history, context_products)
+        if not scope:
+            return intent
+
+        scope_tokens = self.index.tokens_of(scope)
+        for word in words:
+            if word in asked_before and word not in self.index.brands:
+                # Already what the shown products are ("phones" after "best phones")
+                continue
+            if word in self.index.brands and word in scope_tokens and intent.brand is None:
+                intent.brand = word
+            elif word in scope_tokens:
+                intent.keywords.append(word)
+            else:
+                # Something the shown products don't have: a new search
+                return intent
+
+        intent.action = REFINE
+        intent.scope = scope
+        return intent
+
+    def refine(self, intent: ChatIntent, limit: int | None = None):
+        """Products for a REFINE intent, filtered from its scope by the index."""
+        return self.index.search(within=intent.scope, limit=limit, **intent.filters)
+
+intent_router = IntentRouter(product_index)
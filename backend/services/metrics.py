@@ -0,0 +1,296 @@
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Prometheus' default latency buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: dict = {}
+
+    def _key(self, labels: dict):
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        lines = self.header()
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """
+    A value set from outside. `kind="counter"` exposes a running total that another
+    object already keeps (e.g. cache hit counts), copied in at scrape time.
+    """
+
+    def __init__(self, name: str, documentation: str, labels=(), kind: str = "gauge"):
+        super().__init__(name, documentation, labels)
+        self.kind = kind
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            # Per-bucket (non-cumulative) counts + the +Inf bucket, then sum
+            series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = self.header()
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+class MetricsRegistry:
+    """
+    Process-local metrics rendered in the Prometheus text format (GET /metrics).
+    Updates are plain dict operations on the event loop thread, cheap enough for
+    every request. Each worker process keeps its own numbers; scrape every worker.
+    Values owned by other objects (cache stats, queue depths) are copied in by
+    collectors registered with `on_collect`, only when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self._metrics: dict = {}
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels=(), kind: str = "gauge"):
+        return self.register(Gauge(name, documentation, labels, kind))
+
+    def histogram(self, name: str, documentation: str, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def on_collect(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                # A broken collector must not take the whole endpoint down
+                logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter(
+    "pricewise_http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")
+)
+HTTP_LATENCY = registry.histogram(
+    "pricewise_http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route")
+)
+UPSTREAM_LATENCY = registry.histogram(
+    "pricewise_upstream_request_duration_seconds",
+    "Calls to SerpApi and the LLM providers, including failed ones.",
+    ("provider",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0),
+)
+UPSTREAM_ERRORS = registry.counter(
+    "pricewise_upstream_errors_total", "Failed calls to SerpApi and the LLM providers.", ("provider",)
+)
+TRACKER_CYCLE_SECONDS = registry.histogram(
+    "pricewise_tracker_cycle_duration_seconds",
+    "Price tracker cycles: scheduler ticks and full update_all_prices runs.",
+    ("cycle",),
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0, 3600.0),
+)
+TRACKER_PRODUCTS = registry.counter(
+    "pricewise_tracker_products_refreshed_total", "Catalog products refreshed by the price tracker."
+)
+TRACKER_PRICE_CHANGES = registry.counter(
+    "pricewise_tracker_price_changes_total", "Price changes recorded by the price tracker."
+)
+TRACKER_THROUGHPUT = registry.gauge(
+    "pricewise_tracker_products_per_second", "Refresh rate of the last finished tracker cycle.", ("cycle",)
+)
+
+@contextmanager
+def track_upstream(provider: str):
+    """Time an upstream call and count it as an error if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.inc(provider=provider)
+        raise
+    finally:
+        UPSTREAM_LATENCY.observe(time.perf_counter() - started, provider=provider)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency and status per route template (e.g.
+    /api/v1/tracker/history/{product_id}), so label cardinality stays bounded.
+    Streaming responses are timed until their last chunk is sent.
+    """
+
+    def __init__(self, app, skip_paths=("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_LATENCY.observe(time.perf_counter() - started, method=method, route=path)
+            HTTP_REQUESTS.inc(method=method, route=path, status=status)
+
+CACHE_ENTRIES = registry.gauge("pricewise_cache_entries", "Entries held by each in-process cache.", ("cache",))
+CACHE_LOOKUPS = registry.gauge(
+    "pricewise_cache_lookups_total", "Cache lookups by outcome.", ("cache", "result"), kind="counter"
+)
+CHAT_SEARCH_ROUTES = registry.counter(
+    "pricewise_chat_search_routes_total",
+    "Chat messages answered with a SerpApi search or refined from the local product index.",
+    ("route",),
+)
+QUEUE_DEPTH = registry.gauge("pricewise_queue_depth", "Items waiting in in-process queues.", ("queue",))
+UPSTREAM_BUDGET = registry.gauge(
+    "pricewise_upstream_budget_remaining", "SerpApi calls left today (only set when capped).", ("budget",)
+)
+UPSTREAM_REJECTED = registry.gauge(
+    "pricewise_upstream_rejected_total", "SerpApi calls refused by the admission scheduler.", ("reason",),
+    kind="counter",
+)
+AI_CIRCUIT_STATE = registry.gauge(
+    "pricewise_ai_circuit_state", "AI provider circuit breakers: 0 closed, 1 half-open, 2 open.", ("provider",)
+)
+AI_LATENCY_P95 = registry.gauge(
+    "pricewise_ai_latency_p95_seconds",
+    "p95 over recent successful AI calls (kind: complete or first_token); drives hedging delays.",
+    ("provider", "kind"),
+)
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+def collect_service_stats():
+    """Copy cache and queue counters from the service singletons (run at scrape time)."""
+    from services.serpapi_service import serpapi_service
+    from services.answer_cache import answer_cache
+    from services.history_writer import history_writer
+    from services.clerk_auth import clerk_verifier
+    from services.upstream_scheduler import upstream_scheduler
+    from services.ai_service import ai_service
+    from services.product_index import product_index
+    from services.chat_sessions import chat_sessions
+
+    for cache in (serpapi_service.cache, answer_cache.cache):
+        if cache is None:
+            continue
+        stats = cache.stats()
+        CACHE_ENTRIES.set(stats["size"], cache=stats["namespace"])
+        for result in ("hits", "remote_hits", "coalesced", "misses"):
+            CACHE_LOOKUPS.set(stats[result], cache=stats["namespace"], result=result)
+
+    clerk = clerk_verifier.stats()
+    CACHE_ENTRIES.set(clerk["cached_tokens"], cache="clerk_tokens")
+    CACHE_LOOKUPS.set(clerk["cache_hits"], cache="clerk_tokens", result="hits")
+    CACHE_LOOKUPS.set(clerk["verifications"], cache="clerk_tokens", result="misses")
+
+    CACHE_ENTRIES.set(len(product_index), cache="product_index")
+    sessions = chat_sessions.stats()
+    CACHE_ENTRIES.set(sessions["cached"], cache="chat_sessions")
+    CACHE_LOOKUPS.set(sessions["cache_hits"], cache="chat_sessions", result="hits")
+    CACHE_LOOKUPS.set(sessions["loads"], cache="chat_sessions", result="misses")
+    QUEUE_DEPTH.set(history_writer.pending(), queue="history_writer")
+
+    upstream = upstream_scheduler.stats()
+    for priority, queued in upstream["queued"].items():
+        QUEUE_DEPTH.set(queued, queue=f"serpapi_{priority}")
+    for budget, key in (("daily", "remaining_quota"), ("background", "background_allowance")):
+        if upstream[key] is not None:
+            UPSTREAM_BUDGET.set(upstream[key], budget=budget)
+    for reason, count in upstream["rejected"].items():
+        UPSTREAM_REJECTED.set(count, reason=reason)
+
+    for provider, stats in ai_service.provider_stats().items():
+        if not stats["enabled"]:
+            continue
+        AI_CIRCUIT_STATE.set(CIRCUIT_STATES[stats["state"]], provider=provider)
+        for kind, p95 in stats["latency_p95"].items():
+            AI_LATENCY_P95.set(p95, provider=provider, kind=kind)
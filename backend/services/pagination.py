@@ -0,0 +1,96 @@
+import base64
+from bson import ObjectId, json_util
+
+# The page's sort value, set before `page_stages` so a join can carry it through
+CURSOR_VALUE_FIELD = "_cursor_value"
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(value, last_id: str) -> str:
+    """Opaque continuation token: the sort value and id of the last item on the page."""
+    payload = json_util.dumps({"v": value, "id": last_id})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(token: str):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        last_id = payload["id"]
+        return payload.get("v"), ObjectId(last_id) if ObjectId.is_valid(last_id) else last_id
+    except Exception:
+        raise InvalidCursor("Invalid pagination cursor")
+
+def keyset_filter(sort_field: str | None, direction: int, value, last_id):
+    """
+    Match the items strictly after (value, last_id) in (sort_field, _id) order.
+    Missing/null sort values sort first ascending, so they are handled separately.
+    """
+    op = "$gt" if direction == 1 else "$lt"
+    if sort_field is None:
+        return {"_id": {op: last_id}}
+    if value is None:
+        tie = {sort_field: None, "_id": {op: last_id}}
+        return {"$or": [tie, {sort_field: {"$ne": None}}]} if direction == 1 else tie
+    after = {sort_field: {op: value}}
+    if direction == -1:
+        # Descending order puts null sort values after every real value
+        after = {"$or": [after, {sort_field: None}]}
+    return {"$or": [after, {sort_field: value, "_id": {op: last_id}}]}
+
+async def paginate(collection, match: dict, sort_field: str | None = None, direction: int = -1,
+                   limit: int = 50, cursor: str | None = None, fields: tuple = (), exclude: tuple = (),
+                   stages: list = (), page_stages: list = ()):
+    """
+    Keyset-paginate `collection` ordered by (sort_field, _id), or by _id alone.
+    Each page is one index range scan of `limit + 1` documents, so latency does not
+    grow with the page number. `_id` is returned as a string `id`; the projection keeps
+    only `fields` when given, otherwise drops the `exclude`d ones. The sort field must
+    survive the projection. `stages` run between the initial $match and the keyset
+    match/sort; `page_stages` (e.g. a $lookup join) only run on the `limit + 1`
+    documents of the page. When they replace the document, they must keep
+    CURSOR_VALUE_FIELD. Returns (items, next_cursor or None).
+    Raises InvalidCursor for a malformed token.
+    """
+    pipeline = [{"$match": match}, *stages]
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        pipeline.append({"$match": keyset_filter(sort_field, direction, value, last_id)})
+
+    sort = {sort_field: direction, "_id": direction} if sort_field else {"_id": direction}
+    if fields:
+        projection = {"_id": 0, "id": 1, **{field: 1 for field in fields}}
+    else:
+        projection = {"_id": 0, **{field: 0 for field in exclude}}
+    pipeline += [{"$sort": sort}, {"$limit": limit + 1}]
+    if page_stages:
+        if sort_field:
+            pipeline.append({"$addFields": {CURSOR_VALUE_FIELD: f"${sort_field}"}})
+        pipeline += page_stages
+        if fields:
+            projection[CURSOR_VALUE_FIELD] = 1
+    pipeline += [
+        {"$addFields": {"id": {"$toString": "$_id"}}},
+        {"$project": projection},
+    ]
+    items = await collection.aggregate(pipeline).to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        value = None
+        if sort_field:
+            value = last.get(CURSOR_VALUE_FIELD) if page_stages else _get_path(last, sort_field)
+        next_cursor = encode_cursor(value, last["id"])
+    if page_stages and sort_field:
+        for item in items:
+            item.pop(CURSOR_VALUE_FIELD, None)
+    return items, next_cursor
+
+def _get_path(doc: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
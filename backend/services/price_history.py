@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from config import get_settings
+
+settings = get_settings()
+
+def to_naive_utc(value: datetime | None):
+    """Timestamps are stored as naive UTC (datetime.utcnow); normalize aware query bounds to match."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class PriceHistoryStore:
+    """
+    Price history stored as bucket documents in the 'price_history' collection:
+    one document holds up to PRICE_HISTORY_BUCKET_SIZE points for a product, so
+    no single document grows without bound. Tracked products only keep a short
+    inline preview (`history`, the last PRICE_HISTORY_PREVIEW_POINTS points).
+    New points only go to a product's open bucket; buckets written by
+    scripts/migrate_price_history.py are closed (`open: False`), so live points
+    never land in a bucket of old ones.
+    """
+    COLLECTION = "price_history"
+
+    def __init__(self, bucket_size: int = settings.PRICE_HISTORY_BUCKET_SIZE):
+        self.bucket_size = bucket_size
+
+    def collection(self, db):
+        return db[self.COLLECTION]
+
+    @staticmethod
+    def point(price: str, timestamp: datetime, price_minor: int | None = None):
+        return {"price": price, "price_minor": price_minor, "timestamp": timestamp}
+
+    def record_operation(self, product_id: str, price: str, timestamp: datetime | None = None,
+                         price_minor: int | None = None):
+        """
+        Bulk-write operation appending one point to the product's open bucket,
+        starting a new bucket once the current one is full.
+        """
+        timestamp = timestamp or datetime.utcnow()
+        return UpdateOne(
+            {"product_id": product_id, "open": {"$ne": False}, "count": {"$lt": self.bucket_size}},
+            {
+                "$push": {"points": self.point(price, timestamp, price_minor)},
+                "$inc": {"count": 1},
+                "$min": {"first_ts": timestamp},
+                "$max": {"last_ts": timestamp},
+            },
+            upsert=True,
+        )
+
+    async def record(self, db, product_id: str, price: str, timestamp: datetime | None = None,
+                     price_minor: int | None = None):
+        await self.collection(db).bulk_write([self.record_operation(product_id, price, timestamp, price_minor)])
+
+    async def has_history(self, db, product_id: str):
+        return await self.collection(db).find_one({"product_id": product_id}, {"_id": 1}) is not None
+
+    async def get_history(self, db, product_id: str, start: datetime | None = None,
+                          end: datetime | None = None, limit: int = 500):
+        """
+        Return up to `limit` of the most recent points in [start, end], oldest first.
+        Only buckets overlapping the range are read.
+        """
+        bucket_match: dict = {"product_id": product_id}
+        point_match: dict = {}
+        if start:
+            bucket_match["last_ts"] = {"$gte": start}
+            point_match.setdefault("points.timestamp", {})["$gte"] = start
+        if end:
+            bucket_match["first_ts"] = {"$lte": end}
+            point_match.setdefault("points.timestamp", {})["$lte"] = end
+
+        pipeline = [
+            {"$match": bucket_match},
+            {"$sort": {"first_ts": -1}},
+            # Buckets fill in time order, so the newest `limit` points sit in the newest few buckets
+            # (+2 covers a partially filled bucket at either edge of the range)
+            {"$limit": limit // self.bucket_size + 2},
+            {"$unwind": "$points"},
+        ]
+        if point_match:
+            pipeline.append({"$match": point_match})
+        pipeline += [
+            {"$sort": {"points.timestamp": -1}},
+            {"$limit": limit},
+            {"$replaceRoot": {"newRoot": "$points"}},
+        ]
+
+        points = await self.collection(db).aggregate(pipeline).to_list(length=limit)
+        points.reverse()
+        return points
+
+    def preview_push(self, price: str, timestamp: datetime, price_minor: int | None = None):
+        """`$push` clause that appends to a product's inline preview and keeps it bounded."""
+        return {"history": {
+            "$each": [self.point(price, timestamp, price_minor)],
+            "$slice": -settings.PRICE_HISTORY_PREVIEW_POINTS,
+        }}
+
+price_history_store = PriceHistoryStore()
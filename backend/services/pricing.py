@@ -0,0 +1,101 @@
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+DEFAULT_CURRENCY = "INR"
+
+# Symbol-prefixed tokens first so "US$" isn't read as a bare "$"; letter codes only
+# count as whole words ("Rs.499" and "INR 499" match, "offers" and "Prince" don't)
+CURRENCY_TOKENS = [
+    (r"us\$", "USD"), (r"₹", "INR"), (r"\$", "USD"), (r"€", "EUR"), (r"£", "GBP"),
+    (r"(?<![a-z])(?:rs|inr)(?![a-z])", "INR"),
+    (r"(?<![a-z])usd(?![a-z])", "USD"),
+    (r"(?<![a-z])eur(?![a-z])", "EUR"),
+    (r"(?<![a-z])gbp(?![a-z])", "GBP"),
+]
+_CURRENCY_PATTERNS = [(re.compile(token), code) for token, code in CURRENCY_TOKENS]
+
+_NUMBER = re.compile(r"\d[\d,.\s]*")
+# 1.299,00 style (dot grouping, comma decimals)
+_COMMA_DECIMAL = re.compile(r"^\d{1,3}(\.\d{3})+,\d{1,2}$|^\d+,\d{1,2}$")
+
+def detect_currency(text: str, default: str | None = DEFAULT_CURRENCY):
+    lowered = text.lower()
+    for pattern, code in _CURRENCY_PATTERNS:
+        if pattern.search(lowered):
+            return code
+    return default
+
+def to_minor_units(amount) -> int | None:
+    """Convert a major-unit amount (e.g. rupees) to integer minor units (paise)."""
+    try:
+        value = Decimal(str(amount))
+    except InvalidOperation:
+        return None
+    if not value.is_finite() or value < 0:
+        return None
+    return int((value * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+def parse_price(value, default_currency: str = DEFAULT_CURRENCY):
+    """
+    Parse a display price ("₹1,23,999", "Rs. 499.50", "$12.99", 1299.0) into
+    (minor_units, currency). Returns (None, None) when no price can be read.
+    Only the first amount is used, so ranges like "₹999 - ₹1,299" yield the low end.
+    """
+    if value is None or isinstance(value, bool):
+        return None, None
+    if isinstance(value, (int, float, Decimal)):
+        minor = to_minor_units(value)
+        return (minor, default_currency) if minor is not None else (None, None)
+
+    text = str(value).strip()
+    match = _NUMBER.search(text)
+    if not match:
+        return None, None
+
+    number = re.sub(r"\s", "", match.group()).rstrip(".,")
+    if _COMMA_DECIMAL.match(number):
+        number = number.replace(".", "").replace(",", ".")
+    else:
+        number = number.replace(",", "")
+        # Stray grouping dots ("1.299.000") leave more than one '.'
+        if number.count(".") > 1:
+            number = number.replace(".", "")
+
+    minor = to_minor_units(number)
+    if minor is None:
+        return None, None
+    return minor, detect_currency(text, default_currency)
+
+PRICE_SORTS = ("price_asc", "price_desc")
+
+def price_range_filter(min_price: float | None = None, max_price: float | None = None):
+    """MongoDB filter on `price_minor` for a range given in major units (rupees)."""
+    bounds = {}
+    if min_price is not None:
+        bounds["$gte"] = to_minor_units(min_price)
+    if max_price is not None:
+        bounds["$lte"] = to_minor_units(max_price)
+    return {"price_minor": bounds} if bounds else {}
+
+def filter_by_price(products: list, min_price: float | None = None, max_price: float | None = None,
+                    sort: str | None = None):
+    """
+    In-memory equivalent of `price_range_filter` plus optional price sorting, for
+    result sets that don't come from the database (e.g. fresh search results).
+    Products without a numeric price are dropped by range filters and sorted last.
+    """
+    low = to_minor_units(min_price) if min_price is not None else None
+    high = to_minor_units(max_price) if max_price is not None else None
+    if low is not None or high is not None:
+        products = [
+            p for p in products
+            if p.get("price_minor") is not None
+            and (low is None or p["price_minor"] >= low)
+            and (high is None or p["price_minor"] <= high)
+        ]
+    if sort in PRICE_SORTS:
+        priced = [p for p in products if p.get("price_minor") is not None]
+        unpriced = [p for p in products if p.get("price_minor") is None]
+        priced.sort(key=lambda p: p["price_minor"], reverse=sort == "price_desc")
+        products = priced + unpriced
+    return products
@@ -0,0 +1,234 @@
+import bisect
+import logging
+import re
+from collections import OrderedDict
+from config import get_settings
+from services.cache import LRUTTLCache, normalize_text
+from services.catalog import CATALOG_FIELDS, catalog_store
+from services.pricing import PRICE_SORTS, to_minor_units
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+")
+
+def tokenize(text: str):
+    """
+    Normalized word tokens of free text, with a naive plural strip so "phones"
+    matches "phone". Used for product titles and for queries alike.
+    """
+    tokens = []
+    for token in _TOKEN.findall(normalize_text(text or "")):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss") and not token[-2].isdigit():
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+def _rating(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+class ProductIndex:
+    """
+    In-memory inverted index over products this process has seen: every normalized
+    SerpApi result and every tracked product. Title tokens map to product ids; price
+    (`price_minor`) and rating are kept in sorted arrays for range lookups. The most
+    recently seen `max_products` are kept. It also remembers which products each
+    recent query returned, so chat follow-ups can be answered from them
+    (see services/intent_router.py). Per process, nothing is persisted.
+    """
+
+    def __init__(self, max_products: int = settings.PRODUCT_INDEX_MAX_PRODUCTS,
+                 max_queries: int = settings.PRODUCT_INDEX_MAX_QUERIES,
+                 query_ttl_seconds: int = settings.PRODUCT_INDEX_QUERY_TTL_SECONDS):
+        self.max_products = max_products
+        self.products: OrderedDict = OrderedDict()  # product_id -> product, least recently seen first
+        self._tokens: dict = {}  # product_id -> its title tokens
+        self.postings: dict = {}  # token -> {product_id}
+        self.brands: dict = {}  # first title token -> number of products
+        self._by_price: list = []  # sorted (price_minor, product_id)
+        self._by_rating: list = []  # sorted (rating, product_id)
+        self._brand: dict = {}  # product_id -> brand
+        self._seen: dict = {}  # product_id -> sequence number of its last add
+        self._sequence = 0
+        self.queries = LRUTTLCache(max_entries=max_queries, ttl_seconds=query_ttl_seconds)
+        self.lookups = 0
+
+    def __len__(self):
+        return len(self.products)
+
+    def add(self, product: dict):
+        product_id = product.get("product_id")
+        if not product_id or not product.get("title"):
+            return
+        current = self.products.get(product_id)
+        if current is not None:
+            if all(current.get(field) == product.get(field) for field in ("title", "price_minor", "rating")):
+                self._touch(product_id)
+                return
+            self.remove(product_id)
+
+        entry = {field: product.get(field) for field in CATALOG_FIELDS}
+        entry["rating"] = _rating(entry["rating"])
+        self.products[product_id] = entry
+        self._touch(product_id)
+        tokens = frozenset(tokenize(entry["title"]))
+        self._tokens[product_id] = tokens
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(product_id)
+        brand = self._brand[product_id] = self.brand_of(entry)
+        if brand:
+            self.brands[brand] = self.brands.get(brand, 0) + 1
+        if entry["price_minor"] is not None:
+            bisect.insort(self._by_price, (entry["price_minor"], product_id))
+        if entry["rating"] is not None:
+            bisect.insort(self._by_rating, (entry["rating"], product_id))
+
+        while len(self.products) > self.max_products:
+            self.remove(next(iter(self.products)))
+
+    def _touch(self, product_id: str):
+        self.products.move_to_end(product_id)
+        self._sequence += 1
+        self._seen[product_id] = self._sequence
+
+    def add_many(self, products: list):
+        for product in products:
+            self.add(product)
+
+    def remove(self, product_id: str):
+        entry = self.products.pop(product_id, None)
+        if entry is None:
+            return
+        self._seen.pop(product_id, None)
+        for token in self._tokens.pop(product_id, ()):
+            ids = self.postings.get(token)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del self.postings[token]
+        brand = self._brand.pop(product_id, None)
+        if brand in self.brands:
+            self.brands[brand] -= 1
+            if not self.brands[brand]:
+                del self.brands[brand]
+        for values, value in ((self._by_price, entry["price_minor"]), (self._by_rating, entry["rating"])):
+            if value is not None:
+                index = bisect.bisect_left(values, (value, product_id))
+                if index < len(values) and values[index] == (value, product_id):
+                    del values[index]
+
+    def update_price(self, product_id: str, price: str, price_minor: int | None):
+        """Keep a known product's price current (the tracker calls this on price changes)."""
+        entry = self.products.get(product_id)
+        if entry is not None:
+            self.add({**entry, "price": price, "price_minor": price_minor})
+
+    @staticmethod
+    def brand_of(product: dict):
+        # Shopping titles nearly always lead with the brand ("Samsung Galaxy M14 5G ...")
+        tokens = tokenize(product.get("title"))
+        return tokens[0] if tokens else None
+
+    def remember(self, query: str, products: list):
+        """Index `products` and record them as what `query` returned."""
+        self.add_many(products)
+        ids = [product["product_id"] for product in products if product.get("product_id") in self.products]
+        self.queries.set(normalize_text(query), ids)
+
+    def results_for(self, query: str):
+        """Product ids `query` last returned, or None if it isn't remembered."""
+        return self.queries.get(normalize_text(query))
+
+    def tokens_of(self, product_ids) -> set:
+        tokens = set()
+        for product_id in product_ids:
+            tokens |= self._tokens.get(product_id, frozenset())
+        return tokens
+
+    @staticmethod
+    def _range(values: list, low=None, high=None):
+        start = 0 if low is None else bisect.bisect_left(values, low, key=lambda item: item[0])
+        end = len(values) if high is None else bisect.bisect_right(values, high, key=lambda item: item[0])
+        return {product_id for _, product_id in values[start:end]}
+
+    def search(self, keywords=(), brand: str | None = None, min_price: float | None = None,
+               max_price: float | None = None, min_rating: float | None = None, within=None,
+               sort: str | None = None, limit: int | None = None):
+        """
+        Products matching every keyword (title tokens), the brand, the price range
+        (major units, like `filter_by_price`) and the minimum rating, optionally only
+        among the product ids in `within`. Results keep `within`'s order (most
+        recently seen first otherwise) unless sorted by "price_asc", "price_desc" or
+        "rating_desc". Products without a price or rating never match a filter on it.
+        Returns copies.
+        """
+        self.lookups += 1
+        candidates = None
+        if within is not None:
+            candidates = {product_id for product_id in within if product_id in self.products}
+        for token in [token for keyword in keywords for token in tokenize(keyword)]:
+            ids = self.postings.get(token, set())
+            candidates = set(ids) if candidates is None else candidates & ids
+        if brand:
+            if candidates is None:
+                candidates = set(self.postings.get(brand, ()))
+            candidates = {product_id for product_id in candidates if self._brand[product_id] == brand}
+
+        low = to_minor_units(min_price) if min_price is not None else None
+        high = to_minor_units(max_price) if max_price is not None else None
+        for values, field, low, high in ((self._by_price, "price_minor", low, high),
+                                         (self._by_rating, "rating", min_rating, None)):
+            if low is None and high is None:
+                continue
+            if candidates is None:
+                candidates = self._range(values, low, high)
+                continue
+            # Already narrowed down: checking each candidate beats slicing the sorted array
+            candidates = {
+                product_id for product_id in candidates
+                if (value := self.products[product_id][field]) is not None
+                and (low is None or value >= low) and (high is None or value <= high)
+            }
+
+        if candidates is None:
+            ordered = list(reversed(self.products))
+        elif within is not None:
+            ordered = list(dict.fromkeys(product_id for product_id in within if product_id in candidates))
+        else:
+            ordered = sorted(candidates, key=self._seen.__getitem__, reverse=True)
+        results = [dict(self.products[product_id]) for product_id in ordered]
+
+        if sort in PRICE_SORTS:
+            priced = [p for p in results if p["price_minor"] is not None]
+            unpriced = [p for p in results if p["price_minor"] is None]
+            priced.sort(key=lambda p: p["price_minor"], reverse=sort == "price_desc")
+            results = priced + unpriced
+        elif sort == "rating_desc":
+            results.sort(key=lambda p: (p["rating"] is None, -(p["rating"] or 0), -(p.get("reviews") or 0)))
+        return results[:limit] if limit else results
+
+    async def load_catalog(self, db, limit: int | None = None):
+        """Index the most recently tracked catalog products (at startup)."""
+        limit = limit or self.max_products
+        cursor = catalog_store.catalog(db).find({}, {field: 1 for field in CATALOG_FIELDS}) \
+            .sort("_id", -1) \
+            .limit(limit)
+        products = [product async for product in cursor]
+        # Oldest first, so the newest end up as the most recently seen
+        self.add_many(reversed(products))
+        logger.info(f"Product index loaded {len(products)} tracked products")
+        return len(products)
+
+    def stats(self):
+        return {
+            "products": len(self.products),
+            "tokens": len(self.postings),
+            "brands": len(self.brands),
+            "queries": len(self.queries),
+            "lookups": self.lookups,
+        }
+
+product_index = ProductIndex()
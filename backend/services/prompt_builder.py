@@ -0,0 +1,156 @@
+import math
+from dataclasses import dataclass, field
+from config import get_settings
+
+settings = get_settings()
+
+# Only what the model needs to compare offers; links and thumbnails are left out
+PRODUCT_FIELDS = ("title", "price", "source", "rating", "reviews")
+MAX_TITLE_CHARS = 90
+MAX_TURN_CHARS = 1500
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for budgeting."""
+    return math.ceil(len(text) / 4) if text else 0
+
+def _truncate(text: str, limit=None) -> str:
+    if limit and len(text) > limit:
+        return text[:limit - 1] + "…"
+    return text
+
+def _cell(value, limit=None):
+    """A table cell: whitespace collapsed and pipes replaced so the row stays one line."""
+    if value is None:
+        return "-"
+    return _truncate(" ".join(str(value).split()).replace("|", "/"), limit)
+
+def encode_products(products: list, max_products: int) -> str:
+    """
+    Compact pipe-separated table of the first `max_products` products,
+    e.g. "1|Apple iPhone 15 (128 GB)|₹65,999|Amazon.in|4.6|1200".
+    """
+    rows = ["#|" + "|".join(PRODUCT_FIELDS)]
+    for index, product in enumerate(products[:max_products], start=1):
+        cells = [_cell(product.get(name), MAX_TITLE_CHARS if name == "title" else None) for name in PRODUCT_FIELDS]
+        rows.append(f"{index}|" + "|".join(cells))
+    return "\n".join(rows)
+
+@dataclass
+class BuiltPrompt:
+    prompt: str
+    history: list = field(default_factory=list)
+    products_included: int = 0
+    products_dropped: int = 0
+    history_turns_dropped: int = 0
+    prompt_tokens: int = 0
+    history_tokens: int = 0
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.history_tokens
+
+    def stats(self):
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "history_tokens": self.history_tokens,
+            "total_tokens": self.total_tokens,
+            "products_included": self.products_included,
+            "products_dropped": self.products_dropped,
+            "history_turns_dropped": self.history_turns_dropped,
+        }
+
+class PromptBuilder:
+    """
+    Builds token-budgeted prompts: a capped, compact product table plus as much
+    recent history as fits in the provider's budget. Older turns that don't fit
+    are folded into a one-line summary of what the user asked about.
+    """
+
+    def __init__(self, max_products: int = settings.AI_MAX_CONTEXT_PRODUCTS):
+        self.max_products = max_products
+
+    def budget_for(self, provider: str) -> int:
+        return {
+            "gemini": settings.AI_PROMPT_TOKEN_BUDGET_GEMINI,
+            "groq": settings.AI_PROMPT_TOKEN_BUDGET_GROQ,
+        }.get(provider, settings.AI_PROMPT_TOKEN_BUDGET_GROQ)
+
+    def build(self, user_query: str, search_results: list = None, history: list = None,
+              provider: str = "groq", persona: str = "", summary: str = "") -> BuiltPrompt:
+        """`summary`: what older turns, no longer in `history`, were about (e.g. a chat session's)."""
+        search_results = search_results or []
+        prompt = self._render(user_query, search_results, summary)
+        built = BuiltPrompt(
+            prompt=prompt,
+            products_included=min(len(search_results), self.max_products),
+            products_dropped=max(0, len(search_results) - self.max_products),
+            prompt_tokens=estimate_tokens(persona) + estimate_tokens(prompt),
+        )
+
+        remaining = self.budget_for(provider) - built.prompt_tokens
+        built.history, built.history_turns_dropped = self.fit_history(history or [], remaining)
+        built.history_tokens = sum(estimate_tokens(turn["content"]) for turn in built.history)
+        return built
+
+    def fit_history(self, history: list, budget_tokens: int):
+        """
+        Keep the most recent turns that fit in `budget_tokens`. Returns (turns, dropped_count).
+        Long turns are cut to MAX_TURN_CHARS but otherwise kept verbatim (markdown, newlines).
+        """
+        kept = []
+        used = 0
+        for turn in reversed(history):
+            content = _truncate(turn.get("content") or "", MAX_TURN_CHARS)
+            cost = estimate_tokens(content)
+            if used + cost > budget_tokens:
+                break
+            kept.append({"role": turn.get("role", "user"), "content": content})
+            used += cost
+        kept.reverse()
+
+        dropped = history[:len(history) - len(kept)]
+        if dropped:
+            summary = self.summarize(dropped)
+            if summary and estimate_tokens(summary) + used <= budget_tokens:
+                # Fold into a leading user turn so roles keep alternating
+                if kept and kept[0]["role"] == "user":
+                    kept[0]["content"] = summary + "\n" + kept[0]["content"]
+                else:
+                    kept.insert(0, {"role": "user", "content": summary})
+        return kept, len(dropped)
+
+    @staticmethod
+    def summary_topics(turns: list) -> list:
+        """What the user asked about in `turns`: one short line per user turn."""
+        return [_cell(turn.get("content", ""), 60) for turn in turns if turn.get("role") == "user"]
+
+    @staticmethod
+    def render_summary(topics: list, max_topics: int = 5) -> str:
+        if not topics:
+            return ""
+        return "(Earlier in this conversation I asked about: " + "; ".join(topics[-max_topics:]) + ")"
+
+    def summarize(self, turns: list, max_topics: int = 5) -> str:
+        return self.render_summary(self.summary_topics(turns), max_topics)
+
+    def _render(self, user_query: str, search_results: list, summary: str = ""):
+        context = ""
+        if search_results:
+            context = (
+                "Here are the current real-time product results:\n"
+                f"{encode_products(search_results, self.max_products)}\n\n"
+            )
+        if summary:
+            context += f"{summary}\n\n"
+
+        return f"""{context}User says: "{user_query}"
+
+Instructions:
+1. If products are provided, compare them and recommend the best value-for-money option.
+2. Be concise, professional, and helpful.
+3. Use bullet points for comparisons.
+4. If the user is filtering or refining (e.g. by budget, brand, feature) — apply the filter to the products already shown in the conversation.
+5. If no products are relevant, ask for more details to help narrow down the search.
+"""
+
+prompt_builder = PromptBuilder()
@@ -1,40 +1,146 @@
-import os
+import logging
 import httpx
 from config import get_settings
+from services.cache import TieredCache, normalize_text
+from services.pricing import parse_price
+from services.metrics import track_upstream
+from services.upstream_scheduler import upstream_scheduler, INTERACTIVE
+from services.product_index import product_index
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 class SerpApiService:
-    BASE_URL = "https://serpapi.com/search.json"
+    BASE_URL = settings.SERPAPI_BASE_URL
+    MARKET_PARAMS = {
+        "engine": "google_shopping",
+        "google_domain": "google.co.in",
+        "gl": "in", # Target Indian market
+        "hl": "en"
+    }
 
-    async def search_products(self, query: str):
+    def __init__(self):
+        self.client: httpx.AsyncClient | None = None
+        self.cache = TieredCache(
+            "search",
+            max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.SEARCH_CACHE_TTL_SECONDS,
+            redis_url=settings.REDIS_URL,
+        ) if settings.SEARCH_CACHE_ENABLED else None
+
+    async def start(self):
+        """
+        Create the shared, pooled HTTP client.
+        Called from the app startup hook; connections are kept alive between searches.
+        """
+        if self.client is None:
+            self.client = self._build_client()
+            logger.info("SerpApi HTTP client started")
+
+    async def close(self):
+        if self.cache is not None:
+            await self.cache.close()
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+            logger.info("SerpApi HTTP client closed")
+
+    def _build_client(self):
+        http2 = settings.HTTP2_ENABLED
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP2_ENABLED is set but the 'h2' package is missing, falling back to HTTP/1.1")
+                http2 = False
+
+        return httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(
+                settings.HTTP_TIMEOUT_SECONDS,
+                connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+        )
+
+    def _get_client(self):
+        # Scripts and jobs running outside the FastAPI lifecycle get a client lazily
+        if self.client is None:
+            self.client = self._build_client()
+        return self.client
+
+    @staticmethod
+    def normalize_query(query: str):
+        """Case-, width- and whitespace-insensitive form of a query, used for cache keys."""
+        return normalize_text(query)
+
+    def _cache_key(self, query: str):
+        market = ":".join(self.MARKET_PARAMS[k] for k in ("engine", "google_domain", "gl", "hl"))
+        return f"{market}:{self.normalize_query(query)}"
+
+    async def search_products(self, query: str, priority: str = INTERACTIVE, user_key: str | None = None):
+        """
+        Search Google Shopping via SerpApi.
+        Interactive results are served from the search cache when possible;
+        concurrent identical interactive queries share a single upstream call.
+        Background lookups (price refreshes) bypass the cache: they want a fresh
+        price, and an interactive search must never wait on (or inherit the
+        refusal of) a background call queued behind it. Upstream calls go through
+        the admission scheduler as `priority` (per-user limits apply to `user_key`)
+        and raise `UpstreamBusy` when refused.
+        """
         if not settings.SERPAPI_KEY:
             raise Exception("SERPAPI_KEY is missing in environment variables.")
 
+        if self.cache is None or priority != INTERACTIVE:
+            results = await self._fetch_products(query, priority, user_key)
+        else:
+            results = await self.cache.get_or_load(
+                self._cache_key(query),
+                lambda: self._fetch_products(query, priority, user_key),
+                should_cache=bool,  # Don't pin empty/error responses for a whole TTL
+            )
+            # Callers get their own copies so nobody mutates the cached entry
+            results = [dict(item) for item in results]
+
+        if settings.PRODUCT_INDEX_ENABLED and priority == INTERACTIVE:
+            # Results shown to users are what chat follow-ups refine
+            product_index.remember(query, results)
+        return results
+
+    async def _fetch_products(self, query: str, priority: str = INTERACTIVE, user_key: str | None = None):
+        await upstream_scheduler.admit(priority, user_key)
         params = {
-            "engine": "google_shopping",
+            **self.MARKET_PARAMS,
             "q": query,
             "api_key": settings.SERPAPI_KEY,
-            "google_domain": "google.co.in",
-            "gl": "in", # Target Indian market
-            "hl": "en"
         }
 
-        async with httpx.AsyncClient() as client:
-            print(f"Searching SerpApi for: {query}")
+        client = self._get_client()
+        logger.debug(f"Searching SerpApi for: {query}")
+        with track_upstream("serpapi"):
             response = await client.get(self.BASE_URL, params=params)
             response.raise_for_status()
             data = response.json()
-            
-            results = data.get("shopping_results", [])
-            print(f"Found {len(results)} shopping results for: {query}")
-            
-            if not results:
-                print(f"SerpApi raw response keys: {data.keys()}")
-                if "error" in data:
-                    print(f"SerpApi Error: {data['error']}")
-            
-            return self._normalize_results(results)
+
+        results = data.get("shopping_results", [])
+        logger.debug(f"Found {len(results)} shopping results for: {query}")
+
+        if not results:
+            logger.info(f"No shopping results for {query!r}; SerpApi response keys: {list(data.keys())}")
+            if "error" in data:
+                logger.warning(f"SerpApi Error: {data['error']}")
+
+        return self._normalize_results(results)
+
+    def cache_stats(self):
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
 
     def _normalize_results(self, results):
         """
@@ -45,7 +151,7 @@ class SerpApiService:
         for item in results:
             # SerpApi can return price in 'price', 'extracted_price', or 'raw_price'
             price = item.get("price") or item.get("extracted_price")
-            
+
             # If price is a number (extracted_price), format it as ₹
             if isinstance(price, (int, float)):
                 price = f"₹{price:,}"
@@ -55,9 +161,18 @@ class SerpApiService:
                 # But gl: in should prevent this.
                 pass
 
+            # Numeric price in paise: SerpApi's extracted_price is already parsed, else parse the display string
+            price_minor, currency = parse_price(item.get("extracted_price"))
+            if price_minor is None:
+                price_minor, currency = parse_price(price)
+            elif price:
+                currency = parse_price(price)[1] or currency
+
             normalized.append({
                 "title": item.get("title"),
                 "price": price or "Price N/A",
+                "price_minor": price_minor,
+                "currency": currency,
                 "source": item.get("source"),
                 "link": item.get("link"),
                 "thumbnail": item.get("thumbnail"),
@@ -0,0 +1,313 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from config import get_settings
+from services.cache import LRUTTLCache
+from services.rate_limit import AsyncTokenBucket
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BACKGROUND)  # Dispatch order
+
+# The background budget is released pro rata over the day, with this much
+# of it available up front, so a refresh cycle can't spend it all at midnight
+BACKGROUND_HEADROOM_SECONDS = 3600
+
+def client_key(request):
+    """
+    Per-user key for anonymous callers: the client address of a Starlette request
+    (behind a proxy, run uvicorn with --proxy-headers so this is the real client).
+    """
+    return request.client.host if request.client else None
+
+class UpstreamBusy(Exception):
+    """An upstream call was refused; `retry_after` is a hint in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"SerpApi admission refused ({reason}), retry in {math.ceil(retry_after)}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class DailyUsage:
+    """
+    Upstream calls made today (UTC) per priority. With a Redis URL the counts
+    are shared by every process (API workers and Celery workers alike): one
+    INCRBY per call on a key per day and priority, expiring after the day.
+    Without Redis, or while it is unreachable, calls are counted in this
+    process only. `snapshot()` is the last count seen, for stats.
+    """
+
+    def __init__(self, redis_url: str | None = None, namespace: str = "serpapi_used"):
+        self.url = redis_url
+        self.namespace = namespace
+        self._client = None
+        self._day = None
+        self._local = {priority: 0 for priority in PRIORITIES}
+        self._seen = dict(self._local)
+
+    def _today(self):
+        today = datetime.utcnow().date()
+        if today != self._day:
+            self._day = today
+            self._local = {priority: 0 for priority in PRIORITIES}
+            self._seen = dict(self._local)
+        return today
+
+    def _key(self, day, priority: str):
+        return f"pricewise:{self.namespace}:{day.isoformat()}:{priority}"
+
+    def _get_client(self):
+        if self._client is None:
+            import redis.asyncio as redis
+            self._client = redis.from_url(self.url)
+        return self._client
+
+    async def add(self, priority: str, calls: int = 1):
+        """Count `calls` (negative to give them back) and return today's counts for every priority."""
+        day = self._today()
+        if self.url:
+            try:
+                # An hour past the end of the day (a Unix timestamp: utcnow() is naive)
+                expires = int((datetime.combine(day + timedelta(days=1), datetime.min.time())
+                               - datetime(1970, 1, 1)).total_seconds()) + 3600
+                pipeline = self._get_client().pipeline(transaction=True)
+                for other in PRIORITIES:
+                    key = self._key(day, other)
+                    if other == priority:
+                        pipeline.incrby(key, calls)
+                        pipeline.expireat(key, expires)
+                    else:
+                        pipeline.get(key)
+                replies = iter(await pipeline.execute())
+                used = {}
+                for other in PRIORITIES:
+                    used[other] = int(next(replies) or 0)
+                    if other == priority:
+                        next(replies)  # EXPIREAT
+                self._seen = used
+                return dict(used)
+            except Exception as e:
+                logger.warning(f"Redis upstream usage counter failed, counting in this process: {e}")
+        self._local[priority] += calls
+        self._seen = dict(self._local)
+        return dict(self._local)
+
+    async def read(self):
+        """Today's counts for every priority."""
+        day = self._today()
+        if self.url:
+            try:
+                values = await self._get_client().mget([self._key(day, priority) for priority in PRIORITIES])
+                self._seen = {priority: int(value or 0) for priority, value in zip(PRIORITIES, values)}
+                return dict(self._seen)
+            except Exception as e:
+                logger.warning(f"Redis upstream usage read failed, using this process's count: {e}")
+        return dict(self._local)
+
+    def snapshot(self):
+        self._today()
+        return dict(self._seen)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class UpstreamScheduler:
+    """
+    Admission control in front of SerpApi. Every upstream call takes a token from
+    one global bucket; when none is free, callers queue by priority and waiting
+    interactive searches are always served before background refreshes. On top
+    of that:
+    - interactive callers are limited per user (`user_key`) per minute,
+    - all calls count against a daily quota (resets at 00:00 UTC),
+    - background calls also count against their own daily budget, released
+      gradually over the day.
+    Calls over a limit raise `UpstreamBusy` instead of waiting. Cache hits never
+    reach the scheduler. Calls are counted when they are admitted, in DailyUsage,
+    so with REDIS_URL set the quota and budget hold across all processes; the
+    rate and the per-user limits are per process.
+    """
+
+    def __init__(self, rate_per_second: float = settings.SERPAPI_RATE_PER_SECOND,
+                 burst: int = settings.SERPAPI_BURST,
+                 daily_quota: int = settings.SERPAPI_DAILY_QUOTA,
+                 background_daily_budget: int = settings.SERPAPI_BACKGROUND_DAILY_BUDGET,
+                 user_per_minute: int = settings.SERPAPI_USER_PER_MINUTE,
+                 max_queue: int = settings.SERPAPI_MAX_QUEUE,
+                 redis_url: str | None = settings.REDIS_URL):
+        self.bucket = AsyncTokenBucket(rate_per_second, burst)
+        self.daily_quota = daily_quota
+        self.background_daily_budget = background_daily_budget
+        self.user_per_minute = user_per_minute
+        self.max_queue = max_queue
+        self._waiters = {priority: deque() for priority in PRIORITIES}
+        self._dispatcher: asyncio.Task | None = None
+        # user_key -> (window start, calls in window)
+        self._user_windows = LRUTTLCache(max_entries=10000, ttl_seconds=60)
+        self.usage = DailyUsage(redis_url)
+        self.rejected: dict = {}
+
+    @staticmethod
+    def _seconds_until_midnight():
+        now = datetime.utcnow()
+        tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        return (tomorrow - now).total_seconds()
+
+    def _released_background(self):
+        """The share of the background budget released so far today."""
+        now = datetime.utcnow()
+        elapsed = (now - datetime.combine(now.date(), datetime.min.time())).total_seconds()
+        return int(min(
+            self.background_daily_budget,
+            self.background_daily_budget * (elapsed + BACKGROUND_HEADROOM_SECONDS) / 86400,
+        ))
+
+    def remaining_quota(self, used: dict | None = None):
+        """Calls left today for everyone, or None when there is no daily quota."""
+        if self.daily_quota <= 0:
+            return None
+        used = used if used is not None else self.usage.snapshot()
+        return max(0, self.daily_quota - sum(used.values()))
+
+    def background_allowance(self, used: dict | None = None):
+        """
+        Background calls that may start right now, or None when unlimited. Bounded
+        by the pro-rata share of the background budget and by the daily quota.
+        `used` defaults to the last counts seen (see `DailyUsage.read`).
+        """
+        used = used if used is not None else self.usage.snapshot()
+        remaining = self.remaining_quota(used)
+        if self.background_daily_budget <= 0:
+            return remaining
+        allowance = max(0, self._released_background() - used[BACKGROUND])
+        return allowance if remaining is None else min(allowance, remaining)
+
+    def _refuse(self, reason: str, retry_after: float):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        logger.debug(f"SerpApi call refused: {reason}")
+        raise UpstreamBusy(reason, retry_after)
+
+    def _check_quota(self, priority: str, used: dict, reserved: int = 0):
+        """Refuse a call when the budgets were spent before it; `used` includes `reserved` calls of its own."""
+        if self.daily_quota > 0 and sum(used.values()) - reserved >= self.daily_quota:
+            self._refuse("daily_quota", self._seconds_until_midnight())
+        if priority == BACKGROUND and self.background_daily_budget > 0 \
+                and used[BACKGROUND] - reserved >= self._released_background():
+            # The pro-rata budget grows by one call every 86400/budget seconds
+            self._refuse("background_budget", 86400 / self.background_daily_budget)
+
+    async def _reserve(self, priority: str):
+        """Count one call against today's budgets, or give it back and refuse it."""
+        used = await self.usage.add(priority, 1)
+        try:
+            self._check_quota(priority, used, reserved=1)
+        except UpstreamBusy:
+            await self.usage.add(priority, -1)
+            raise
+
+    def _check_user(self, user_key: str):
+        now = time.monotonic()
+        started, calls = self._user_windows.get(user_key, (now, 0))
+        if calls >= self.user_per_minute:
+            self._refuse("user_limit", max(1.0, started + 60 - now))
+        self._user_windows.set(user_key, (started, calls + 1), ttl_seconds=max(1.0, started + 60 - now))
+
+    async def admit(self, priority: str = INTERACTIVE, user_key: str | None = None):
+        """
+        Wait for permission to make one upstream call, or raise `UpstreamBusy`.
+        The call is charged to today's quota once admitted.
+        """
+        if priority == INTERACTIVE and user_key and self.user_per_minute > 0:
+            self._check_user(user_key)
+        # Don't queue for a budget that was already spent when last seen
+        self._check_quota(priority, self.usage.snapshot())
+
+        if not self.queued() and (self.bucket.rate <= 0 or self.bucket.try_acquire()):
+            try:
+                await self._reserve(priority)
+            except UpstreamBusy:
+                self._return_token()
+                raise
+            return
+        if self.queued() >= self.max_queue:
+            self._refuse("queue_full", 1.0)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(waiter)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # A caller that gave up must not keep its place (or take a token later)
+            try:
+                self._waiters[priority].remove(waiter)
+            except ValueError:
+                pass
+            raise
+
+    async def _dispatch(self):
+        """Hand out tokens as they refill, interactive waiters first."""
+        while self.queued():
+            if not self.bucket.try_acquire():
+                await asyncio.sleep((1 - self.bucket.tokens) / self.bucket.rate)
+                continue
+            priority, waiter = self._next_waiter()
+            try:
+                # Budgets may have run out while the call was queued
+                await self._reserve(priority)
+            except UpstreamBusy as e:
+                if not waiter.done():
+                    waiter.set_exception(e)
+                self._return_token()
+                continue
+            if waiter.done():
+                # Cancelled while its call was being counted
+                await self.usage.add(priority, -1)
+                self._return_token()
+                continue
+            waiter.set_result(None)
+
+    def _return_token(self):
+        if self.bucket.rate > 0:
+            self.bucket.tokens = min(self.bucket.capacity, self.bucket.tokens + 1)
+
+    def _next_waiter(self):
+        for priority in PRIORITIES:
+            queue = self._waiters[priority]
+            while queue:
+                waiter = queue.popleft()
+                if not waiter.done():
+                    return priority, waiter
+
+    def queued(self, priority: str | None = None):
+        if priority is not None:
+            return sum(1 for waiter in self._waiters[priority] if not waiter.done())
+        return sum(self.queued(p) for p in PRIORITIES)
+
+    async def refresh_usage(self):
+        """Re-read today's counts (shared ones from Redis) for `stats()` and `background_allowance()`."""
+        return await self.usage.read()
+
+    async def close(self):
+        await self.usage.close()
+
+    def stats(self):
+        return {
+            "queued": {priority: self.queued(priority) for priority in PRIORITIES},
+            "used_today": self.usage.snapshot(),
+            "daily_quota": self.daily_quota or None,
+            "remaining_quota": self.remaining_quota(),
+            "background_daily_budget": self.background_daily_budget or None,
+            "background_allowance": self.background_allowance(),
+            "rejected": dict(self.rejected),
+        }
+
+upstream_scheduler = UpstreamScheduler()
@@ -0,0 +1,82 @@
+"""
+Run from the backend directory:
+    pip install -r requirements-dev.txt
+    python -m pytest tests
+
+Tests that need MongoDB use MONGODB_URI (a throwaway database per test) and are
+skipped when no server answers.
+"""
+import asyncio
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SERPAPI_KEY", "test")
+# Celery tasks go through the in-process broker to a worker thread started by the test
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+
+import pytest  # noqa: E402
+
+from config import get_settings  # noqa: E402
+
+settings = get_settings()
+
+
+def mongo_available():
+    from pymongo import MongoClient
+    client = MongoClient(settings.MONGODB_URI, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+        return True
+    except Exception:
+        return False
+    finally:
+        client.close()
+
+
+requires_mongo = pytest.mark.skipif(not mongo_available(), reason=f"no MongoDB at {settings.MONGODB_URI}")
+
+
+@pytest.fixture
+def mongo_database():
+    """Name of a fresh database on MONGODB_URI, dropped afterwards."""
+    from pymongo import MongoClient
+    name = f"pricewise_test_{uuid.uuid4().hex[:8]}"
+    yield name
+    client = MongoClient(settings.MONGODB_URI)
+    client.drop_database(name)
+    client.close()
+
+
+def _mongomock_accepts_bulk_sort():
+    """mongomock 4.3 predates the `sort` pymongo passes with every bulk update/replace; drop it."""
+    import mongomock.collection
+
+    builder = mongomock.collection.BulkOperationBuilder
+    for name in ("add_update", "add_replace"):
+        method = getattr(builder, name)
+        if getattr(method, "accepts_sort", False):
+            continue
+
+        def accepting(self, *args, sort=None, _method=method, **kwargs):
+            return _method(self, *args, **kwargs)
+
+        accepting.accepts_sort = True
+        setattr(builder, name, accepting)
+
+
+@pytest.fixture
+def mock_db(monkeypatch):
+    """An in-memory (mongomock) database, also installed as the app's database."""
+    import database
+    from mongomock_motor import AsyncMongoMockClient
+
+    _mongomock_accepts_bulk_sort()
+    db = AsyncMongoMockClient()["pricewise_test"]
+    monkeypatch.setattr(database.db, "db", db)
+    return db
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
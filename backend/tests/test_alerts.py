@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from services.alerts import AlertDispatcher, AlertSink, alert_rule_store
+from tests.conftest import run
+
+
+class SlowSink(AlertSink):
+    def __init__(self, fail=()):
+        self.sent = []
+        self.fail = set(fail)
+
+    async def send(self, alert: dict):
+        await asyncio.sleep(0.001)
+        if alert["product_id"] in self.fail:
+            raise RuntimeError("sink down")
+        self.sent.append(alert["_id"])
+
+
+def queue_alerts(db, count, **fields):
+    alerts = [{"clerk_id": "u", "product_id": f"p{n}", "kind": "target", "price": "₹1", "price_minor": 100,
+               "status": "pending", "attempts": 0, **fields} for n in range(count)]
+    return run(alert_rule_store.outbox(db).insert_many(alerts))
+
+
+def statuses(db):
+    return run(alert_rule_store.outbox(db).distinct("status"))
+
+
+def test_triggered_rules_queue_alerts_once(mock_db):
+    rules = alert_rule_store.rules(mock_db)
+    run(rules.insert_many([
+        {"clerk_id": "u", "product_id": "p", "kind": "target", "active": True, "trigger_below_minor": 50000},
+        {"clerk_id": "v", "product_id": "p", "kind": "target", "active": True, "trigger_below_minor": 30000},
+        {"clerk_id": "w", "product_id": "p", "kind": "all_time_low", "active": True, "trigger_below_minor": 45000},
+    ]))
+    change = {"product_id": "p", "title": "Phone", "price": "₹400", "price_minor": 40000}
+
+    assert run(alert_rule_store.evaluate(mock_db, [change])) == 2
+    # Target rules fire once; the all-time-low rule re-arms under the new low
+    assert run(rules.find_one({"clerk_id": "u"}))["active"] is False
+    low = run(rules.find_one({"clerk_id": "w"}))
+    assert (low["active"], low["trigger_below_minor"]) == (True, 39999)
+    assert run(alert_rule_store.evaluate(mock_db, [change])) == 0
+
+
+def test_concurrent_deliverers_send_each_alert_once(mock_db):
+    queue_alerts(mock_db, 20)
+    sinks = [SlowSink() for _ in range(3)]
+
+    async def deliver():
+        return await asyncio.gather(*(AlertDispatcher(sink).deliver_pending(mock_db) for sink in sinks))
+
+    assert sum(run(deliver())) == 20
+    sent = [alert_id for sink in sinks for alert_id in sink.sent]
+    assert len(sent) == len(set(sent)) == 20
+    assert statuses(mock_db) == ["sent"]
+
+
+def test_failed_sends_go_back_to_pending(mock_db):
+    queue_alerts(mock_db, 2)
+    sink = SlowSink(fail={"p1"})
+    assert run(AlertDispatcher(sink).deliver_pending(mock_db)) == 1
+    failed = run(alert_rule_store.outbox(mock_db).find_one({"product_id": "p1"}))
+    assert (failed["status"], failed["attempts"]) == ("pending", 1)
+
+
+def test_abandoned_claims_are_taken_over(mock_db):
+    queue_alerts(mock_db, 1, status="sending", claimed_at=datetime.utcnow() - timedelta(hours=1))
+    queue_alerts(mock_db, 1, status="sending", claimed_at=datetime.utcnow())
+    sink = SlowSink()
+    assert run(AlertDispatcher(sink).deliver_pending(mock_db)) == 1
+    assert sorted(statuses(mock_db)) == ["sending", "sent"]
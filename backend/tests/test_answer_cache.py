@@ -0,0 +1,54 @@
+import pytest
+
+from services import answer_cache as answer_cache_module
+from services.answer_cache import AnswerCache
+from services.prompt_builder import prompt_builder
+from tests.conftest import run
+
+PRODUCTS = [{"product_id": f"p{n}", "title": f"Phone {n}", "price": "₹9,999", "link": f"https://shop/{n}"}
+            for n in range(prompt_builder.max_products + 2)]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(answer_cache_module.settings, "AI_ANSWER_CACHE_ENABLED", True)
+    monkeypatch.setattr(answer_cache_module.settings, "AI_ANSWER_CACHE_BACKEND", "memory")
+    return AnswerCache()
+
+
+def test_disabled_cache_caches_nothing(monkeypatch):
+    monkeypatch.setattr(answer_cache_module.settings, "AI_ANSWER_CACHE_ENABLED", False)
+    assert not AnswerCache().cacheable()
+    assert AnswerCache().stats() == {"enabled": False}
+
+
+def test_multi_turn_requests_are_not_cached(cache):
+    assert cache.cacheable([])
+    assert not cache.cacheable([{"role": "user", "content": "phones"}])
+    assert cache.stats()["skipped_with_history"] == 1
+
+
+def test_key_only_depends_on_what_the_model_sees(cache):
+    key = cache.key("Best phone under 10k?", PRODUCTS, "groq", "llama")
+    # Case and spacing of the question, links, and products past the prompt's cap don't matter
+    relinked = [{**product, "link": "https://elsewhere"} for product in PRODUCTS[:-1]]
+    assert cache.key("  best PHONE under 10k? ", relinked, "groq", "llama") == key
+    repriced = [{**PRODUCTS[0], "price": "₹8,999"}, *PRODUCTS[1:]]
+    assert cache.key("Best phone under 10k?", repriced, "groq", "llama") != key
+    assert cache.key("Best phone under 10k?", PRODUCTS, "gemini", "flash") != key
+
+
+def test_error_answers_are_not_cached(cache):
+    answers = iter(["Sorry, the AI is unavailable", "Pick phone 1", "unused"])
+
+    async def generate():
+        return next(answers)
+
+    def should_cache(answer):
+        return not answer.startswith("Sorry")
+
+    async def scenario():
+        key = cache.key("best phone", PRODUCTS, "groq", "llama")
+        return [await cache.get_or_generate(key, generate, should_cache=should_cache) for _ in range(3)]
+
+    assert run(scenario()) == ["Sorry, the AI is unavailable", "Pick phone 1", "Pick phone 1"]
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from services.cache import LRUTTLCache, TieredCache, normalize_text
+from tests.conftest import run
+
+
+def make_cache():
+    return TieredCache("test", max_entries=10, ttl_seconds=60)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUTTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.evictions == 1
+
+
+def test_entries_expire():
+    cache = LRUTTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1, ttl_seconds=0)
+    assert cache.get("a", "missing") == "missing"
+    assert cache.expirations == 1
+
+
+def test_normalize_text_folds_case_width_and_spaces():
+    assert normalize_text("  Ｉphone   15\tPro ") == "iphone 15 pro"
+
+
+def test_concurrent_misses_share_one_load():
+    cache = make_cache()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ["result"]
+
+    async def check():
+        return await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(5)))
+
+    assert run(check()) == [["result"]] * 5
+    assert len(calls) == 1
+    assert (cache.misses, cache.coalesced) == (1, 4)
+    assert run(cache.get_or_load("k", loader)) == ["result"]
+    assert cache.hits == 1
+
+
+def test_cancelling_the_first_caller_does_not_cancel_the_others():
+    cache = make_cache()
+
+    async def check():
+        loading = asyncio.Event()
+
+        async def loader():
+            loading.set()
+            await asyncio.sleep(0.05)
+            return "value"
+
+        leader = asyncio.create_task(cache.get_or_load("k", loader))
+        await loading.wait()
+        followers = [asyncio.create_task(cache.get_or_load("k", loader)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*followers)
+
+    assert run(check()) == ["value"] * 3
+    assert cache.local.get("k") == "value"
+    assert cache._inflight == {}
+
+
+def test_loader_errors_reach_every_caller_and_are_not_cached():
+    cache = make_cache()
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def check():
+        return await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(3)), return_exceptions=True)
+
+    results = run(check())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.local.get("k") is None
+    assert cache._inflight == {}
+
+
+def test_should_cache_can_veto_a_result():
+    cache = make_cache()
+
+    async def loader():
+        return []
+
+    assert run(cache.get_or_load("k", loader, should_cache=bool)) == []
+    assert cache.local.get("k") is None
@@ -0,0 +1,63 @@
+import asyncio
+import inspect
+from datetime import datetime, timedelta
+
+from services.catalog import catalog_store
+from services.price_history import price_history_store
+from tests.conftest import run
+
+
+def product(product_id):
+    return {"product_id": product_id, "title": f"Phone {product_id}", "price": "₹9,999", "source": "Amazon.in"}
+
+
+class Interleaved:
+    """A collection whose calls yield to the event loop first, so concurrent callers interleave."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        attribute = getattr(self.collection, name)
+        if not inspect.iscoroutinefunction(attribute):
+            return attribute
+
+        async def call(*args, **kwargs):
+            await asyncio.sleep(0)
+            return await attribute(*args, **kwargs)
+        return call
+
+
+def entry(db, product_id):
+    return run(catalog_store.catalog(db).find_one({"product_id": product_id}))
+
+
+def test_concurrent_unsubscribes_count_each_subscription_out_once(mock_db, monkeypatch):
+    for clerk_id in ("u", "v"):
+        run(catalog_store.subscribe(mock_db, product("p"), clerk_id))
+    assert entry(mock_db, "p")["subscribers"] == 2
+    subscriptions = Interleaved(catalog_store.subscriptions(mock_db))
+    monkeypatch.setattr(catalog_store, "subscriptions", lambda db: subscriptions)
+
+    async def race():
+        return await asyncio.gather(*(catalog_store.unsubscribe_many(mock_db, "u", ["p", "p"]) for _ in range(3)))
+
+    statuses = [result["status"] for results in run(race()) for result in results]
+    assert statuses.count("removed") == 2  # one caller, for both copies of the id
+    assert entry(mock_db, "p")["subscribers"] == 1
+    assert run(catalog_store.unsubscribe(mock_db, "u", "p")) is False
+
+
+def test_garbage_collection_drops_unsubscribed_products_and_their_history(mock_db):
+    run(catalog_store.subscribe(mock_db, product("kept"), "u"))
+    run(catalog_store.subscribe(mock_db, product("dropped"), "u"))
+    run(catalog_store.subscribe(mock_db, product("anonymous")))
+    assert run(catalog_store.unsubscribe(mock_db, "u", "dropped")) is True
+    # Still there until the grace period is over
+    assert entry(mock_db, "dropped")["subscribers"] == 0
+    assert run(catalog_store.collect_garbage(mock_db, datetime.utcnow() - timedelta(hours=1))) == []
+
+    removed = run(catalog_store.collect_garbage(mock_db, datetime.utcnow() + timedelta(seconds=1)))
+    assert sorted(removed) == ["anonymous", "dropped"]
+    assert entry(mock_db, "kept") is not None
+    assert run(price_history_store.collection(mock_db).distinct("product_id")) == ["kept"]
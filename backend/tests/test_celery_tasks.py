@@ -0,0 +1,74 @@
+"""
+Tracker refreshes through Celery: tasks published by the API's tick reach a
+worker over the in-memory broker, and the API refuses to start when no shared
+broker is configured.
+"""
+import threading
+
+import pytest
+from celery.contrib.testing.worker import start_worker
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from celery_app import celery_app
+from jobs import price_tracker, tasks
+from jobs.leader import MongoLease
+from tests.conftest import requires_mongo, settings
+
+
+@pytest.fixture
+def worker():
+    with start_worker(celery_app, pool="solo", queues=["tracker"], perform_ping_check=False, shutdown_timeout=10):
+        yield
+
+
+def test_enqueued_refreshes_run_on_a_worker(worker, monkeypatch):
+    refreshed = []
+    done = threading.Event()
+    product_ids = [f"p{i}" for i in range(5)]
+
+    async def refresh_products(db, ids, raise_errors=False):
+        refreshed.extend(ids)
+        if len(refreshed) == len(product_ids):
+            done.set()
+        return len(ids)
+
+    monkeypatch.setattr(price_tracker, "refresh_products", refresh_products)
+
+    assert tasks.enqueue_refreshes(product_ids) == len(product_ids)
+    assert done.wait(10), f"only {refreshed} were refreshed"
+    assert sorted(refreshed) == product_ids
+
+
+def test_tracker_refuses_the_in_memory_broker(monkeypatch):
+    monkeypatch.setattr(settings, "TRACKER_USE_CELERY", True)
+    with pytest.raises(RuntimeError, match="CELERY_BROKER_URL"):
+        price_tracker.start_tracker()
+    assert not price_tracker.scheduler.running
+
+
+@requires_mongo
+def test_alert_delivery_skips_while_another_worker_holds_the_lease(mongo_database, monkeypatch):
+    delivered = []
+
+    async def deliver_alerts(db):
+        delivered.append(db.name)
+
+    client = AsyncIOMotorClient(settings.MONGODB_URI)
+    db = client[mongo_database]
+
+    async def worker_database():
+        return db
+
+    monkeypatch.setattr(price_tracker, "deliver_alerts", deliver_alerts)
+    monkeypatch.setattr(tasks, "_worker_database", worker_database)
+    other = MongoLease(tasks.ALERT_DELIVERY_LEASE, "other-worker", 60)
+    try:
+        assert tasks.run_async(other.acquire(db))
+        assert tasks.deliver_alerts_task.apply().get() is False
+        assert delivered == []
+
+        tasks.run_async(other.release(db))
+        assert tasks.deliver_alerts_task.apply().get() is True
+        assert delivered == [mongo_database]
+    finally:
+        client.close()
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from routes import chat
+from services.chat_sessions import ChatSession, ChatSessionStore
+from services.prompt_builder import prompt_builder
+from tests.conftest import run
+
+
+def exchange(n):
+    return f"question {n}", f"answer {n}", []
+
+
+def test_evicted_questions_become_the_summary():
+    session = ChatSession(session_id="s")
+    for n in range(4):
+        session.add_exchange(*exchange(n), max_turns=4, max_topics=5, max_results=10)
+    assert [turn["content"] for turn in session.turns] == ["question 2", "answer 2", "question 3", "answer 3"]
+    assert session.topics == ["question 0", "question 1"]
+    assert session.summary == prompt_builder.summarize([{"role": "user", "content": "question 0"},
+                                                         {"role": "user", "content": "question 1"}])
+    assert session.version == 4
+
+
+def test_history_leaves_the_turns_untouched():
+    store = ChatSessionStore(max_turns=2)
+    session = ChatSession(session_id="s", turns=[{"role": "user", "content": "phones under 20k"}],
+                          topics=["laptops"])
+    assert store.history(session) == [{"role": "user", "content": "phones under 20k"}]
+
+
+def test_summary_goes_into_the_prompt_not_the_history():
+    built = prompt_builder.build("only samsung", history=[{"role": "user", "content": "phones"}],
+                                 summary="(Earlier in this conversation I asked about: laptops)")
+    assert "I asked about: laptops" in built.prompt
+    assert built.history == [{"role": "user", "content": "phones"}]
+
+
+def test_record_saves_in_the_background(mock_db):
+    async def check():
+        store = ChatSessionStore()
+        session = await store.get_or_create(None, "user_1")
+        task = store.record(session, *exchange(1))
+        # Visible to the next message before the write lands
+        assert (await store.get(session.session_id)).version == 1
+        await task
+        return session.session_id
+
+    session_id = run(check())
+    doc = run(mock_db.chat_sessions.find_one({"_id": session_id}))
+    assert (doc["version"], doc["user_id"], len(doc["turns"])) == (1, "user_1", 2)
+
+
+def test_concurrent_writers_both_keep_their_turn(mock_db):
+    async def check():
+        first, second = ChatSessionStore(), ChatSessionStore()
+        session = await first.get_or_create(None)
+        await first.record(session, *exchange(0))
+        # Two workers load the same version and answer a message each
+        one = await first.get(session.session_id)
+        other = await second.get(session.session_id)
+        await first.record(one, *exchange(1))
+        await second.record(other, *exchange(2))
+        return session.session_id, second.conflicts
+
+    session_id, conflicts = run(check())
+    doc = run(mock_db.chat_sessions.find_one({"_id": session_id}))
+    assert conflicts == 1
+    assert doc["version"] == 3
+    assert [turn["content"] for turn in doc["turns"] if turn["role"] == "user"][-2:] == ["question 1", "question 2"]
+
+
+def test_one_sessions_writes_stay_in_order(mock_db):
+    async def check():
+        store = ChatSessionStore()
+        session = await store.get_or_create(None)
+        tasks = []
+        for n in range(3):
+            session = await store.get(session.session_id) if n else session
+            tasks.append(store.record(session, *exchange(n)))
+        await asyncio.gather(*tasks)
+        return session.session_id, store.conflicts
+
+    session_id, conflicts = run(check())
+    doc = run(mock_db.chat_sessions.find_one({"_id": session_id}))
+    assert (doc["version"], conflicts) == (3, 0)
+
+
+def test_sessions_are_only_served_to_their_owner(mock_db, monkeypatch):
+    store = ChatSessionStore()
+    monkeypatch.setattr(chat, "chat_sessions", store)
+
+    async def check():
+        owned = await store.get_or_create(None, "user_1")
+        anonymous = await store.get_or_create(None)
+        await store.record(owned, *exchange(1))
+        await store.record(anonymous, *exchange(2))
+
+        assert (await chat.get_chat_session(owned.session_id, clerk_id="user_1"))["user_id"] == "user_1"
+        assert (await chat.get_chat_session(anonymous.session_id, clerk_id=None))["user_id"] is None
+        for clerk_id, status in (("user_2", 403), (None, 401)):
+            for route in (chat.get_chat_session, chat.delete_chat_session):
+                with pytest.raises(HTTPException) as refused:
+                    await route(owned.session_id, clerk_id=clerk_id)
+                assert refused.value.status_code == status
+        assert await chat.delete_chat_session(owned.session_id, clerk_id="user_1") == {"deleted": True}
+
+    run(check())
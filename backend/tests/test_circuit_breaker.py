@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from services import ai_service as ai_module
+from services.ai_service import AIService, ProviderUnavailable
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from tests.conftest import run
+
+
+def test_opens_after_consecutive_failures_and_short_circuits():
+    breaker = CircuitBreaker("groq", failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert not breaker.available()
+    assert breaker.short_circuited == 2
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker("groq", failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    assert breaker.available()
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    # A cancelled trial says nothing about health: the next caller may try
+    breaker.record_cancelled()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.allow()
+    breaker.record_success(0.2)
+    assert breaker.state == CLOSED
+
+
+def test_latency_percentiles_need_enough_samples():
+    breaker = CircuitBreaker("gemini")
+    for n in range(1, 20):
+        breaker.record_success(n / 10)
+    assert breaker.percentile(95) is None
+    breaker.record_success(2.0)
+    assert breaker.percentile(95) == 1.9
+    assert breaker.percentile(50, kind="first_token") is None
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(ai_module.settings, "AI_HEDGE_ENABLED", True)
+    ai = AIService()
+    monkeypatch.setattr(ai, "_hedge_delay", lambda provider, kind: 0.02)
+    return ai
+
+
+def attempt(name, seconds, calls, result=None, error=None):
+    async def start():
+        calls.append(name)
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            calls.append(f"{name} cancelled")
+            raise
+        if error:
+            raise error
+        return result or name
+    return name, start
+
+
+def test_failed_provider_fails_over_at_once(service, monkeypatch):
+    monkeypatch.setattr(ai_module.settings, "AI_HEDGE_ENABLED", False)
+    calls = []
+    attempts = [attempt("gemini", 0, calls, error=RuntimeError("500")), attempt("groq", 0, calls)]
+    assert run(service._first_success(attempts, kind="complete")) == "groq"
+    assert calls == ["gemini", "groq"]
+
+
+def test_slow_provider_is_hedged_and_the_loser_cancelled(service):
+    calls = []
+    attempts = [attempt("gemini", 1.0, calls), attempt("groq", 0.01, calls)]
+    assert run(service._first_success(attempts, kind="complete")) == "groq"
+    assert calls == ["gemini", "groq", "gemini cancelled"]
+
+
+def test_fast_provider_is_not_hedged(service):
+    calls = []
+    attempts = [attempt("gemini", 0, calls), attempt("groq", 0, calls)]
+    assert run(service._first_success(attempts, kind="complete")) == "gemini"
+    assert calls == ["gemini"]
+
+
+def test_last_error_is_raised_when_every_provider_fails(service):
+    calls = []
+    attempts = [attempt("gemini", 0, calls, error=RuntimeError("gemini down")),
+                attempt("groq", 0, calls, error=RuntimeError("groq down"))]
+    with pytest.raises(RuntimeError, match="groq down"):
+        run(service._first_success(attempts, kind="complete"))
+    with pytest.raises(ProviderUnavailable):
+        run(service._first_success([], kind="complete"))
+
+
+def test_skipped_providers_with_open_circuits(service, monkeypatch):
+    monkeypatch.setattr(service, "_configured", lambda: ["gemini", "groq"])
+    for _ in range(service.breakers["gemini"].failure_threshold):
+        service.breakers["gemini"].record_failure()
+    assert service._candidates() == ["groq"]
@@ -0,0 +1,91 @@
+import json
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from services import clerk_auth
+from services.clerk_auth import ClerkTokenVerifier
+from tests.conftest import run
+
+
+def rsa_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+OLD_KEY, NEW_KEY = rsa_key(), rsa_key()
+
+
+def token(key, kid, sub="user_1", ttl=300):
+    return jwt.encode({"sub": sub, "exp": int(time.time()) + ttl}, key, algorithm="RS256", headers={"kid": kid})
+
+
+def jwks(**keys):
+    return {"keys": [
+        {**json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key())), "kid": kid, "use": "sig"}
+        for kid, key in keys.items()
+    ]}
+
+
+class FakeClerk:
+    """Stands in for the JWKS endpoint: serves `keys`, or fails while `down`."""
+
+    def __init__(self, **keys):
+        self.keys = keys
+        self.down = False
+        self.fetches = 0
+
+    async def load(self):
+        self.fetches += 1
+        if self.down:
+            raise RuntimeError("Clerk unreachable")
+        return ClerkTokenVerifier._parse_jwks(jwks(**self.keys))
+
+
+@pytest.fixture
+def clerk(monkeypatch):
+    fake = FakeClerk(old=OLD_KEY)
+    verifier = ClerkTokenVerifier()
+    monkeypatch.setattr(verifier, "_load_keys", fake.load)
+    fake.verifier = verifier
+    return fake
+
+
+def test_verified_tokens_are_memoized(clerk):
+    session = token(OLD_KEY, "old")
+    assert run(clerk.verifier.verify(session))["sub"] == "user_1"
+    assert run(clerk.verifier.verify(session))["sub"] == "user_1"
+    assert (clerk.verifier.verifications, clerk.verifier.cache_hits, clerk.fetches) == (1, 1, 1)
+
+
+def test_unknown_kids_refresh_at_most_once_per_interval(clerk):
+    run(clerk.verifier.verify(token(OLD_KEY, "old")))
+    for _ in range(5):
+        with pytest.raises(jwt.InvalidTokenError, match="unknown key"):
+            run(clerk.verifier.verify(token(NEW_KEY, "bogus")))
+    assert clerk.fetches == 1
+
+
+def test_rotated_key_is_picked_up_after_the_interval(clerk, monkeypatch):
+    monkeypatch.setattr(clerk_auth.settings, "CLERK_JWKS_MIN_REFRESH_SECONDS", 0)
+    run(clerk.verifier.verify(token(OLD_KEY, "old")))
+    clerk.keys = {"old": OLD_KEY, "new": NEW_KEY}
+    assert run(clerk.verifier.verify(token(NEW_KEY, "new", sub="user_2")))["sub"] == "user_2"
+    assert clerk.fetches == 2
+
+
+def test_stale_keys_are_used_while_clerk_is_down(clerk, monkeypatch):
+    run(clerk.verifier.verify(token(OLD_KEY, "old")))
+    monkeypatch.setattr(clerk_auth.settings, "CLERK_JWKS_CACHE_SECONDS", 0)
+    monkeypatch.setattr(clerk_auth.settings, "CLERK_JWKS_MIN_REFRESH_SECONDS", 0)
+    clerk.down = True
+    assert run(clerk.verifier.verify(token(OLD_KEY, "old", sub="user_3")))["sub"] == "user_3"
+    assert clerk.fetches == 2
+
+
+def test_forged_and_expired_tokens_are_rejected(clerk):
+    with pytest.raises(jwt.InvalidSignatureError):
+        run(clerk.verifier.verify(token(NEW_KEY, "old")))
+    with pytest.raises(jwt.ExpiredSignatureError):
+        run(clerk.verifier.verify(token(OLD_KEY, "old", ttl=-60)))
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+import database
+from models.history import HistoryItem
+from services.history_writer import HistoryWriter
+from tests.conftest import run
+
+
+class RecordingHistory:
+    def __init__(self):
+        self.batches = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.batches.append([doc["query"] for doc in docs])
+
+
+@pytest.fixture
+def history(monkeypatch):
+    recording = RecordingHistory()
+    monkeypatch.setattr(database.db, "db", type("Database", (), {"history": recording})())
+    return recording
+
+
+def item(n):
+    return HistoryItem(user_id="u", type="search", query=f"q{n}")
+
+
+def test_full_batches_go_out_at_once_and_stop_flushes_the_rest(history):
+    writer = HistoryWriter(batch_size=3, flush_interval=60, max_queue=100)
+
+    async def scenario():
+        await writer.start()
+        for n in range(7):
+            await writer.enqueue(item(n))
+        await asyncio.sleep(0.01)
+        before_stop = list(history.batches)
+        await writer.stop()
+        return before_stop
+
+    assert run(scenario()) == [["q0", "q1", "q2"], ["q3", "q4", "q5"]]
+    assert history.batches[-1] == ["q6"]
+    assert (writer.written, writer.failed) == (7, 0)
+
+
+def test_a_partial_batch_goes_out_after_the_flush_interval(history):
+    writer = HistoryWriter(batch_size=100, flush_interval=0.02, max_queue=100)
+
+    async def scenario():
+        await writer.start()
+        await writer.enqueue(item(0))
+        await writer.enqueue(item(1))
+        await asyncio.sleep(0.1)
+        flushed = list(history.batches)
+        await writer.stop()
+        return flushed
+
+    assert run(scenario()) == [["q0", "q1"]]
+
+
+def test_writes_directly_when_not_running(history):
+    run(HistoryWriter().enqueue(item(0)))
+    assert history.batches == [["q0"]]
+
+
+def test_failed_writes_are_counted(monkeypatch):
+    monkeypatch.setattr(database.db, "db", None)
+    writer = HistoryWriter()
+    run(writer.enqueue(item(0)))
+    assert (writer.written, writer.failed) == (0, 1)
@@ -0,0 +1,77 @@
+import pytest
+
+from services.intent_router import REFINE, SEARCH, IntentRouter
+from services.product_index import ProductIndex, tokenize
+
+PHONES = [
+    {"product_id": "s1", "title": "Samsung Galaxy M14 5G (128 GB)", "price_minor": 1299900, "rating": "4.2"},
+    {"product_id": "s2", "title": "Samsung Galaxy S23 FE", "price_minor": 3999900, "rating": 4.5},
+    {"product_id": "r1", "title": "Redmi Note 13 5G", "price_minor": 1699900, "rating": 4.4},
+    {"product_id": "p1", "title": "Poco X6 Pro 5G", "price_minor": None, "rating": None},
+]
+
+
+@pytest.fixture
+def index():
+    index = ProductIndex(max_products=100)
+    index.remember("best phones", PHONES)
+    return index
+
+
+def test_tokenize_strips_plurals_only():
+    assert tokenize("Phones, Glass & 4Gs") == ["phone", "glass", "4gs"]
+
+
+def test_search_combines_keywords_brand_price_and_rating(index):
+    assert [p["product_id"] for p in index.search(keywords=["5g"], max_price=15000)] == ["s1"]
+    assert [p["product_id"] for p in index.search(brand="samsung", sort="price_desc")] == ["s2", "s1"]
+    assert [p["product_id"] for p in index.search(min_rating=4.4, sort="rating_desc")] == ["s2", "r1"]
+    # Keeps `within`'s order; unpriced products never match a price filter
+    assert [p["product_id"] for p in index.search(within=["p1", "r1", "s1"], min_price=1)] == ["r1", "s1"]
+
+
+def test_index_keeps_the_most_recently_seen_products():
+    index = ProductIndex(max_products=2)
+    index.add_many(PHONES[:3])
+    index.add(PHONES[0])  # seen again
+    index.add(PHONES[3])
+    assert list(index.products) == ["s1", "p1"]
+    assert "galaxy" in index.postings and "s23" not in index.postings
+    assert index.brands == {"samsung": 1, "poco": 1}
+
+
+def test_price_update_moves_the_product_in_range_lookups(index):
+    index.update_price("r1", "₹9,999", 999900)
+    assert [p["product_id"] for p in index.search(max_price=10000)] == ["r1"]
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("only samsung under 15k", {"brand": "samsung", "max_price": 15000}),
+    ("which of these has 4.4+ stars", {"min_rating": 4.4}),
+    ("between 10k and 20k", {"min_price": 10000, "max_price": 20000}),
+    ("10-20k, cheapest", {"min_price": 10000, "max_price": 20000, "sort": "price_asc"}),
+    ("5g ones above ₹15,000", {"keywords": ["5g"], "min_price": 15000}),
+])
+def test_follow_ups_refine_the_shown_products(index, message, expected):
+    history = [{"role": "user", "content": "best phones"}, {"role": "assistant", "content": "..."}]
+    intent = IntentRouter(index).route(message, history=history)
+    assert intent.action == REFINE
+    assert intent.scope == [p["product_id"] for p in PHONES]
+    assert {key: value for key, value in intent.filters.items() if value not in (None, [])} == expected
+
+
+@pytest.mark.parametrize("message", ["gaming laptop under 50000", "oneplus under 20k", "headphones"])
+def test_new_topics_are_searched(index, message):
+    history = [{"role": "user", "content": "best phones"}]
+    assert IntentRouter(index).route(message, history=history).action == SEARCH
+
+
+def test_nothing_to_refer_to_means_a_search():
+    assert IntentRouter(ProductIndex()).route("cheapest under 15k").action == SEARCH
+
+
+def test_context_products_from_the_client_are_the_scope(index):
+    router = IntentRouter(ProductIndex())
+    intent = router.route("only redmi", context_products=PHONES[2:])
+    assert (intent.action, intent.brand, intent.scope) == (REFINE, "redmi", ["r1", "p1"])
+    assert [p["product_id"] for p in router.refine(intent)] == ["r1"]
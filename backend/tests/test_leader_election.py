@@ -0,0 +1,153 @@
+"""
+Tracker leader election across real processes, against MongoDB (MONGODB_URI).
+
+Several processes each run a TrackerCoordinator heartbeat loop with a short
+lease and report the partitions they believe they own. The test waits until
+every partition is owned, SIGKILLs the leader and checks that the survivors
+cover its partitions within lease + 2 heartbeats, and that no partition is
+ever claimed by two processes at once.
+"""
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from jobs import price_tracker
+from jobs.leader import TrackerCoordinator
+from tests.conftest import requires_mongo, run, settings
+
+REPORTS = "leader_check_reports"
+LEASE_SECONDS = 3
+HEARTBEAT_SECONDS = 1
+
+
+def run_member(instance_id, database, partitions, lease_seconds, heartbeat_seconds):
+    """Child process: heartbeat forever, reporting which partitions it believes it owns."""
+    async def loop():
+        client = AsyncIOMotorClient(settings.MONGODB_URI)
+        db = client[database]
+        coordinator = TrackerCoordinator(instance_id, partitions=partitions, ttl_seconds=lease_seconds)
+        while True:
+            owned = await coordinator.heartbeat(db)
+            await db[REPORTS].update_one(
+                {"_id": instance_id},
+                {"$set": {"owned": sorted(owned), "at": time.time()}},
+                upsert=True,
+            )
+            await asyncio.sleep(heartbeat_seconds)
+
+    asyncio.run(loop())
+
+
+async def current_claims(db, stale_after):
+    """{partition: [instance ids]} from every member that reported recently."""
+    claims = {}
+    async for report in db[REPORTS].find({"at": {"$gte": time.time() - stale_after}}):
+        for partition in report["owned"]:
+            claims.setdefault(partition, []).append(report["_id"])
+    return claims
+
+
+async def watch(db, partitions, seconds, stale_after, poll=0.2):
+    """Poll claims for `seconds`; return (double-owned observations, time until full coverage or None)."""
+    conflicts, covered_after = [], None
+    started = time.monotonic()
+    while time.monotonic() - started < seconds:
+        claims = await current_claims(db, stale_after)
+        conflicts += [(partition, owners) for partition, owners in claims.items() if len(owners) > 1]
+        if covered_after is None and len(claims) == partitions:
+            covered_after = time.monotonic() - started
+        await asyncio.sleep(poll)
+    return conflicts, covered_after
+
+
+@requires_mongo
+@pytest.mark.parametrize("partitions", [1, 6])
+def test_failover_without_double_ownership(mongo_database, partitions):
+    context = multiprocessing.get_context("spawn")
+    members = {}
+    for i in range(3):
+        instance_id = f"member-{i}"
+        members[instance_id] = context.Process(
+            target=run_member,
+            args=(instance_id, mongo_database, partitions, LEASE_SECONDS, HEARTBEAT_SECONDS),
+            daemon=True,
+        )
+        members[instance_id].start()
+
+    failover_limit = LEASE_SECONDS + 2 * HEARTBEAT_SECONDS
+    # A killed member's last report stays "current" until this much time passes
+    stale_after = HEARTBEAT_SECONDS * 1.5
+
+    async def scenario():
+        client = AsyncIOMotorClient(settings.MONGODB_URI)
+        db = client[mongo_database]
+        try:
+            conflicts, covered_after = await watch(db, partitions, failover_limit * 2, stale_after)
+            assert covered_after is not None, "partitions were never all owned"
+
+            claims = await current_claims(db, stale_after)
+            leader = claims[0][0]
+            os.kill(members[leader].pid, signal.SIGKILL)
+
+            # Wait for the dead member's reports to go stale before judging coverage
+            await asyncio.sleep(stale_after)
+            more_conflicts, covered_after = await watch(db, partitions, failover_limit * 2, stale_after)
+            assert covered_after is not None, "partitions were never covered again after the leader died"
+            assert stale_after + covered_after <= failover_limit
+            assert not conflicts + more_conflicts, f"double ownership: {(conflicts + more_conflicts)[:3]}"
+        finally:
+            client.close()
+
+    try:
+        run(scenario())
+    finally:
+        for process in members.values():
+            if process.is_alive():
+                process.kill()
+
+
+@requires_mongo
+def test_leases_lapse_locally_when_renewal_stops(mongo_database):
+    async def scenario():
+        client = AsyncIOMotorClient(settings.MONGODB_URI)
+        coordinator = TrackerCoordinator("member-0", partitions=1, ttl_seconds=0.5)
+        try:
+            assert await coordinator.heartbeat(client[mongo_database]) == {0}
+            assert coordinator.is_leader and coordinator.partition_filter() == {}
+            await asyncio.sleep(0.6)
+            assert not coordinator.is_leader
+            assert coordinator.partition_filter() is None
+        finally:
+            client.close()
+
+    run(scenario())
+
+
+@requires_mongo
+def test_failed_heartbeat_gives_up_leadership(mongo_database, monkeypatch):
+    async def scenario():
+        client = AsyncIOMotorClient(settings.MONGODB_URI)
+        coordinator = TrackerCoordinator("member-0", partitions=1, ttl_seconds=30)
+        monkeypatch.setattr(price_tracker, "tracker_coordinator", coordinator)
+        try:
+            assert await coordinator.heartbeat(client[mongo_database]) == {0}
+
+            unreachable = AsyncIOMotorClient("mongodb://127.0.0.1:9", serverSelectionTimeoutMS=100)
+
+            async def get_database():
+                return unreachable[mongo_database]
+
+            monkeypatch.setattr(price_tracker, "get_database", get_database)
+            await price_tracker.tracker_heartbeat()
+            assert not coordinator.is_leader
+            assert coordinator.partition_filter() is None
+            unreachable.close()
+        finally:
+            client.close()
+
+    run(scenario())
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from services.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter, paginate
+from tests.conftest import run
+
+
+def test_cursor_round_trip_keeps_types():
+    last_id = ObjectId()
+    when = datetime(2024, 5, 1, 12, 30)
+    token = encode_cursor(when, str(last_id))
+    assert "=" not in token
+    assert decode_cursor(token) == (when, last_id)
+    assert decode_cursor(encode_cursor(None, "not-an-object-id")) == (None, "not-an-object-id")
+
+
+@pytest.mark.parametrize("token", ["", "garbage", encode_cursor(1, "x")[:-3] + "!!!"])
+def test_malformed_cursor(token):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token)
+
+
+def test_keyset_after_a_null_value():
+    # Ascending: nulls come first, so every real value is still ahead
+    assert keyset_filter("price_minor", 1, None, 5) == {
+        "$or": [{"price_minor": None, "_id": {"$gt": 5}}, {"price_minor": {"$ne": None}}]
+    }
+    # Descending: nulls come last, only later nulls are left
+    assert keyset_filter("price_minor", -1, None, 5) == {"price_minor": None, "_id": {"$lt": 5}}
+    assert keyset_filter(None, -1, None, 5) == {"_id": {"$lt": 5}}
+
+
+def walk(collection, direction, limit=2):
+    seen, cursor = [], None
+    while True:
+        items, cursor = run(paginate(collection, {}, "price_minor", direction, limit=limit, cursor=cursor))
+        seen += [item["name"] for item in items]
+        if cursor is None:
+            return seen
+
+
+@pytest.mark.parametrize("direction", [1, -1])
+def test_pages_visit_every_item_once_in_order(mock_db, direction):
+    collection = mock_db["items"]
+    prices = [300, None, 100, 300, None, 200, None]
+    run(collection.insert_many([
+        {"_id": ObjectId(f"{n:024x}"), "name": n, **({"price_minor": price} if price is not None else {})}
+        for n, price in enumerate(prices)
+    ]))
+    expected = sorted(range(len(prices)), key=lambda n: (prices[n] is not None, prices[n] or 0, n))
+    assert walk(collection, direction) == (expected if direction == 1 else expected[::-1])
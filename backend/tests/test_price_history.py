@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from services.price_history import PriceHistoryStore
+from tests.conftest import run
+
+START = datetime(2024, 1, 1)
+
+
+def record(store, db, product_id, count, start=START):
+    for n in range(count):
+        run(store.record(db, product_id, f"₹{n}", start + timedelta(hours=n), n * 100))
+
+
+def buckets(store, db, product_id):
+    return run(store.collection(db).find({"product_id": product_id}, {"_id": 0}).sort("first_ts", 1).to_list(None))
+
+
+def test_points_fill_one_bucket_at_a_time(mock_db):
+    store = PriceHistoryStore(bucket_size=3)
+    record(store, mock_db, "p", 7)
+    record(store, mock_db, "other", 1)
+    filled = buckets(store, mock_db, "p")
+    assert [bucket["count"] for bucket in filled] == [3, 3, 1]
+    assert [len(bucket["points"]) for bucket in filled] == [3, 3, 1]
+    assert filled[1]["first_ts"] == START + timedelta(hours=3)
+    assert filled[1]["last_ts"] == START + timedelta(hours=5)
+    assert filled[2]["points"] == [{"price": "₹6", "price_minor": 600, "timestamp": START + timedelta(hours=6)}]
+
+
+def test_new_points_never_go_into_closed_buckets(mock_db):
+    store = PriceHistoryStore(bucket_size=3)
+    run(store.collection(mock_db).insert_one({
+        "product_id": "p", "open": False, "count": 1, "first_ts": START, "last_ts": START,
+        "points": [store.point("₹1", START, 100)],
+    }))
+    record(store, mock_db, "p", 1, start=START + timedelta(days=1))
+    assert [bucket["count"] for bucket in buckets(store, mock_db, "p")] == [1, 1]
+
+
+def test_history_is_the_most_recent_points_oldest_first(mock_db):
+    store = PriceHistoryStore(bucket_size=3)
+    record(store, mock_db, "p", 10)
+    assert [point["price_minor"] for point in run(store.get_history(mock_db, "p", limit=4))] == [600, 700, 800, 900]
+    in_range = run(store.get_history(mock_db, "p", start=START + timedelta(hours=2), end=START + timedelta(hours=4)))
+    assert [point["price_minor"] for point in in_range] == [200, 300, 400]
+    assert run(store.get_history(mock_db, "missing")) == []
+    assert run(store.has_history(mock_db, "p")) and not run(store.has_history(mock_db, "missing"))
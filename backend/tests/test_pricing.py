@@ -0,0 +1,47 @@
+import pytest
+
+from services.pricing import filter_by_price, parse_price, price_range_filter, to_minor_units
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("₹1,23,999", (12399900, "INR")),
+    ("Rs. 499.50", (49950, "INR")),
+    ("INR 499", (49900, "INR")),
+    ("$12.99", (1299, "USD")),
+    ("US$ 5", (500, "USD")),
+    ("€1.299,00", (129900, "EUR")),
+    ("£7,50", (750, "GBP")),
+    ("1.299.000", (129900000, "INR")),
+    ("₹999 - ₹1,299", (99900, "INR")),
+    (1299.0, (129900, "INR")),
+    (0.1 + 0.2, (30, "INR")),
+    ("Price: 1,499 (offers)", (149900, "INR")),
+])
+def test_parse_price(value, expected):
+    assert parse_price(value) == expected
+
+
+@pytest.mark.parametrize("value", [None, True, "", "Free", "see site", -5, float("nan"), float("inf")])
+def test_unreadable_prices(value):
+    assert parse_price(value) == (None, None)
+
+
+def test_currency_codes_are_whole_words_only():
+    # "rs" inside "offers" and "inr" inside "Prince" are not currencies
+    assert parse_price("Prince offers 499", default_currency="USD") == (49900, "USD")
+
+
+def test_minor_units_round_half_up():
+    assert to_minor_units("0.005") == 1
+    assert to_minor_units("0.004") == 0
+    assert to_minor_units("abc") is None
+
+
+def test_range_filter_and_in_memory_filter_agree():
+    products = [{"id": n, "price_minor": minor} for n, minor in enumerate([50000, 150000, None, 99900])]
+    assert price_range_filter(500, 1000) == {"price_minor": {"$gte": 50000, "$lte": 100000}}
+    assert price_range_filter() == {}
+    in_range = filter_by_price(products, 500, 1000, sort="price_desc")
+    assert [p["id"] for p in in_range] == [3, 0]
+    # Unpriced products sort last, whichever the direction
+    assert [p["id"] for p in filter_by_price(products, sort="price_asc")] == [0, 3, 1, 2]
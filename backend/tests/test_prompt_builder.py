@@ -0,0 +1,39 @@
+from services.prompt_builder import MAX_TURN_CHARS, PromptBuilder, encode_products, estimate_tokens
+
+
+def test_history_turns_keep_their_markdown():
+    answer = "**Best pick:** Pixel 8\n\n| Phone | Price |\n|---|---|\n| Pixel 8 | ₹52,999 |\n- 5 years of updates"
+    kept, dropped = PromptBuilder().fit_history([{"role": "assistant", "content": answer}], 10_000)
+    assert kept == [{"role": "assistant", "content": answer}]
+    assert dropped == 0
+
+
+def test_long_turns_are_cut_not_rewritten():
+    content = "line one\n" + "x" * (2 * MAX_TURN_CHARS)
+    [turn], _ = PromptBuilder().fit_history([{"role": "user", "content": content}], 10_000)
+    assert len(turn["content"]) == MAX_TURN_CHARS
+    assert turn["content"].startswith("line one\nxxx")
+    assert turn["content"].endswith("…")
+
+
+def test_oldest_turns_are_dropped_and_summarized():
+    history = [
+        {"role": "user", "content": "laptops for coding"},
+        {"role": "assistant", "content": "a" * 400},
+        {"role": "user", "content": "phones"},
+        {"role": "assistant", "content": "b" * 40},
+    ]
+    kept, dropped = PromptBuilder().fit_history(history, estimate_tokens("phones" + "b" * 40) + 30)
+    assert dropped == 2
+    assert kept[0] == {"role": "user", "content": "(Earlier in this conversation I asked about: laptops for coding)\nphones"}
+    assert kept[1] == history[3]
+
+
+def test_product_table_is_capped_and_one_row_per_product():
+    products = [{"title": f"Phone | {n}\nnew", "price": "₹9,999", "source": "Amazon.in"} for n in range(5)]
+    table = encode_products(products, max_products=2).splitlines()
+    assert table == [
+        "#|title|price|source|rating|reviews",
+        "1|Phone / 0 new|₹9,999|Amazon.in|-|-",
+        "2|Phone / 1 new|₹9,999|Amazon.in|-|-",
+    ]
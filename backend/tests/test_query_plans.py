@@ -0,0 +1,174 @@
+"""
+Every route and job query is served by an index, against MongoDB (MONGODB_URI).
+
+The real route handlers and jobs run against a database wrapper that records
+each find()/aggregate() they issue; each recorded query is then explained and
+must not fall back to a collection scan. Queries are recorded, not listed, so
+a route that changes its query shape is checked as it is.
+"""
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import database
+from database import ensure_indexes
+from jobs.price_tracker import select_due_products
+from routes import tracker, user
+from services.alerts import alert_dispatcher, alert_rule_store
+from services.catalog import catalog_store
+from services.pagination import encode_cursor
+from tests.conftest import requires_mongo, run, settings
+
+CLERK_ID = "user_plans"
+PRODUCT = {"product_id": "p1", "title": "Phone", "price": "₹10,000", "source": "Shop", "link": "https://example.com"}
+
+
+class RecordingCursor:
+    def __init__(self, cursor, query):
+        self.cursor = cursor
+        self.query = query
+
+    def sort(self, *args, **kwargs):
+        self.query["sort"] = (args, kwargs)
+        self.cursor = self.cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, limit):
+        self.cursor = self.cursor.limit(limit)
+        return self
+
+    def to_list(self, *args, **kwargs):
+        return self.cursor.to_list(*args, **kwargs)
+
+    def __aiter__(self):
+        return self.cursor.__aiter__()
+
+
+class RecordingCollection:
+    """A Motor collection that records the reads issued through it."""
+
+    def __init__(self, collection, queries):
+        self.collection = collection
+        self.queries = queries
+
+    def find(self, query=None, *args, **kwargs):
+        entry = {"collection": self.collection.name, "filter": query or {}}
+        self.queries.append(entry)
+        return RecordingCursor(self.collection.find(query, *args, **kwargs), entry)
+
+    def find_one(self, query=None, *args, **kwargs):
+        self.queries.append({"collection": self.collection.name, "filter": query or {}})
+        return self.collection.find_one(query, *args, **kwargs)
+
+    def find_one_and_update(self, query, update, *args, sort=None, **kwargs):
+        entry = {"collection": self.collection.name, "filter": query}
+        if sort:
+            entry["sort"] = ((sort,), {})
+        self.queries.append(entry)
+        return self.collection.find_one_and_update(query, update, *args, sort=sort, **kwargs)
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        self.queries.append({"collection": self.collection.name, "pipeline": list(pipeline)})
+        return self.collection.aggregate(pipeline, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+class RecordingDatabase:
+    def __init__(self, db):
+        self.db = db
+        self.queries = []
+
+    def __getitem__(self, name):
+        return RecordingCollection(self.db[name], self.queries)
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+def plan_stages(plan):
+    """Yield every stage name in an explain() plan tree (classic and SBE formats)."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from plan_stages(value)
+
+
+def winning_plans(explanation):
+    """The winning plans in an explain() result (one per $cursor stage of a pipeline)."""
+    if isinstance(explanation, dict):
+        for key, value in explanation.items():
+            if key == "winningPlan":
+                yield value
+            else:
+                yield from winning_plans(value)
+    elif isinstance(explanation, list):
+        for value in explanation:
+            yield from winning_plans(value)
+
+
+async def explain(db, query):
+    if "pipeline" in query:
+        return await db.command("aggregate", query["collection"], pipeline=query["pipeline"], explain=True)
+    cursor = db[query["collection"]].find(query["filter"])
+    if "sort" in query:
+        args, kwargs = query["sort"]
+        cursor = cursor.sort(*args, **kwargs)
+    return await cursor.explain()
+
+
+async def issue_queries(db):
+    """Run the read paths of the routes and jobs against `db` (a RecordingDatabase)."""
+    await catalog_store.subscribe(db, dict(PRODUCT), CLERK_ID)
+
+    # The first page and later ones (keyset match after a value, and after a missing one)
+    for cursor in (None, encode_cursor(1, "0" * 24), encode_cursor(None, "0" * 24)):
+        await tracker.get_tracked_products(limit=10, cursor=cursor, include_history=False, db=db)
+        for sort in ("last_updated", "price_asc", "price_desc"):
+            await tracker.get_user_tracked_products(
+                CLERK_ID, min_price=1, max_price=100000, sort=sort, limit=10, cursor=cursor,
+                include_history=False, db=db,
+            )
+        await tracker.get_alerts(CLERK_ID, limit=10, cursor=cursor, db=db)
+        await tracker.get_triggered_alerts(CLERK_ID, limit=10, cursor=cursor, db=db)
+        await user.get_history(CLERK_ID, limit=10, cursor=cursor)
+        await user.get_bookmarks(CLERK_ID, limit=10, cursor=cursor, full=False, authenticated_clerk_id=CLERK_ID)
+    await user.get_bookmarked_ids(CLERK_ID, authenticated_clerk_id=CLERK_ID)
+    await tracker.get_price_history(PRODUCT["product_id"], start=datetime.utcnow() - timedelta(days=30),
+                                    end=None, limit=100, db=db)
+
+    await select_due_products(db, datetime.utcnow(), limit=10)
+    await catalog_store.collect_garbage(db, datetime.utcnow())
+    await alert_rule_store.evaluate(db, [{"product_id": PRODUCT["product_id"], "price_minor": 100, "price": "₹1"}])
+    await alert_dispatcher.deliver_pending(db)
+
+
+@requires_mongo
+def test_route_and_job_queries_use_indexes(mongo_database, monkeypatch):
+    async def check():
+        client = AsyncIOMotorClient(settings.MONGODB_URI)
+        db = client[mongo_database]
+        try:
+            assert await ensure_indexes(db) == []
+            recording = RecordingDatabase(db)
+            # The user routes read the module-level database
+            monkeypatch.setattr(database.db, "db", recording)
+            await issue_queries(recording)
+
+            scans = []
+            for query in recording.queries:
+                stages = [stage for plan in winning_plans(await explain(db, query)) for stage in plan_stages(plan)]
+                if "COLLSCAN" in stages:
+                    scans.append(query)
+            return recording.queries, scans
+        finally:
+            client.close()
+
+    queries, scans = run(check())
+    assert len(queries) > 20
+    assert scans == [], "queries without an index:\n" + "\n".join(map(str, scans))
@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+from jobs import price_tracker
+from services.rate_limit import AsyncTokenBucket
+from tests.conftest import run
+
+
+def test_burst_then_refuses():
+    bucket = AsyncTokenBucket(rate_per_second=0.001, burst=3)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+def test_acquire_waits_for_a_refill():
+    bucket = AsyncTokenBucket(rate_per_second=50, burst=1)
+
+    async def scenario():
+        started = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(3)))
+        return time.monotonic() - started
+
+    # One token up front, then two more at 50/s
+    assert run(scenario()) >= 0.035
+
+
+def test_zero_rate_does_not_pace():
+    bucket = AsyncTokenBucket(rate_per_second=0, burst=1)
+
+    async def scenario():
+        await asyncio.wait_for(asyncio.gather(*(bucket.acquire() for _ in range(5))), timeout=1)
+
+    run(scenario())
+
+
+def test_refreshes_share_one_bucket_per_process():
+    assert isinstance(price_tracker.tracker_limiter, AsyncTokenBucket)
+    assert price_tracker.tracker_limiter.capacity == price_tracker.settings.TRACKER_CONCURRENCY
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from services.upstream_scheduler import BACKGROUND, INTERACTIVE, DailyUsage, UpstreamBusy, UpstreamScheduler
+from tests.conftest import run
+
+
+def scheduler(**overrides):
+    options = dict(rate_per_second=0, burst=1, daily_quota=0, background_daily_budget=0,
+                   user_per_minute=0, max_queue=100, redis_url=None)
+    return UpstreamScheduler(**{**options, **overrides})
+
+
+def refused(coroutine):
+    with pytest.raises(UpstreamBusy) as error:
+        run(coroutine)
+    return error.value.reason
+
+
+def test_interactive_waiters_are_served_before_background_ones():
+    upstream = scheduler(rate_per_second=100, burst=1)
+
+    async def scenario():
+        order = []
+
+        async def call(priority, name):
+            await upstream.admit(priority)
+            order.append(name)
+
+        await upstream.admit(INTERACTIVE)  # takes the only token
+        background = [asyncio.create_task(call(BACKGROUND, f"b{n}")) for n in range(2)]
+        await asyncio.sleep(0)
+        interactive = [asyncio.create_task(call(INTERACTIVE, f"i{n}")) for n in range(2)]
+        await asyncio.gather(*background, *interactive)
+        return order
+
+    assert run(scenario()) == ["i0", "i1", "b0", "b1"]
+    assert upstream.usage.snapshot() == {INTERACTIVE: 3, BACKGROUND: 2}
+
+
+def test_daily_quota_covers_every_priority():
+    upstream = scheduler(daily_quota=2)
+    run(upstream.admit(INTERACTIVE))
+    run(upstream.admit(BACKGROUND))
+    assert upstream.remaining_quota() == 0
+    assert refused(upstream.admit(INTERACTIVE)) == "daily_quota"
+    assert upstream.rejected == {"daily_quota": 1}
+
+
+def test_background_budget_leaves_interactive_calls_alone(monkeypatch):
+    upstream = scheduler(background_daily_budget=100)
+    monkeypatch.setattr(upstream, "_released_background", lambda: 1)
+    run(upstream.admit(BACKGROUND))
+    assert upstream.background_allowance() == 0
+    assert refused(upstream.admit(BACKGROUND)) == "background_budget"
+    run(upstream.admit(INTERACTIVE))
+    # The refused call was given back
+    assert upstream.usage.snapshot() == {INTERACTIVE: 1, BACKGROUND: 1}
+
+
+def test_per_user_limit():
+    upstream = scheduler(user_per_minute=2)
+    for _ in range(2):
+        run(upstream.admit(INTERACTIVE, user_key="1.2.3.4"))
+    assert refused(upstream.admit(INTERACTIVE, user_key="1.2.3.4")) == "user_limit"
+    run(upstream.admit(INTERACTIVE, user_key="5.6.7.8"))
+    run(upstream.admit(BACKGROUND, user_key="1.2.3.4"))
+
+
+def test_full_queue_refuses_instead_of_waiting():
+    upstream = scheduler(rate_per_second=0.01, burst=1, max_queue=1)
+
+    async def scenario():
+        await upstream.admit(INTERACTIVE)
+        waiting = asyncio.create_task(upstream.admit(INTERACTIVE))
+        await asyncio.sleep(0)
+        try:
+            await upstream.admit(INTERACTIVE)
+        finally:
+            waiting.cancel()
+
+    assert refused(scenario()) == "queue_full"
+
+
+def test_cancelled_waiter_is_not_charged():
+    upstream = scheduler(rate_per_second=20, burst=1)
+
+    async def scenario():
+        await upstream.admit(BACKGROUND)
+        waiting = asyncio.create_task(upstream.admit(BACKGROUND))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.sleep(0.1)
+        return upstream.queued(), upstream.usage.snapshot()
+
+    assert run(scenario()) == (0, {INTERACTIVE: 0, BACKGROUND: 1})
+
+
+def test_usage_is_counted_locally_while_redis_is_unreachable():
+    usage = DailyUsage("redis://127.0.0.1:1/0")
+
+    async def scenario():
+        await usage.add(BACKGROUND, 2)
+        used = await usage.add(INTERACTIVE)
+        await usage.close()
+        return used
+
+    assert run(scenario()) == {INTERACTIVE: 1, BACKGROUND: 2}
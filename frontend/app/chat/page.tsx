@@ -24,6 +24,7 @@ export default function ChatPage() {
     ]);
     const [input, setInput] = useState('');
     const [isLoading, setIsLoading] = useState(false);
+    const [sessionId, setSessionId] = useState<string | null>(null);
     const messagesEndRef = useRef<HTMLDivElement>(null);
     const [guestUsageCount, setGuestUsageCount] = useState(0);
 
@@ -70,11 +71,10 @@ export default function ChatPage() {
                 message: userMessage,
                 include_search: true,
                 user_id: user?.id,
-                history: messages.slice(-6).map(m => ({
-                    role: m.role,
-                    content: m.content,
-                })),
+                // The server keeps the conversation; only the new message is sent
+                session_id: sessionId,
             });
+            setSessionId(response.data.session_id ?? null);
 
             setMessages(prev => [...prev, {
                 role: 'assistant',
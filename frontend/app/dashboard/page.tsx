@@ -4,36 +4,65 @@ import { useState, useEffect } from 'react';
 import { motion } from 'framer-motion';
 import Navbar from '@/components/Navbar';
 import PriceChart from '@/components/PriceChart';
-import api from '@/lib/api';
+import { usePagedList } from '@/lib/usePagedList';
+import { usePriceHistory } from '@/lib/usePriceHistory';
 import { Product } from '@/types/product';
-import { TrendingUp, AlertCircle, ShoppingBag, Trash2 } from 'lucide-react';
+import { TrendingUp, AlertCircle, ShoppingBag, Trash2, ChevronDown, ChevronUp, Loader2 } from 'lucide-react';
 
 interface TrackedProduct extends Product {
     id: string;
-    history: { price: string | number; timestamp: string }[];
     last_updated: string;
 }
 
+// Price history is fetched per product, only once its chart is opened
+function HistoryPanel({ product }: { product: TrackedProduct }) {
+    const [open, setOpen] = useState(false);
+    const { history, loading } = usePriceHistory(product.product_id!, open);
+
+    return (
+        <div>
+            <button
+                onClick={() => setOpen(!open)}
+                className="flex items-center gap-1.5 text-sm text-gray-400 hover:text-white transition-colors"
+            >
+                {open ? <ChevronUp className="w-4 h-4" /> : <ChevronDown className="w-4 h-4" />}
+                {open ? 'Hide price history' : 'Show price history'}
+            </button>
+            {open && (
+                <div className="mt-4">
+                    {loading || !history ? (
+                        <div className="h-[300px] flex items-center justify-center">
+                            <Loader2 className="w-6 h-6 animate-spin text-blue-400" />
+                        </div>
+                    ) : (
+                        <PriceChart history={history} title={product.title} />
+                    )}
+                </div>
+            )}
+        </div>
+    );
+}
+
 export default function Dashboard() {
-    const [trackedProducts, setTrackedProducts] = useState<TrackedProduct[]>([]);
-    const [isLoading, setIsLoading] = useState(true);
-    const [error, setError] = useState<string | null>(null);
+    const {
+        items: trackedProducts,
+        setItems: setTrackedProducts,
+        loading: isLoading,
+        loadingMore,
+        hasMore,
+        error: loadError,
+        reload,
+        loadMore,
+    } = usePagedList<TrackedProduct>('/api/v1/tracker/tracked', 'products');
+    const error = loadError ? 'Failed to load your tracked products.' : null;
 
     useEffect(() => {
-        fetchTrackedProducts();
-    }, []);
-
-    const fetchTrackedProducts = async () => {
-        try {
-            const response = await api.get('/api/v1/tracker/tracked');
-            setTrackedProducts(response.data.products);
-        } catch (err) {
-            console.error('Failed to fetch tracked products:', err);
-            setError('Failed to load your tracked products.');
-        } finally {
-            setIsLoading(false);
-        }
-    };
+        reload();
+    }, [reload]);
+
+    useEffect(() => {
+        if (loadError) console.error('Failed to fetch tracked products:', loadError);
+    }, [loadError]);
 
     const removeItem = async (id: string, e: React.MouseEvent) => {
         e.stopPropagation(); // Prevent chart toggle if we add that later
@@ -62,7 +91,7 @@ export default function Dashboard() {
                     </div>
                     <div className="px-4 py-2 bg-blue-500/10 rounded-full border border-blue-500/20 text-blue-400 text-sm font-medium flex items-center gap-2">
                         <TrendingUp className="w-4 h-4" />
-                        {trackedProducts.length} Active Trackers
+                        {trackedProducts.length}{hasMore ? '+' : ''} Active Trackers
                     </div>
                 </div>
 
@@ -141,9 +170,21 @@ export default function Dashboard() {
                                     </div>
                                 </div>
 
-                                <PriceChart history={product.history || []} title={product.title} />
+                                <HistoryPanel product={product} />
                             </motion.div>
                         ))}
+                        {hasMore && (
+                            <div className="flex justify-center">
+                                <button
+                                    onClick={loadMore}
+                                    disabled={loadingMore}
+                                    className="flex items-center gap-2 px-6 py-2 bg-white/10 hover:bg-white/20 rounded-full text-sm font-medium transition-colors disabled:opacity-50"
+                                >
+                                    {loadingMore && <Loader2 className="w-4 h-4 animate-spin" />}
+                                    Load more
+                                </button>
+                            </div>
+                        )}
                     </div>
                 )}
             </main>
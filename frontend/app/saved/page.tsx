@@ -1,9 +1,10 @@
 'use client';
 
-import { useState, useEffect } from 'react';
+import { useEffect } from 'react';
 import Navbar from '@/components/Navbar';
 import ProductCard from '@/components/ProductCard';
-import api, { withAuth } from '@/lib/api';
+import { withAuth } from '@/lib/api';
+import { usePagedList } from '@/lib/usePagedList';
 import { Product } from '@/types/product';
 import { Heart, Loader2, ArrowRight } from 'lucide-react';
 import { motion } from 'framer-motion';
@@ -14,36 +15,31 @@ import { useUserStore } from '@/store/useUserStore';
 export default function SavedPage() {
     const { user, isLoaded, isSignedIn } = useUser();
     const { getToken } = useAuth();
-    const [bookmarks, setBookmarks] = useState<Product[]>([]);
-    const [isLoading, setIsLoading] = useState(true);
+    // Pages of { user_id, product: {...}, timestamp }; ✅ each request carries the Clerk JWT
+    const {
+        items,
+        loading: isLoading,
+        loadingMore,
+        hasMore,
+        error,
+        reload,
+        loadMore,
+    } = usePagedList<{ product: Product }>(
+        user ? `/api/v1/user/${user.id}/bookmarks` : null,
+        'bookmarks',
+        () => withAuth(getToken),
+    );
+    const bookmarks = items.map((item) => item.product);
 
     useEffect(() => {
-        const fetchBookmarks = async () => {
-            if (!user) return;
-            setIsLoading(true);
-            try {
-                // ✅ Pass Clerk JWT so the request is authenticated
-                const config = await withAuth(getToken);
-                const response = await api.get(`/api/v1/user/${user.id}/bookmarks`, config);
-                if (response.data) {
-                    const products: Product[] = response.data.map((item: any) => item.product);
-                    setBookmarks(products);
-                    // NOTE: Zustand store is seeded globally by BookmarkHydrator in layout.tsx.
-                    // No need to seed here — avoids race conditions on first-load.
-                }
-            } catch (error) {
-                console.error('Failed to fetch bookmarks:', error);
-            } finally {
-                setIsLoading(false);
-            }
-        };
+        // NOTE: Zustand store is seeded globally by BookmarkHydrator in layout.tsx.
+        // No need to seed here — avoids race conditions on first-load.
+        if (isLoaded && isSignedIn) reload();
+    }, [isLoaded, isSignedIn, reload]);
 
-        if (isLoaded && isSignedIn) {
-            fetchBookmarks();
-        } else if (isLoaded && !isSignedIn) {
-            setIsLoading(false);
-        }
-    }, [isLoaded, isSignedIn, user, getToken]);
+    useEffect(() => {
+        if (error) console.error('Failed to fetch bookmarks:', error);
+    }, [error]);
 
     // Listen for bookmark removals from ProductCard — keep local list in sync
     const bookmarkedIds = useUserStore((s) => s.bookmarkedIds);
@@ -75,7 +71,7 @@ export default function SavedPage() {
                         <h1 className="text-3xl font-bold">Saved Items</h1>
                         <p className="text-gray-400 text-sm mt-1">
                             {visibleBookmarks.length > 0
-                                ? `${visibleBookmarks.length} item${visibleBookmarks.length !== 1 ? 's' : ''} saved`
+                                ? `${visibleBookmarks.length}${hasMore ? '+' : ''} item${visibleBookmarks.length !== 1 ? 's' : ''} saved`
                                 : 'Your personal wishlist'}
                         </p>
                     </div>
@@ -101,6 +97,18 @@ export default function SavedPage() {
                                         <ProductCard product={product} />
                                     </motion.div>
                                 ))}
+                                {hasMore && (
+                                    <div className="col-span-full flex justify-center mt-2">
+                                        <button
+                                            onClick={loadMore}
+                                            disabled={loadingMore}
+                                            className="flex items-center gap-2 px-6 py-3 rounded-full bg-white/5 hover:bg-white/10 border border-white/10 font-bold transition-all disabled:opacity-50"
+                                        >
+                                            {loadingMore && <Loader2 size={16} className="animate-spin" />}
+                                            Load more
+                                        </button>
+                                    </div>
+                                )}
                             </div>
                         ) : (
                             <motion.div
@@ -1,10 +1,12 @@
 'use client';
 
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import Navbar from '@/components/Navbar';
 import PriceChart from '@/components/PriceChart';
 import api from '@/lib/api';
+import { usePagedList } from '@/lib/usePagedList';
+import { usePriceHistory } from '@/lib/usePriceHistory';
 import { Product } from '@/types/product';
 import {
     Bell, TrendingDown, Plus, X, Search, Loader2,
@@ -17,11 +19,6 @@ import Link from 'next/link';
 
 // ─── Types ────────────────────────────────────────────────────────────────────
 
-interface PricePoint {
-    price: string | number;
-    timestamp: string;
-}
-
 interface TrackedProduct {
     id: string;
     product_id: string;
@@ -30,7 +27,6 @@ interface TrackedProduct {
     source: string;
     link: string;
     thumbnail?: string;
-    history: PricePoint[];
     last_updated: string;
     clerk_id?: string;
 }
@@ -79,10 +75,11 @@ function TrackedCard({
 }) {
     const [expanded, setExpanded] = useState(false);
     const [removing, setRemoving] = useState(false);
+    // History isn't part of the listing; it's fetched the first time the chart is opened
+    const { history, loading: historyLoading } = usePriceHistory(product.product_id, expanded);
 
     const priceNum = parseFloat(product.price.replace(/[^0-9.]/g, ''));
-    const history = product.history ?? [];
-    const priceChange = history.length >= 2
+    const priceChange = history && history.length >= 2
         ? (parseFloat(String(history[history.length - 1].price).replace(/[^0-9.]/g, '')) -
             parseFloat(String(history[0].price).replace(/[^0-9.]/g, '')))
         : 0;
@@ -134,9 +131,11 @@ function TrackedCard({
                             <span className="text-2xl font-black text-transparent bg-clip-text bg-gradient-to-r from-blue-400 to-indigo-400">
                                 {product.price}
                             </span>
-                            <span className={`text-xs font-bold px-2 py-0.5 rounded-full border ${trendStyles[priceTrend]}`}>
-                                {trendLabel[priceTrend]}
-                            </span>
+                            {history && (
+                                <span className={`text-xs font-bold px-2 py-0.5 rounded-full border ${trendStyles[priceTrend]}`}>
+                                    {trendLabel[priceTrend]}
+                                </span>
+                            )}
                         </div>
                         <div className="flex items-center gap-3 mt-2">
                             <span className="text-xs text-gray-500">
@@ -147,10 +146,14 @@ function TrackedCard({
                                 <Clock size={10} />
                                 Updated {new Date(product.last_updated).toLocaleDateString('en-IN', { day: 'numeric', month: 'short' })}
                             </span>
-                            <span className="text-gray-700">·</span>
-                            <span className="text-xs text-gray-500">
-                                {history.length} price point{history.length !== 1 ? 's' : ''}
-                            </span>
+                            {history && (
+                                <>
+                                    <span className="text-gray-700">·</span>
+                                    <span className="text-xs text-gray-500">
+                                        {history.length} price point{history.length !== 1 ? 's' : ''}
+                                    </span>
+                                </>
+                            )}
                         </div>
                     </div>
 
@@ -194,10 +197,16 @@ function TrackedCard({
                         className="overflow-hidden border-t border-white/10"
                     >
                         <div className="p-6 pt-4">
-                            <PriceChart
-                                history={history}
-                                title={product.title.substring(0, 40) + (product.title.length > 40 ? '…' : '')}
-                            />
+                            {historyLoading || !history ? (
+                                <div className="h-[300px] flex items-center justify-center">
+                                    <Loader2 className="w-6 h-6 animate-spin text-blue-400" />
+                                </div>
+                            ) : (
+                                <PriceChart
+                                    history={history}
+                                    title={product.title.substring(0, 40) + (product.title.length > 40 ? '…' : '')}
+                                />
+                            )}
                         </div>
                     </motion.div>
                 )}
@@ -219,23 +228,21 @@ export default function TrackPage() {
     const [addingId, setAddingId] = useState<string | null>(null);
     const [addedIds, setAddedIds] = useState<Set<string>>(new Set());
 
-    // Tracked products state
-    const [tracked, setTracked] = useState<TrackedProduct[]>([]);
-    const [trackedLoading, setTrackedLoading] = useState(false);
+    // Tracked products state — one page at a time, "Load more" fetches the next
+    const {
+        items: tracked,
+        setItems: setTracked,
+        loading: trackedLoading,
+        loadingMore,
+        hasMore,
+        error: trackedError,
+        reload: fetchTracked,
+        loadMore,
+    } = usePagedList<TrackedProduct>(user ? `/api/v1/tracker/tracked/${user.id}` : null, 'products');
 
-    // Fetch user's tracked products
-    const fetchTracked = useCallback(async () => {
-        if (!user) return;
-        setTrackedLoading(true);
-        try {
-            const res = await api.get(`/api/v1/tracker/tracked/${user.id}`);
-            setTracked(res.data?.products ?? []);
-        } catch (e) {
-            console.error('Failed to load tracked products', e);
-        } finally {
-            setTrackedLoading(false);
-        }
-    }, [user]);
+    useEffect(() => {
+        if (trackedError) console.error('Failed to load tracked products', trackedError);
+    }, [trackedError]);
 
     useEffect(() => {
         if (isLoaded && isSignedIn) {
@@ -465,7 +472,7 @@ export default function TrackPage() {
                                 <h2 className="text-xl font-black">My Tracked Products</h2>
                                 <p className="text-gray-500 text-sm">
                                     {tracked.length > 0
-                                        ? `${tracked.length} product${tracked.length !== 1 ? 's' : ''} being monitored`
+                                        ? `${tracked.length}${hasMore ? '+' : ''} product${tracked.length !== 1 ? 's' : ''} being monitored`
                                         : 'Nothing tracked yet — add one above'}
                                 </p>
                             </div>
@@ -511,6 +518,18 @@ export default function TrackPage() {
                                     />
                                 ))}
                             </div>
+                            {hasMore && (
+                                <div className="flex justify-center mt-6">
+                                    <button
+                                        onClick={loadMore}
+                                        disabled={loadingMore}
+                                        className="flex items-center gap-2 px-5 py-2.5 text-sm font-bold rounded-xl bg-white/5 hover:bg-white/10 border border-white/10 transition-all disabled:opacity-50"
+                                    >
+                                        {loadingMore && <Loader2 size={14} className="animate-spin" />}
+                                        Load more
+                                    </button>
+                                </div>
+                            )}
                         </AnimatePresence>
                     )}
                 </section>
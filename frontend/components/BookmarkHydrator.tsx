@@ -4,7 +4,6 @@ import { useEffect } from 'react';
 import { useAuth, useUser } from '@clerk/nextjs';
 import { useUserStore } from '@/store/useUserStore';
 import api, { withAuth } from '@/lib/api';
-import { Product } from '@/types/product';
 
 /**
  * BookmarkHydrator — renders nothing, just seeds the Zustand bookmarkedIds
@@ -23,12 +22,9 @@ export default function BookmarkHydrator() {
         const hydrate = async () => {
             try {
                 const config = await withAuth(getToken);
-                const res = await api.get(`/api/v1/user/${user.id}/bookmarks`, config);
-                // Response: [{ user_id, product: {...}, timestamp }, ...]
-                const products: Product[] = (res.data ?? []).map((item: any) => item.product);
-                const ids = products
-                    .map((p) => p.product_id)
-                    .filter((id): id is string => Boolean(id));
+                // Just the ids — { product_ids: [...] } — not the full bookmark documents
+                const res = await api.get(`/api/v1/user/${user.id}/bookmarks/ids`, config);
+                const ids: string[] = (res.data?.product_ids ?? []).filter(Boolean);
                 setBookmarkedIds(ids);
             } catch (err) {
                 // Non-fatal: hearts will just start empty
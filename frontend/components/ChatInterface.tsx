@@ -121,6 +121,7 @@ export default function ChatInterface() {
     const [messages, setMessages] = useState<Message[]>([]);
     const [input, setInput] = useState('');
     const [isLoading, setIsLoading] = useState(false);
+    const [sessionId, setSessionId] = useState<string | null>(null);
     const messagesEndRef = useRef<HTMLDivElement>(null);
     const [guestUsageCount, setGuestUsageCount] = useState(0);
 
@@ -165,11 +166,10 @@ export default function ChatInterface() {
                 message: userMessage,
                 include_search: true,
                 user_id: user?.id,
-                history: messages.slice(-6).map(m => ({
-                    role: m.role,
-                    content: m.content,
-                })),
+                // The server keeps the conversation; only the new message is sent
+                session_id: sessionId,
             });
+            setSessionId(response.data.session_id ?? null);
 
             const data = response.data;
             setMessages(prev => [...prev, {
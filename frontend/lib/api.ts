@@ -27,3 +27,33 @@ export async function withAuth(
         headers: token ? { Authorization: `Bearer ${token}` } : {},
     };
 }
+
+export type RequestConfig = { headers?: Record<string, string>; params?: Record<string, unknown> };
+
+export interface Page<T> {
+    items: T[];
+    nextCursor: string | null;
+}
+
+// Items per page for listings loaded on demand (PAGE_SIZE_MAX on the backend is 200)
+export const LIST_PAGE_SIZE = 20;
+
+/**
+ * Fetches one page of a keyset-paginated listing. Listings answer
+ * `{ [key]: [...], next_cursor }`; pass `nextCursor` back for the following page.
+ * Usage:
+ *   await fetchPage(`/api/v1/tracker/tracked/${id}`, 'products')
+ *   await fetchPage(`/api/v1/user/${id}/bookmarks`, 'bookmarks', await withAuth(getToken), cursor)
+ */
+export async function fetchPage<T = any>(
+    url: string,
+    key: string,
+    config: RequestConfig = {},
+    cursor?: string | null,
+): Promise<Page<T>> {
+    const res = await api.get(url, {
+        ...config,
+        params: { limit: LIST_PAGE_SIZE, ...config.params, ...(cursor ? { cursor } : {}) },
+    });
+    return { items: res.data?.[key] ?? [], nextCursor: res.data?.next_cursor ?? null };
+}
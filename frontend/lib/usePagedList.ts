@@ -0,0 +1,58 @@
+'use client';
+
+import { useCallback, useRef, useState } from 'react';
+import { fetchPage, RequestConfig } from '@/lib/api';
+
+/**
+ * State for a keyset-paginated listing loaded a page at a time.
+ * `reload()` fetches the first page, `loadMore()` appends the next one.
+ * `getConfig` is called per request (e.g. to attach a fresh Clerk token).
+ * `loading` starts out true so the first render shows a loader, not an empty list.
+ * Usage:
+ *   const list = usePagedList<Product>(`/api/v1/tracker/tracked/${id}`, 'products');
+ *   useEffect(() => { list.reload(); }, [list.reload]);
+ */
+export function usePagedList<T = any>(
+    url: string | null,
+    key: string,
+    getConfig: () => RequestConfig | Promise<RequestConfig> = () => ({}),
+) {
+    const [items, setItems] = useState<T[]>([]);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
+    const [error, setError] = useState<unknown>(null);
+    const configRef = useRef(getConfig);
+    configRef.current = getConfig;
+
+    const reload = useCallback(async () => {
+        if (!url) return;
+        setLoading(true);
+        setError(null);
+        try {
+            const page = await fetchPage<T>(url, key, await configRef.current());
+            setItems(page.items);
+            setNextCursor(page.nextCursor);
+        } catch (e) {
+            setError(e);
+        } finally {
+            setLoading(false);
+        }
+    }, [url, key]);
+
+    const loadMore = useCallback(async () => {
+        if (!url || !nextCursor || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const page = await fetchPage<T>(url, key, await configRef.current(), nextCursor);
+            setItems((prev) => [...prev, ...page.items]);
+            setNextCursor(page.nextCursor);
+        } catch (e) {
+            setError(e);
+        } finally {
+            setLoadingMore(false);
+        }
+    }, [url, key, nextCursor, loadingMore]);
+
+    return { items, setItems, hasMore: nextCursor !== null, loading, loadingMore, error, reload, loadMore };
+}
@@ -0,0 +1,36 @@
+'use client';
+
+import { useEffect, useState } from 'react';
+import api from '@/lib/api';
+
+export interface PricePoint {
+    price: string | number;
+    timestamp: string;
+}
+
+/**
+ * Loads a product's price history from GET /api/v1/tracker/history/{product_id}
+ * the first time `enabled` is true (e.g. when its chart is opened), then keeps it.
+ * Usage:
+ *   const { history, loading } = usePriceHistory(product.product_id, expanded);
+ */
+export function usePriceHistory(productId: string, enabled: boolean) {
+    const [history, setHistory] = useState<PricePoint[] | null>(null);
+    const [loading, setLoading] = useState(false);
+
+    useEffect(() => {
+        if (!enabled || history !== null) return;
+        let cancelled = false;
+        setLoading(true);
+        api.get(`/api/v1/tracker/history/${encodeURIComponent(productId)}`)
+            .then((res) => { if (!cancelled) setHistory(res.data?.history ?? []); })
+            .catch((e) => {
+                console.error('Failed to load price history', e);
+                if (!cancelled) setHistory([]);
+            })
+            .finally(() => { if (!cancelled) setLoading(false); });
+        return () => { cancelled = true; };
+    }, [productId, enabled, history]);
+
+    return { history, loading };
+}